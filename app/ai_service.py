@@ -1,21 +1,63 @@
 import os
+import re
 import json
+import time
+import hashlib
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from openai import OpenAI
 from anthropic import Anthropic
 from google import genai
+from google.genai import types
 import io
 import base64
+import asyncio
+import zipfile
 from docx import Document
+from lxml import etree
 import PyPDF2
 import pdfplumber
+from app.ocr_service import OCRService, OCR_PDF_RESOLUTION
+
+# Configuration: PDF page selection for long uploads
+PDF_TOKEN_BUDGET = int(os.getenv('PDF_TOKEN_BUDGET', '6000'))  # Approximate tokens of PDF text sent to the model
+PDF_EARLY_STOP = os.getenv('PDF_EARLY_STOP', 'true').lower() == 'true'  # Stop reading past the budget once totals are read
+
+# Signals used to score how likely a page is to carry invoice/quote data
+CURRENCY_CODES = 'NGN|USD|EUR|GBP|CAD|AUD|JPY|CNY|INR|ZAR|KES|GHS'
+CURRENCY_PATTERN = re.compile(rf'[₦$€£¥]\s?\d|\b(?:{CURRENCY_CODES})\b')
+NUMBER_PATTERN = re.compile(r'\d[\d,]*(?:\.\d+)?')
+KEYWORD_PATTERN = re.compile(
+    r'\b(?:total|subtotal|qty|quantity|unit price|price|amount|invoice|quote|quotation|tax|vat|bill to|description|delivery)\b',
+    re.IGNORECASE
+)
+# A totals line: the keyword followed by an amount on the same line (a bare 'Total Amount' is a column header)
+TOTALS_PATTERN = re.compile(
+    r'\b(?:grand total|total due|amount due|balance due|total amount)\b[^\S\n]*:?[^\S\n]*'
+    rf'(?:[₦$€£¥]|\b(?:{CURRENCY_CODES})\b)?[^\S\n]*\d[\d,]*(?:\.\d+)?',
+    re.IGNORECASE
+)
+
+# WordprocessingML element names used by the streaming DOCX reader
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DOCX_TAGS = (f'{W}p', f'{W}tbl', f'{W}tr', f'{W}tc', f'{W}t', f'{W}tab', f'{W}br', f'{W}cr')
+
+# Configuration: scanned PDFs that neither pdfplumber nor OCR can read go to the vision model
+VISION_PDF_MAX_PAGES = int(os.getenv('VISION_PDF_MAX_PAGES', '5'))
+
+# Configuration: Gemini image transport
+GEMINI_INLINE_MAX_BYTES = int(os.getenv('GEMINI_INLINE_MAX_BYTES', str(4 * 1024 * 1024)))  # Larger images use the Files API
+GEMINI_FILE_TTL_SECONDS = int(os.getenv('GEMINI_FILE_TTL_SECONDS', str(47 * 3600)))  # Gemini keeps uploads for 48h
 
 class AIService:
     def __init__(self):
         self.provider = os.getenv('AI_PROVIDER', 'openai')
         self.fallback_provider = os.getenv('FALLBACK_AI_PROVIDER', 'gemini')
         self.prompts_dir = Path(__file__).parent / "prompts"
+        self.page_selection_stats = {'documents': 0, 'pages_skipped': 0, 'tokens_saved': 0}
+        self.vision_upload_stats = {'inline': 0, 'uploads': 0, 'cache_hits': 0, 'upload_seconds': 0.0}
+        self._gemini_files: Dict[str, Tuple[Any, float]] = {}  # content hash -> (file handle, expires at)
+        self.ocr_service = OCRService()
 
         # Initialize primary provider
         if self.provider == 'openai':
@@ -133,22 +175,36 @@ For {document_type}:
 
         return self._parse_json(content)
 
-    async def extract_with_image(self, prompt: str, image_b64: str, document_type: str) -> Dict[str, Any]:
+    async def extract_from_image(self, prompt: str, image_bytes: bytes, document_type: str, media_type: str = 'image/jpeg') -> Dict[str, Any]:
+        """Extract from an image via local OCR and the text model, using vision only when OCR confidence is low"""
+        if self.ocr_service.available:
+            text, confidence = await asyncio.wrap_future(self.ocr_service.submit_image_bytes(image_bytes))
+            if self.ocr_service.is_confident(text, confidence):
+                return await self.extract_from_text(prompt, text, document_type)
+            print(f"OCR confidence {confidence:.0f} too low, using vision model")
+        return await self.extract_with_image(prompt, image_bytes, document_type, media_type)
+
+    async def extract_with_image(self, prompt: str, image_bytes: bytes, document_type: str, media_type: str = 'image/jpeg') -> Dict[str, Any]:
         """Extract structured data from image using vision models"""
+        return await self.extract_with_images(prompt, [(image_bytes, media_type)], document_type)
+
+    async def extract_with_images(self, prompt: str, images: List[Tuple[bytes, str]], document_type: str) -> Dict[str, Any]:
+        """Extract structured data from one or more images (e.g. pages of a scan) in a single vision call"""
 
         system_prompt = self._load_prompt(document_type)
 
         if self.provider == 'openai':
+            image_parts = [
+                {"type": "image_url", "image_url": {"url": f"data:{media_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"}}
+                for image_bytes, media_type in images
+            ]
             response = self.client.chat.completions.create(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {
                         "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
-                        ]
+                        "content": [{"type": "text", "text": prompt}] + image_parts
                     }
                 ],
                 temperature=0.1,
@@ -157,6 +213,10 @@ For {document_type}:
             content = response.choices[0].message.content.strip()
 
         elif self.provider == 'anthropic':
+            image_parts = [
+                {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": base64.b64encode(image_bytes).decode('utf-8')}}
+                for image_bytes, media_type in images
+            ]
             response = self.client.messages.create(
                 model="claude-3-5-sonnet-20241022",
                 max_tokens=1500,
@@ -165,32 +225,18 @@ For {document_type}:
                 messages=[
                     {
                         "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": image_b64}}
-                        ]
+                        "content": [{"type": "text", "text": prompt}] + image_parts
                     }
                 ]
             )
             content = response.content[0].text.strip()
 
         elif self.provider == 'gemini':
-            import PIL.Image
-            import io
-            import base64
-
-            image_bytes = base64.b64decode(image_b64)
-            image = PIL.Image.open(io.BytesIO(image_bytes))
-
-            # Upload image to Gemini
-            uploaded_file = self.client.files.upload(file=io.BytesIO(image_bytes))
+            image_parts = [self._gemini_image_part(image_bytes, media_type) for image_bytes, media_type in images]
 
             response = self.client.models.generate_content(
                 model='gemini-2.0-flash-exp',
-                contents=[
-                    system_prompt + "\n\n" + prompt,
-                    uploaded_file
-                ],
+                contents=[system_prompt + "\n\n" + prompt] + image_parts,
                 config={
                     'temperature': 0.1,
                     'max_output_tokens': 1500
@@ -200,6 +246,35 @@ For {document_type}:
 
         return self._parse_json(content)
 
+    def _gemini_image_part(self, image_bytes: bytes, media_type: str) -> Any:
+        """Send small images inline; upload large ones once per content hash and reuse the handle"""
+        if len(image_bytes) <= GEMINI_INLINE_MAX_BYTES:
+            self.vision_upload_stats['inline'] += 1
+            return types.Part.from_bytes(data=image_bytes, mime_type=media_type)
+
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        now = time.time()
+        cached = self._gemini_files.get(digest)
+        if cached and cached[1] > now:
+            self.vision_upload_stats['cache_hits'] += 1
+            return cached[0]
+
+        start = time.perf_counter()
+        uploaded_file = self.client.files.upload(file=io.BytesIO(image_bytes), config={'mime_type': media_type})
+        elapsed = time.perf_counter() - start
+        self.vision_upload_stats['uploads'] += 1
+        self.vision_upload_stats['upload_seconds'] += elapsed
+        print(f"Gemini file upload: {len(image_bytes) / 1024:,.0f} KB in {elapsed * 1000:.0f}ms")
+
+        # Expire our handle a little before Gemini deletes the file
+        expires_at = now + GEMINI_FILE_TTL_SECONDS
+        if getattr(uploaded_file, 'expiration_time', None):
+            expires_at = min(expires_at, uploaded_file.expiration_time.timestamp() - 300)
+
+        self._gemini_files = {key: entry for key, entry in self._gemini_files.items() if entry[1] > now}
+        self._gemini_files[digest] = (uploaded_file, expires_at)
+        return uploaded_file
+
     def _extract_text_from_file(self, file_bytes: bytes, filename: str) -> str:
         """Extract text content from various file types"""
         file_ext = filename.lower().split('.')[-1]
@@ -214,38 +289,218 @@ For {document_type}:
             raise ValueError(f"Unsupported file type: {file_ext}")
 
     def _extract_pdf_text(self, file_bytes: bytes) -> str:
-        """Extract text from PDF using pdfplumber (more accurate)"""
+        """Extract text from PDF, keeping only the pages most relevant to the document"""
+        pages, total_pages = self._extract_pdf_pages(file_bytes)
+        text, stats = self._select_pdf_pages(pages, total_pages)
+
+        self.page_selection_stats['documents'] += 1
+        self.page_selection_stats['pages_skipped'] += stats['pages_skipped']
+        self.page_selection_stats['tokens_saved'] += stats['tokens_saved']
+        if stats['pages_skipped']:
+            print(f"PDF page selection: kept {stats['pages_kept']}/{total_pages} pages, "
+                  f"skipped {stats['pages_skipped']}, saved ~{stats['tokens_saved']} tokens")
+        return text
+
+    def _extract_pdf_pages(self, file_bytes: bytes) -> Tuple[List[str], int]:
+        """Extract text per page using pdfplumber (more accurate), stopping after the totals page"""
         try:
             with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+                texts, total_pages = self._read_pages(pdf.pages, lambda page: page.extract_text())
+                return self._ocr_empty_pages(pdf.pages, texts), total_pages
         except Exception as e:
             # Fallback to PyPDF2 if pdfplumber fails
             try:
                 pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+                return self._read_pages(pdf_reader.pages, lambda page: page.extract_text())
             except Exception as e2:
                 raise ValueError(f"Failed to extract PDF text: {e}, {e2}")
 
+    def _read_pages(self, pages: Any, extract: Any) -> Tuple[List[str], int]:
+        """
+        Read page texts in order.
+
+        Once a totals line has followed item rows, the remaining pages are
+        usually terms and conditions, so reading stops there, but only after
+        the pages read are over the token budget (page selection keeps
+        everything under it anyway).
+        """
+        texts = []
+        tokens = 0
+        item_rows = totals = False
+        for page in pages:
+            text = extract(page) or ""
+            texts.append(text)
+            tokens += self._estimate_tokens(text)
+            for line in text.splitlines():
+                if item_rows and TOTALS_PATTERN.search(line):
+                    totals = True
+                elif len(NUMBER_PATTERN.findall(line)) >= 2:
+                    item_rows = True
+            if PDF_EARLY_STOP and totals and tokens > PDF_TOKEN_BUDGET:
+                break
+        return texts, len(pages)
+
+    def _ocr_empty_pages(self, pages: Any, texts: List[str]) -> List[str]:
+        """Scanned pages have no text layer; rasterize them and OCR across the worker pool"""
+        empty = [i for i, text in enumerate(texts) if not text.strip()]
+        if not empty or not self.ocr_service.available:
+            return texts
+
+        # Rasterize sequentially (pdfium is not thread-safe), OCR in parallel
+        images = [pages[i].to_image(resolution=OCR_PDF_RESOLUTION).original for i in empty]
+        recovered = 0
+        for i, (text, confidence) in zip(empty, self.ocr_service.ocr_images(images)):
+            # Low confidence pages stay empty so an unreadable scan falls back to the vision model
+            if self.ocr_service.is_confident(text, confidence):
+                texts[i] = text
+                recovered += 1
+        print(f"OCR: recovered text for {recovered}/{len(empty)} scanned PDF page(s)")
+        return texts
+
+    def _rasterize_pdf(self, file_bytes: bytes) -> List[Tuple[bytes, str]]:
+        """Render the first pages of a PDF as JPEGs for the vision model"""
+        images = []
+        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            for page in pdf.pages[:VISION_PDF_MAX_PAGES]:
+                buffer = io.BytesIO()
+                page.to_image(resolution=OCR_PDF_RESOLUTION).original.convert('RGB').save(buffer, format='JPEG', quality=80)
+                images.append((buffer.getvalue(), 'image/jpeg'))
+        return images
+
+    def _score_page(self, text: str) -> float:
+        """Score a page for invoice-relevant content: currency, numeric table rows and keywords"""
+        lines = [line for line in text.splitlines() if line.strip()]
+        if not lines:
+            return 0.0
+        currency_hits = len(CURRENCY_PATTERN.findall(text))
+        keyword_hits = len(KEYWORD_PATTERN.findall(text))
+        numeric_rows = sum(1 for line in lines if len(NUMBER_PATTERN.findall(line)) >= 2)
+        table_density = numeric_rows / len(lines)
+        score = currency_hits * 3 + keyword_hits * 2 + table_density * 10
+        if TOTALS_PATTERN.search(text):
+            score += 10
+        return score
+
+    def _estimate_tokens(self, text: str) -> int:
+        """Rough token estimate (~4 characters per token)"""
+        return len(text) // 4 + 1
+
+    def _select_pdf_pages(self, pages: List[str], total_pages: int) -> Tuple[str, Dict[str, int]]:
+        """Pick the highest scoring pages that fit the token budget, preserving page order"""
+        tokens = [self._estimate_tokens(text) for text in pages]
+        # Pages never read because of the early stop still count as skipped
+        unread_pages = total_pages - len(pages)
+
+        if sum(tokens) <= PDF_TOKEN_BUDGET:
+            selected = [i for i, text in enumerate(pages) if text.strip()]
+        else:
+            scores = [self._score_page(text) for text in pages]
+            # The first page usually carries the header and customer details
+            if scores:
+                scores[0] += 5
+            ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: scores[i], reverse=True)
+            selected = []
+            used = 0
+            for i in ranked:
+                if used + tokens[i] > PDF_TOKEN_BUDGET and selected:
+                    continue
+                selected.append(i)
+                used += tokens[i]
+            selected.sort()
+
+        text = "\n".join(pages[i] for i in selected).strip()
+        kept = set(selected)
+        skipped_tokens = sum(tokens[i] for i in range(len(pages)) if i not in kept)
+        stats = {
+            'pages_kept': len(selected),
+            'pages_skipped': total_pages - len(selected),
+            'tokens_saved': skipped_tokens + unread_pages * (sum(tokens) // max(len(pages), 1)),
+        }
+        return text, stats
+
     def _extract_docx_text(self, file_bytes: bytes) -> str:
-        """Extract text from DOCX file"""
+        """Extract paragraphs and tables (as TSV rows) from DOCX file"""
         try:
-            doc = Document(io.BytesIO(file_bytes))
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text.strip()
+            return "\n".join(self._iter_docx_blocks(file_bytes)).strip()
         except Exception as e:
-            raise ValueError(f"Failed to extract DOCX text: {e}")
+            # Fall back to the full object model (paragraphs only)
+            try:
+                doc = Document(io.BytesIO(file_bytes))
+                text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+                return text.strip()
+            except Exception as e2:
+                raise ValueError(f"Failed to extract DOCX text: {e}, {e2}")
+
+    def _iter_docx_blocks(self, file_bytes: bytes):
+        """
+        Stream word/document.xml and yield text blocks in document order.
+
+        Paragraphs are yielded as-is; each row of a top-level table is yielded
+        as tab-separated cells (nested tables are flattened into their cell).
+        Processed elements are discarded as we go so memory stays bounded.
+        """
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+            with archive.open('word/document.xml') as document_xml:
+                table_depth = 0
+                runs = []   # text of the current paragraph
+                cell = []   # paragraphs of the current top-level table cell
+                row = []    # cells of the current top-level table row
+
+                for event, elem in etree.iterparse(document_xml, events=('start', 'end'), tag=DOCX_TAGS):
+                    tag = elem.tag
+                    if event == 'start':
+                        if tag == f'{W}tbl':
+                            table_depth += 1
+                        elif tag == f'{W}tr' and table_depth == 1:
+                            row = []
+                        elif tag == f'{W}tc' and table_depth == 1:
+                            cell = []
+                        continue
+
+                    if tag == f'{W}t':
+                        runs.append(elem.text or '')
+                    elif tag in (f'{W}tab', f'{W}br', f'{W}cr'):
+                        # Tab stops in paragraph properties are also w:tab; only runs carry content
+                        if elem.getparent().tag == f'{W}r':
+                            runs.append('\t' if tag == f'{W}tab' else '\n')
+                    elif tag == f'{W}p':
+                        text = ''.join(runs)
+                        runs = []
+                        if table_depth:
+                            cell.append(text)
+                        elif text.strip():
+                            yield text
+                    elif tag == f'{W}tc' and table_depth == 1:
+                        row.append(' '.join(' '.join(text.split()) for text in cell if text.strip()))
+                    elif tag == f'{W}tr' and table_depth == 1:
+                        if any(row):
+                            yield '\t'.join(row)
+                    elif tag == f'{W}tbl':
+                        table_depth -= 1
+
+                    # Drop finished block elements and their already-processed siblings
+                    if tag in (f'{W}p', f'{W}tc', f'{W}tr', f'{W}tbl'):
+                        elem.clear()
+                        parent = elem.getparent()
+                        if parent is not None:
+                            while elem.getprevious() is not None:
+                                del parent[0]
 
     async def extract_from_file(self, prompt: str, file_bytes: bytes, filename: str, document_type: str) -> Dict[str, Any]:
         """Extract structured data from document file (PDF, DOCX, TXT)"""
 
-        # Extract text from the document
-        file_text = self._extract_text_from_file(file_bytes, filename)
+        # Extract text from the document; parsing, rasterizing and OCR block, so they run in a thread
+        file_text = await asyncio.to_thread(self._extract_text_from_file, file_bytes, filename)
+
+        # Scanned PDF without a usable text layer or confident OCR
+        if not file_text.strip() and filename.lower().endswith('.pdf'):
+            images = await asyncio.to_thread(self._rasterize_pdf, file_bytes)
+            return await self.extract_with_images(prompt, images, document_type)
+
+        return await self.extract_from_text(prompt, file_text, document_type)
+
+    async def extract_from_text(self, prompt: str, file_text: str, document_type: str) -> Dict[str, Any]:
+        """Extract structured data from text already pulled out of one or more documents"""
 
         # Combine prompt with extracted text
         combined_prompt = f"{prompt}\n\nDocument content:\n{file_text}"
@@ -295,19 +550,23 @@ For {document_type}:
 
     def detect_document_type(self, prompt: str) -> Dict[str, Any]:
         """Use AI to detect document type from prompt"""
+        return self.complete_json(prompt, max_tokens=200)
+
+    def complete_json(self, prompt: str, max_tokens: int = 200) -> Dict[str, Any]:
+        """Send a single self-contained prompt and parse the JSON reply"""
         if self.provider == 'openai':
             response = self.client.chat.completions.create(
                 model="gpt-4",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
-                max_tokens=200
+                max_tokens=max_tokens
             )
             content = response.choices[0].message.content.strip()
 
         elif self.provider == 'anthropic':
             response = self.client.messages.create(
                 model="claude-3-5-sonnet-20241022",
-                max_tokens=200,
+                max_tokens=max_tokens,
                 temperature=0.1,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -319,7 +578,7 @@ For {document_type}:
                 contents=prompt,
                 config={
                     'temperature': 0.1,
-                    'max_output_tokens': 200
+                    'max_output_tokens': max_tokens
                 }
             )
             content = response.text.strip()
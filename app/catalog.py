@@ -0,0 +1,206 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from app.inventory_store import InventoryStore
+
+# Configuration: catalog-aware extraction
+CATALOG_ENABLED = os.getenv('CATALOG_ENABLED', 'true').lower() == 'true'
+CATALOG_PROMPT_ROWS = int(os.getenv('CATALOG_PROMPT_ROWS', '8'))  # Most catalog rows added to a prompt
+CATALOG_MATCH_THRESHOLD = float(os.getenv('CATALOG_MATCH_THRESHOLD', '0.6'))  # Name similarity (0-1) to fill an item
+
+# SKU-like tokens: letters, digits and separators, with at least one digit (LAP-001, SKU12, 4K/TV-55)
+SKU_PATTERN = re.compile(r'(?<![\w/-])(?=[\w./-]*\d)[A-Za-z0-9][\w./-]*[A-Za-z0-9](?![\w/-])')
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+# Share of a catalog name's trigrams a request must contain for the row to be added to the prompt
+PROMPT_MIN_RELEVANCE = 0.5
+
+# Words of a request that never name an item
+STOP_WORDS = frozenset("""
+a an and any are as at be bill billed by each for from get give have i in invoice is it me my need of on or our
+per please price prices quotation quote send so some the their them these this to unit units us want we with you
+your pcs piece pieces item items qty quantity cost costs total client customer customers address city country
+""".split())
+
+def normalize_words(text: str) -> List[str]:
+    """Lower-case words with a plural 's' dropped, so 'Laptops' and 'laptop' compare equal"""
+    words = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+def trigrams(text: str) -> set:
+    """Trigrams of each word padded with spaces, as in PostgreSQL's pg_trgm"""
+    grams = set()
+    for word in normalize_words(text):
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+def coverage(name: str, text: str) -> float:
+    """Share of a name's trigrams found in a text: how much of the name the text mentions"""
+    grams = trigrams(name)
+    return len(grams & trigrams(text)) / len(grams) if grams else 0.0
+
+def similarity(a: str, b: str) -> float:
+    """Dice coefficient of two strings' trigrams: 1.0 for the same words, 0.0 for nothing in common"""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+class CatalogResolver:
+    """
+    Resolves invoice and quote items against the inventory store.
+
+    Before extraction, only the catalog rows relevant to a request (SKUs it
+    mentions, names sharing its words) are added to the prompt, never the
+    whole catalog. After extraction, items are matched by exact SKU or, failing
+    that, by name similarity, and their catalog name, SKU and unit price are
+    filled in.
+    """
+
+    def __init__(self, store: InventoryStore, prompt_rows: int = CATALOG_PROMPT_ROWS,
+                 threshold: float = CATALOG_MATCH_THRESHOLD):
+        self.store = store
+        self.prompt_rows = prompt_rows
+        self.threshold = threshold
+
+    @staticmethod
+    def _terms(text: str) -> List[str]:
+        """Words of a request worth searching the catalog for"""
+        return [
+            word for word in normalize_words(text)
+            if len(word) >= 3 and word not in STOP_WORDS and not word.isdigit()
+        ]
+
+    @staticmethod
+    def _phrases(text: str) -> List[str]:
+        """
+        Runs of consecutive item words in a request ('standing desk model 42'), split at stop words.
+
+        Leading numbers are dropped as quantities; numbers after a word are kept as model numbers.
+        """
+        phrases, run = [], []
+        for word in normalize_words(text) + ['']:
+            if word and word not in STOP_WORDS and (len(word) >= 3 or word.isdigit()):
+                if run or not word.isdigit():
+                    run.append(word)
+                continue
+            if run:
+                phrases.append(' '.join(run))
+            run = []
+        return phrases
+
+    def relevant_items(self, text: str, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Catalog rows a request may refer to: SKU matches first, then names by how much of them it mentions"""
+        by_sku = self.store.by_skus(SKU_PATTERN.findall(text), tenant_id)
+        items = [item for item in by_sku.values() if item.get('is_active', True) is not False]
+        if len(items) >= self.prompt_rows:
+            return items[:self.prompt_rows]
+
+        # A phrase found as it is in names is a cheap, selective lookup; only phrases that
+        # aren't fall back to ranking every name sharing one of their words
+        candidates = {}
+        for phrase in self._phrases(text):
+            matches = self.store.match_names([phrase], tenant_id, limit=self.prompt_rows)
+            if not matches and self._terms(phrase):
+                matches = self.store.match_names(self._terms(phrase), tenant_id, limit=self.prompt_rows * 4)
+            candidates.update((item['inventory_id'], item) for item in matches)
+
+        seen = {item['inventory_id'] for item in items}
+        request = ' '.join(self._terms(text))
+        ranked = sorted(
+            ((coverage(item['name'], request), item) for key, item in candidates.items() if key not in seen),
+            key=lambda candidate: candidate[0], reverse=True
+        )
+        items += [item for relevance, item in ranked if relevance >= PROMPT_MIN_RELEVANCE]
+        return items[:self.prompt_rows]
+
+    def prompt_reference(self, text: str, tenant_id: Optional[str] = None) -> str:
+        """
+        Compact catalog block to append to a request, or '' when nothing in the catalog is relevant.
+
+        One line per row (SKU, name, unit price), instructing the model to
+        reuse catalog names, prices and SKUs.
+        """
+        items = self.relevant_items(text, tenant_id)
+        if not items:
+            return ''
+        lines = []
+        for item in items:
+            price = f"{item.get('currency') or ''} {item.get('unit_price') or 0:,.2f}".strip()
+            lines.append(f"- {item.get('sku') or '-'} | {item['name']} | {price}")
+        return (
+            "Catalog items that may match this request (SKU | name | unit price). For an item that matches, "
+            "use the catalog name as its description, the catalog unit price unless the request gives a price, "
+            "and add its \"sku\":\n" + "\n".join(lines)
+        )
+
+    def _best_match(self, description: str, tenant_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Closest catalog item by name, if it is similar enough"""
+        # Model numbers count in a description, unlike the quantities of a request
+        terms = [word for word in normalize_words(description) if len(word) >= 3 and word not in STOP_WORDS]
+        # The description as it is, then names containing every word, are few and cheap
+        # to rank; otherwise any word will do
+        candidates = (
+            self.store.match_names([' '.join(normalize_words(description))], tenant_id, limit=20)
+            or self.store.match_names(terms, tenant_id, limit=20, match_all=True)
+            or self.store.match_names(terms, tenant_id, limit=20)
+        )
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = similarity(candidate['name'], ' '.join(terms))
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def resolve(self, data: Dict[str, Any], tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fill extracted items from the catalog.
+
+        Matched items get the catalog name as description, the catalog SKU and
+        inventory_id, and the catalog unit price when none was extracted (a
+        price the user gave is kept). A document without a currency takes the
+        catalog currency when every priced item agrees on one.
+
+        Returns:
+            New document dict; data is left untouched
+        """
+        items = data.get('items') or []
+        if not items:
+            return data
+        by_sku = self.store.by_skus([str(item.get('sku') or '') for item in items], tenant_id)
+
+        matches = []
+        for item in items:
+            match = by_sku.get(str(item.get('sku') or '').strip().upper())
+            if match is None and item.get('description'):
+                match = self._best_match(str(item['description']), tenant_id)
+            matches.append(match)
+        if not any(matches):
+            return data
+
+        currency = data.get('currency')
+        if not currency:
+            currencies = {
+                match.get('currency') for item, match in zip(items, matches)
+                if match and not item.get('unit_price') and match.get('unit_price')
+            }
+            if len(currencies) == 1 and None not in currencies:
+                currency = currencies.pop()
+
+        resolved = []
+        for item, match in zip(items, matches):
+            if match is None:
+                resolved.append(item)
+                continue
+            item = {**item, 'description': match['name'], 'sku': match.get('sku'), 'inventory_id': match['inventory_id']}
+            if not item.get('unit_price') and match.get('unit_price') and match.get('currency') in (None, currency):
+                item['unit_price'] = match['unit_price']
+                item.pop('amount', None)  # The model's amount was computed without a price
+            resolved.append(item)
+        return {**data, 'items': resolved, 'currency': currency}
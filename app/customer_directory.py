@@ -0,0 +1,291 @@
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.catalog import WORD_PATTERN, similarity
+
+# Configuration: customer directory
+CUSTOMER_DIRECTORY_ENABLED = os.getenv('CUSTOMER_DIRECTORY_ENABLED', 'true').lower() == 'true'
+CUSTOMER_DIRECTORY_PATH = os.getenv('CUSTOMER_DIRECTORY_PATH', 'data/customers.db')
+CUSTOMER_PROMPT_ROWS = int(os.getenv('CUSTOMER_PROMPT_ROWS', '3'))  # Most known customers added to a prompt
+CUSTOMER_MATCH_THRESHOLD = float(os.getenv('CUSTOMER_MATCH_THRESHOLD', '0.75'))  # Name similarity (0-1) to suggest a customer
+CUSTOMER_CONFIDENT_THRESHOLD = float(os.getenv('CUSTOMER_CONFIDENT_THRESHOLD', '0.9'))  # Name similarity (0-1) to complete one
+
+CUSTOMER_FIELDS = ('address', 'city', 'country')
+
+# Longest customer name, in words, looked for in a request
+MAX_NAME_WORDS = 6
+
+# Trailing words that don't tell customers apart ('Tech Corp Ltd' is 'Tech Corp'), and leading titles
+LEGAL_SUFFIXES = frozenset(('ltd', 'limited', 'inc', 'incorporated', 'llc', 'llp', 'plc', 'gmbh', 'pty', 'nig'))
+TITLES = frozenset(('mr', 'mrs', 'ms', 'miss', 'dr', 'prof', 'sir', 'madam', 'chief', 'engr', 'the'))
+
+# Normalized names a model writes when a request names no customer, and the shortest name kept (in letters and digits)
+PLACEHOLDER_NAMES = frozenset((
+    'unknown', 'none', 'null', 'nil', 'na', 'n a', 'not provided', 'not specified', 'not available', 'not applicable',
+    'tbd', 'tba', 'customer', 'client', 'customer name', 'client name', 'unknown customer', 'unknown client',
+))
+MIN_NAME_LENGTH = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    address TEXT,
+    city TEXT,
+    country TEXT,
+    documents INTEGER NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS customers_normalized_name ON customers (tenant_id, normalized_name);
+CREATE INDEX IF NOT EXISTS customers_last_seen ON customers (tenant_id, last_seen);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+    customer_name, content='customers', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS customers_insert AFTER INSERT ON customers BEGIN
+    INSERT INTO customers_fts (rowid, customer_name) VALUES (new.id, new.customer_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_delete AFTER DELETE ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, customer_name) VALUES ('delete', old.id, old.customer_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_update AFTER UPDATE OF customer_name ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, customer_name) VALUES ('delete', old.id, old.customer_name);
+    INSERT INTO customers_fts (rowid, customer_name) VALUES (new.id, new.customer_name);
+END;
+"""
+
+# A customer seen before keeps its stored name; details given this time replace stored ones
+UPSERT = """
+INSERT INTO customers (tenant_id, normalized_name, customer_name, address, city, country, documents, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+ON CONFLICT (tenant_id, normalized_name) DO UPDATE SET
+    address = coalesce(excluded.address, address), city = coalesce(excluded.city, city),
+    country = coalesce(excluded.country, country), documents = documents + 1, last_seen = excluded.last_seen
+"""
+
+COLUMNS = ', '.join(
+    f'customers.{column}' for column in ('customer_name', 'address', 'city', 'country', 'documents', 'last_seen')
+)
+
+def normalize_name(name: str) -> str:
+    """Lower-case words of a customer name without punctuation, titles or legal suffixes"""
+    words = WORD_PATTERN.findall(name.lower().replace('&', ' and '))
+    while len(words) > 1 and words[0] in TITLES:
+        words.pop(0)
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+def is_placeholder(normalized: str) -> bool:
+    """Whether a normalized name stands for no customer ('N/A', 'Unknown') or is too short to tell customers apart"""
+    return normalized in PLACEHOLDER_NAMES or len(normalized.replace(' ', '')) < MIN_NAME_LENGTH
+
+def _clean(value: Any) -> Optional[str]:
+    text = ' '.join(str(value).split()) if value is not None else ''
+    return text or None
+
+class CustomerDirectory:
+    """
+    Customers of past invoices and quotes, in SQLite.
+
+    Each extraction records its customer_name, address, city and country
+    under the normalized name, so 'Tech Corp Ltd.' and 'tech corp' are one
+    customer. Names are looked up exactly by normalized name, then by trigram
+    similarity through an FTS5 index. Extractions are completed from the
+    directory when the match is confident and get a suggestion otherwise, and
+    requests carry a one-line reference for each known customer they mention.
+    """
+
+    def __init__(self, path: str = CUSTOMER_DIRECTORY_PATH, prompt_rows: int = CUSTOMER_PROMPT_ROWS,
+                 threshold: float = CUSTOMER_MATCH_THRESHOLD, confident: float = CUSTOMER_CONFIDENT_THRESHOLD):
+        self.path = path
+        self.prompt_rows = prompt_rows
+        self.threshold = threshold
+        self.confident = confident
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _query(self, sql: str, parameters: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute(sql, parameters).fetchall()]
+        finally:
+            connection.close()
+
+    def record(self, customers: Iterable[Dict[str, Any]], tenant_id: Optional[str] = None) -> int:
+        """
+        Add or update the customers of extracted documents in one transaction.
+
+        Args:
+            customers: Documents (or dicts) with customer_name, address, city and country
+            tenant_id: Tenant owning the customers (shared default directory if omitted)
+
+        Returns:
+            Number of customers written (documents without a customer_name, or
+            with a placeholder such as 'N/A' or 'Unknown', are skipped)
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = []
+        for customer in customers:
+            name = _clean(customer.get('customer_name'))
+            normalized = normalize_name(name or '')
+            if not is_placeholder(normalized):
+                rows.append((tenant_id or '', normalized, name,
+                             *(_clean(customer.get(field)) for field in CUSTOMER_FIELDS), now, now))
+        if not rows:
+            return 0
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(UPSERT, rows)
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return len(rows)
+
+    def _match_names(self, query: str, tenant_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Customers whose name matches an FTS5 query, best matches first"""
+        return self._query(
+            f"SELECT {COLUMNS} FROM customers_fts JOIN customers ON customers.id = customers_fts.rowid "
+            "WHERE customers.tenant_id = ? AND customers_fts MATCH ? ORDER BY customers_fts.rank LIMIT ?",
+            (tenant_id or '', query, limit)
+        )
+
+    def _lookup(self, name: str, tenant_id: Optional[str]) -> Tuple[Optional[Dict[str, Any]], float]:
+        """The known customer a name refers to and its similarity (1.0 for the same normalized name)"""
+        normalized = normalize_name(name or '')
+        if is_placeholder(normalized):
+            return None, 0.0
+        rows = self._query(
+            f"SELECT {COLUMNS} FROM customers WHERE tenant_id = ? AND normalized_name = ?", (tenant_id or '', normalized)
+        )
+        if rows:
+            return rows[0], 1.0
+
+        # Every three characters of the name, spaces included, as the trigram tokenizer indexed them
+        grams = sorted({normalized[index:index + 3] for index in range(len(normalized) - 2)})
+        best, best_score = None, self.threshold
+        for candidate in self._match_names(' OR '.join(f'"{gram}"' for gram in grams), tenant_id, 20):
+            score = similarity(normalize_name(candidate['customer_name']), normalized)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best, best_score if best else 0.0
+
+    def find(self, name: str, tenant_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        The known customer a name refers to.
+
+        Looks up the normalized name first, then names sharing the most
+        trigrams with it (so misspellings still match), keeping the most
+        similar one at or above the threshold.
+        """
+        return self._lookup(name, tenant_id)[0]
+
+    def complete(self, data: Dict[str, Any], tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fill a document's missing customer details from the directory.
+
+        On a confident match (the same normalized name, or a similarity of at
+        least `confident`) the stored name replaces the extracted spelling,
+        and address, city and country are filled only where the extraction
+        has none. A weaker match above the threshold changes nothing but adds
+        its name as customer_suggestion, since it may be another customer.
+
+        Returns:
+            New document dict; data is left untouched
+        """
+        match, score = self._lookup(str(data.get('customer_name') or ''), tenant_id)
+        if match is None:
+            return data
+        if score < self.confident:
+            return {**data, 'customer_suggestion': match['customer_name']}
+        completed = {**data, 'customer_name': match['customer_name']}
+        for field in CUSTOMER_FIELDS:
+            if not _clean(data.get(field)) and match.get(field):
+                completed[field] = match[field]
+        return completed
+
+    def relevant_customers(self, text: str, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Known customers a request names in full, in order of mention.
+
+        Every run of up to MAX_NAME_WORDS words is normalized and looked up
+        in the normalized-name index, so this costs a few index probes
+        whatever the directory size.
+        """
+        words = WORD_PATTERN.findall(text.lower().replace('&', ' and '))
+        windows = {}
+        for start in range(len(words)):
+            for stop in range(start + 1, min(start + MAX_NAME_WORDS, len(words)) + 1):
+                windows.setdefault(normalize_name(' '.join(words[start:stop])), len(windows))
+        if not windows:
+            return []
+        found = []
+        names = list(windows)
+        for offset in range(0, len(names), 500):
+            chunk = names[offset:offset + 500]
+            found += self._query(
+                f"SELECT {COLUMNS}, customers.normalized_name FROM customers "
+                f"WHERE tenant_id = ? AND normalized_name IN ({', '.join('?' * len(chunk))})",
+                (tenant_id or '', *chunk)
+            )
+        found.sort(key=lambda customer: windows[customer.pop('normalized_name')])
+        return found[:self.prompt_rows]
+
+    def prompt_reference(self, text: str, tenant_id: Optional[str] = None) -> str:
+        """
+        Compact customer block to append to a request, or '' when it names no known customer.
+
+        One line per customer (name, address, city, country), so the request
+        needn't repeat details the directory already has.
+        """
+        customers = self.relevant_customers(text, tenant_id)
+        if not customers:
+            return ''
+        lines = [
+            "- " + " | ".join(customer.get(field) or '-' for field in ('customer_name',) + CUSTOMER_FIELDS)
+            for customer in customers
+        ]
+        return (
+            "Known customers that may match this request (name | address | city | country). For a matching "
+            "customer, use this name, and this address, city and country unless the request gives others:\n"
+            + "\n".join(lines)
+        )
+
+    def search(self, query: Optional[str] = None, tenant_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Customers whose name contains the query (best matches first), or the most recent ones without a query"""
+        query = (query or '').strip()
+        if len(query) >= 3:
+            return self._match_names('"' + query.replace('"', '""') + '"', tenant_id, limit)
+        if query:
+            return self._query(
+                f"SELECT {COLUMNS} FROM customers WHERE tenant_id = ? AND customer_name LIKE ? "
+                "ORDER BY last_seen DESC LIMIT ?",
+                (tenant_id or '', query.replace('%', '').replace('_', '') + '%', limit)
+            )
+        return self._query(
+            f"SELECT {COLUMNS} FROM customers WHERE tenant_id = ? ORDER BY last_seen DESC LIMIT ?",
+            (tenant_id or '', limit)
+        )
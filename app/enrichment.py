@@ -0,0 +1,293 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Any, List, Optional, Sequence, Union
+
+import numpy as np
+
+# Fixed-point scales: money in minor units (cents/kobo), quantities and percentage rates to 4 decimals
+MONEY_SCALE = 100
+QUANTITY_SCALE = 10_000
+RATE_SCALE = 10_000  # Units per percentage point
+
+# Products above this go through Python ints instead of int64 (2x headroom for half-up rounding)
+INT64_SAFE = 2 ** 62
+FLOAT_EXACT = 2 ** 52  # Scaled floats below this are exact enough to round in NumPy
+
+def to_fixed(value: Any, scale: int) -> int:
+    """
+    Fixed-point integer for a JSON number, rounded half-up (away from zero).
+
+    Floats are read by their shortest decimal repr, so 0.1 is exactly 1/10
+    and 1.005 rounds to 1.01 like a person would expect.
+    """
+    if isinstance(value, int):
+        return value * scale
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value) * scale
+        return int((Decimal(repr(value)) * scale).to_integral_value(rounding=ROUND_HALF_UP))
+    if value is None:
+        return 0
+    raise ValueError(f"Expected a number, got {value!r}")
+
+def round_div(numerator: int, denominator: int) -> int:
+    """Integer division rounded half-up (away from zero); denominator must be positive"""
+    quotient = (2 * abs(numerator) + denominator) // (2 * denominator)
+    return quotient if numerator >= 0 else -quotient
+
+def line_amount(quantity: int, unit_price: int) -> int:
+    """Minor units of quantity (QUANTITY_SCALE) x unit price (minor units)"""
+    return round_div(quantity * unit_price, QUANTITY_SCALE)
+
+def rate_amount(base: int, rate: int) -> int:
+    """Minor units of a percentage rate (RATE_SCALE) applied to an amount in minor units"""
+    return round_div(base * rate, 100 * RATE_SCALE)
+
+def from_minor(amount: int) -> float:
+    return amount / MONEY_SCALE
+
+def _round_div_array(numerator: np.ndarray, denominator: int) -> np.ndarray:
+    """Vectorized round_div; works on int64 and Python-int object arrays alike"""
+    quotient = (2 * np.abs(numerator) + denominator) // (2 * denominator)
+    return np.where(numerator >= 0, quotient, -quotient)
+
+def _to_fixed_array(values: List[Any], scale: int) -> np.ndarray:
+    """
+    Vectorized to_fixed.
+
+    Scaled floats that land within a hair of an integer can only have come from
+    a value with at most the scale's decimals, so NumPy rounding is exact for
+    them; everything else (more decimals, huge or non-numeric values) goes
+    through to_fixed so both paths always agree.
+    """
+    array = np.array(values)
+    if array.dtype.kind in 'iub' and (array.size == 0 or int(np.abs(array).max()) * scale < INT64_SAFE):
+        return array.astype(np.int64) * scale
+    if array.dtype.kind != 'f':
+        return _object_or_int64([to_fixed(value, scale) for value in values])
+
+    scaled = array * scale
+    rounded = np.rint(scaled)
+    exact = (np.abs(scaled - rounded) < 1e-6) & (np.abs(scaled) < FLOAT_EXACT)
+    if exact.all():
+        return rounded.astype(np.int64)
+    result = rounded.astype(np.int64)
+    for index in np.flatnonzero(~exact):
+        fixed = to_fixed(values[index], scale)
+        if abs(fixed) >= INT64_SAFE:
+            return _object_or_int64([to_fixed(value, scale) for value in values])
+        result[index] = fixed
+    return result
+
+def _object_or_int64(values: List[int]) -> np.ndarray:
+    if values and max(abs(value) for value in values) >= INT64_SAFE:
+        return np.array(values, dtype=object)
+    return np.array(values, dtype=np.int64)
+
+def _product_fits(left: np.ndarray, right: np.ndarray) -> bool:
+    """Whether every elementwise product (and its doubling) stays inside int64"""
+    if left.size == 0 or left.dtype == object or right.dtype == object:
+        return left.size == 0
+    return int(np.abs(left).max()) * int(np.abs(right).max()) < INT64_SAFE
+
+def _multiply(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    if _product_fits(left, right):
+        return left * right
+    return left.astype(object) * right.astype(object)
+
+def _widen_for_sum(*arrays: np.ndarray) -> List[np.ndarray]:
+    """Switch to Python ints when adding these arrays up could overflow int64"""
+    bound = sum(int(np.abs(array).max()) * len(array) for array in arrays if array.size and array.dtype != object)
+    if bound < INT64_SAFE and all(array.dtype != object for array in arrays):
+        return list(arrays)
+    return [array.astype(object) for array in arrays]
+
+def _to_floats(amounts: np.ndarray) -> List[float]:
+    """Minor units back to JSON floats, identical to from_minor"""
+    if amounts.dtype != object and (amounts.size == 0 or np.abs(amounts).max() < FLOAT_EXACT):
+        return (amounts.astype(np.float64) / MONEY_SCALE).tolist()
+    return [from_minor(int(amount)) for amount in amounts]
+
+class BatchTotals:
+    """Columnar totals of a batch, all money in minor units"""
+
+    def __init__(self, offsets: np.ndarray, item_amounts: np.ndarray, subtotals: np.ndarray, tax_rates: np.ndarray,
+                 tax_amounts: np.ndarray, delivery_rates: np.ndarray, delivery_amounts: np.ndarray, totals: np.ndarray):
+        self.offsets = offsets  # Items of document i are item_amounts[offsets[i]:offsets[i + 1]]
+        self.item_amounts = item_amounts
+        self.subtotals = subtotals
+        self.tax_rates = tax_rates  # Percentages as given or defaulted
+        self.tax_amounts = tax_amounts
+        self.delivery_rates = delivery_rates
+        self.delivery_amounts = delivery_amounts
+        self.totals = totals
+
+class EnrichmentEngine:
+    """
+    Amounts, subtotal, tax, delivery and total for invoices and quotes.
+
+    All arithmetic is fixed-point integers in minor currency units with half-up
+    rounding, so totals are exact to the cent. enrich() handles one document;
+    enrich_batch() computes many documents in one columnar NumPy pass with
+    the same integer arithmetic, so both give identical results. Neither
+    mutates its input.
+    """
+
+    def __init__(self, default_tax_rate: float, default_delivery_rate: float):
+        self.default_tax_rate = default_tax_rate
+        self.default_delivery_rate = default_delivery_rate
+
+    def _rate(self, data: Dict[str, Any], field: str, default: float, subtotal: int) -> Any:
+        """Rate percentage, defaulted unless the document was enriched before (even at 0)"""
+        rate = data.get(field, 0)
+        if rate == 0 and subtotal > 0 and f'{field}_percentage' not in data:
+            rate = default
+        return rate
+
+    def enrich(self, data: Dict[str, Any], doc_type: str) -> Dict[str, Any]:
+        """
+        Totals of a single document, with pure Python integers.
+
+        Items keep a provided 'amount' (rounded to the cent) and otherwise get
+        quantity x unit_price. Rates are read as percentages (8 for 8%).
+
+        Returns:
+            New document dict with item amounts, subtotal, rates (decimal and
+            percentage), tax, delivery (invoices only) and total
+        """
+        items = []
+        subtotal = 0
+        for item in data.get('items', []):
+            if 'amount' in item:
+                amount = to_fixed(item['amount'], MONEY_SCALE)
+            else:
+                amount = line_amount(to_fixed(item.get('quantity', 0), QUANTITY_SCALE),
+                                     to_fixed(item.get('unit_price', 0), MONEY_SCALE))
+            subtotal += amount
+            items.append({**item, 'amount': from_minor(amount)})
+
+        tax_rate = self._rate(data, 'tax_rate', self.default_tax_rate, subtotal)
+        tax_amount = rate_amount(subtotal, to_fixed(tax_rate, RATE_SCALE))
+        total = subtotal + tax_amount
+        enriched = {**data, 'items': items, 'subtotal': from_minor(subtotal),
+                    'tax_rate_percentage': tax_rate, 'tax_rate': tax_rate / 100, 'tax_amount': from_minor(tax_amount)}
+
+        if doc_type == 'invoice':
+            delivery_rate = self._rate(data, 'delivery_rate', self.default_delivery_rate, subtotal)
+            delivery_amount = rate_amount(subtotal, to_fixed(delivery_rate, RATE_SCALE))
+            total += delivery_amount
+            enriched.update(delivery_rate_percentage=delivery_rate, delivery_rate=delivery_rate / 100,
+                            delivery_amount=from_minor(delivery_amount))
+
+        enriched['total'] = from_minor(total)
+        return enriched
+
+    def batch_totals(self, documents: Sequence[Dict[str, Any]], doc_types: Union[str, Sequence[str]]) -> BatchTotals:
+        """
+        Columnar totals for many documents in one pass.
+
+        Line items of every document are flattened into quantity, price and
+        amount columns; subtotals are differences of one cumulative sum.
+        """
+        if isinstance(doc_types, str):
+            doc_types = [doc_types] * len(documents)
+
+        counts = [len(data.get('items', [])) for data in documents]
+        items = [item for data in documents for item in data.get('items', [])]
+        has_amount = ['amount' in item for item in items]
+        if any(has_amount):
+            given_amounts = [item.get('amount', 0) for item in items]
+            quantities = [0 if given else item.get('quantity', 0) for item, given in zip(items, has_amount)]
+            prices = [0 if given else item.get('unit_price', 0) for item, given in zip(items, has_amount)]
+        else:
+            given_amounts = [0] * len(items)
+            quantities = [item.get('quantity', 0) for item in items]
+            prices = [item.get('unit_price', 0) for item in items]
+
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        products = _multiply(_to_fixed_array(quantities, QUANTITY_SCALE), _to_fixed_array(prices, MONEY_SCALE))
+        item_amounts = np.where(np.array(has_amount, dtype=bool), _to_fixed_array(given_amounts, MONEY_SCALE),
+                                _round_div_array(products, QUANTITY_SCALE))
+
+        item_amounts, = _widen_for_sum(item_amounts)
+        running = np.zeros(len(item_amounts) + 1, dtype=item_amounts.dtype)
+        np.cumsum(item_amounts, out=running[1:])
+        subtotals = running[offsets[1:]] - running[offsets[:-1]]
+
+        def rates(field: str, default: float, applies: Optional[Sequence[bool]] = None):
+            percentages = [
+                self._rate(data, field, default, int(subtotal)) if applies is None or applies[index] else 0
+                for index, (data, subtotal) in enumerate(zip(documents, subtotals))
+            ]
+            amounts = _round_div_array(_multiply(subtotals, _to_fixed_array(percentages, RATE_SCALE)), 100 * RATE_SCALE)
+            return np.array(percentages, dtype=object), amounts
+
+        tax_rates, tax_amounts = rates('tax_rate', self.default_tax_rate)
+        is_invoice = [doc_type == 'invoice' for doc_type in doc_types]
+        delivery_rates, delivery_amounts = rates('delivery_rate', self.default_delivery_rate, is_invoice)
+
+        parts = _widen_for_sum(subtotals, tax_amounts, delivery_amounts)
+        return BatchTotals(offsets, item_amounts, subtotals, tax_rates, tax_amounts, delivery_rates, delivery_amounts,
+                           parts[0] + parts[1] + parts[2])
+
+    def enrich_batch(self, documents: Sequence[Dict[str, Any]], doc_types: Union[str, Sequence[str]]) -> List[Dict[str, Any]]:
+        """Enrich many documents at once; same output as enrich() on each document"""
+        if isinstance(doc_types, str):
+            doc_types = [doc_types] * len(documents)
+        totals = self.batch_totals(documents, doc_types)
+
+        item_amounts = _to_floats(totals.item_amounts)
+        subtotals = _to_floats(totals.subtotals)
+        tax_amounts = _to_floats(totals.tax_amounts)
+        delivery_amounts = _to_floats(totals.delivery_amounts)
+        document_totals = _to_floats(totals.totals)
+        offsets = totals.offsets.tolist()
+
+        enriched_documents = []
+        for index, (data, doc_type) in enumerate(zip(documents, doc_types)):
+            items = [
+                {**item, 'amount': amount}
+                for item, amount in zip(data.get('items', []), item_amounts[offsets[index]:offsets[index + 1]])
+            ]
+            tax_rate = totals.tax_rates[index]
+            enriched = {**data, 'items': items, 'subtotal': subtotals[index],
+                        'tax_rate_percentage': tax_rate, 'tax_rate': tax_rate / 100, 'tax_amount': tax_amounts[index]}
+            if doc_type == 'invoice':
+                delivery_rate = totals.delivery_rates[index]
+                enriched.update(delivery_rate_percentage=delivery_rate, delivery_rate=delivery_rate / 100,
+                                delivery_amount=delivery_amounts[index])
+            enriched['total'] = document_totals[index]
+            enriched_documents.append(enriched)
+        return enriched_documents
+
+    def enrich_inventory(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Tax rate formats, profit and stock value of one inventory item.
+
+        tax_rate is read as a percentage (7.5 for 7.5%). Profit needs both a
+        cost and a unit price above 0, stock value a quantity and a cost.
+
+        Returns:
+            New item dict with tax_rate (decimal), tax_rate_percentage,
+            profit_margin (% of cost), profit_per_unit and total_stock_value
+        """
+        data = dict(data)
+        tax_rate = data.get('tax_rate', 0)
+        data['tax_rate_percentage'] = tax_rate
+        data['tax_rate'] = tax_rate / 100
+
+        if data.get('cost_price', 0) > 0 and data.get('unit_price', 0) > 0:
+            profit = data['unit_price'] - data['cost_price']
+            data['profit_margin'] = (profit / data['cost_price']) * 100
+            data['profit_per_unit'] = profit
+        else:
+            data['profit_margin'] = 0
+            data['profit_per_unit'] = 0
+
+        if data.get('quantity_on_hand') and data.get('cost_price', 0) > 0:
+            data['total_stock_value'] = data['quantity_on_hand'] * data['cost_price']
+        else:
+            data['total_stock_value'] = 0
+        return data
+
@@ -1,204 +1,696 @@
+import os
+import csv
+import asyncio
+import threading
+import zipfile
+from array import array
+from collections import deque
+from copy import copy as shallow_copy, deepcopy
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
-from typing import Dict, Any
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple, BinaryIO, Iterator, List
+import reportlab
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, create_string_object
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, Flowable
+from reportlab.platypus import Image as PdfImage
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from PIL import Image, ImageDraw, ImageFont
+from docx.oxml.ns import qn
+from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageOps, features
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 import io
 
+# Configuration: export templates
+EXPORT_FONT_PATH = os.getenv('EXPORT_FONT_PATH')  # TTF used for PNG output (and embedded in PDFs)
+TENANT_TEMPLATES = dict(  # e.g. "acme:modern,globex:minimal"
+    entry.split(':', 1) for entry in os.getenv('TENANT_TEMPLATES', '').split(',') if ':' in entry
+)
+
+# Configuration: PDF output
+PDF_PAGE_COMPRESSION = os.getenv('PDF_PAGE_COMPRESSION', 'true').lower() == 'true'
+PDF_FONT = os.getenv('PDF_FONT', 'auto')  # 'auto', 'embedded' or 'builtin' (see ExportService.normalize_options)
+PDF_LOGO_DPI = int(os.getenv('PDF_LOGO_DPI', '150'))  # Logos are downsampled to this resolution (0 = embed as-is)
+EXPORT_LOGO_PATH = os.getenv('EXPORT_LOGO_PATH')  # Logo for the built-in templates' PDF header
+
+# Configuration: large documents
+EXPORT_IMAGE_MAX_HEIGHT = int(os.getenv('EXPORT_IMAGE_MAX_HEIGHT', '10000'))  # Taller PNGs are split into pages, returned as a ZIP
+
+# Configuration: image encoding and previews
+PNG_COMPRESS_LEVEL = int(os.getenv('PNG_COMPRESS_LEVEL', '6'))  # zlib level 0-9; lower is faster, larger
+PNG_OPTIMIZE = os.getenv('PNG_OPTIMIZE', 'false').lower() == 'true'  # Extra encoder pass for smaller files (slow)
+PREVIEW_WIDTH = int(os.getenv('PREVIEW_WIDTH', '400'))
+PREVIEW_FORMAT = os.getenv('PREVIEW_FORMAT', 'webp')  # 'webp' or 'jpeg'
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', '60'))
+
+HTML_TEMPLATES_DIR = Path(__file__).parent / "templates"
+HTML_CHUNK_SIZE = 16 * 1024
+
+# Spreadsheet exports: one row per document, and one per line item keyed by document number
+DOCUMENT_COLUMNS = ('document_type', 'document_number', 'date', 'customer_name', 'address', 'city', 'country',
+                    'currency', 'items', 'subtotal', 'tax_rate', 'tax_amount', 'delivery_rate', 'delivery_amount', 'total')
+ITEM_COLUMNS = ('document_type', 'document_number', 'date', 'customer_name', 'currency',
+                'line', 'description', 'quantity', 'unit_price', 'amount')
+CSV_ROWS = ('items', 'documents')
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')  # Text starting with these is run as a formula by spreadsheet apps
+
+PREVIEW_MIN_WIDTH = 100
+IMAGE_FONT_SIZES = {'title': 32, 'heading': 16, 'text': 12}
+
+IMAGE_WIDTH = 800
+IMAGE_PAGE_HEIGHT = 1000
+IMAGE_MARGIN = 50
+TABLE_MEASURE_CHUNK = 200  # Rows measured per reportlab table when sizing long item tables
+
+FONT_CANDIDATES = (
+    'arial.ttf',
+    'DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial.ttf',
+    str(Path(reportlab.__file__).parent / 'fonts' / 'Vera.ttf'),  # Always shipped with reportlab
+)
+
+# Bold faces next to the regular fonts above, used for embedded PDF fonts
+BOLD_FONT_FILES = {
+    'arial.ttf': 'arialbd.ttf',
+    'Arial.ttf': 'Arial Bold.ttf',
+    'DejaVuSans.ttf': 'DejaVuSans-Bold.ttf',
+    'Vera.ttf': 'VeraBd.ttf',
+}
+
+PDF_BUILTIN_FONTS = ('Helvetica', 'Helvetica-Bold')
+PDF_EMBEDDED_FONTS = ('ExportSans', 'ExportSans-Bold')
+
+@lru_cache(maxsize=None)
+def _find_font_path() -> Optional[str]:
+    """Resolve the first loadable TrueType font once per process"""
+    candidates = ((EXPORT_FONT_PATH,) if EXPORT_FONT_PATH else ()) + FONT_CANDIDATES
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, 12).path  # Full path, as reportlab doesn't search font dirs
+        except OSError:
+            continue
+    return None
+
+@lru_cache(maxsize=None)
+def _register_pdf_fonts() -> Optional[Tuple[str, str]]:
+    """
+    Register the TrueType font with reportlab once per process.
+
+    reportlab embeds only the glyphs a document uses (a subset), so the
+    cost is a few KB per document rather than the whole font file.
+
+    Returns:
+        (regular, bold) font names, or None when no TrueType font is available
+    """
+    font_path = _find_font_path()
+    if font_path is None:
+        return None
+    bold_path = Path(font_path).with_name(BOLD_FONT_FILES.get(Path(font_path).name, Path(font_path).name))
+    regular, bold = PDF_EMBEDDED_FONTS
+    pdfmetrics.registerFont(TTFont(regular, font_path))
+    pdfmetrics.registerFont(TTFont(bold, str(bold_path) if bold_path.exists() else font_path))
+    pdfmetrics.registerFontFamily(regular, normal=regular, bold=bold, italic=regular, boldItalic=bold)
+    return regular, bold
+
+def _needs_embedded_font(layout: Dict[str, Any]) -> bool:
+    """Whether any text falls outside WinAnsi, the only encoding the built-in PDF fonts cover"""
+    texts = [layout['doc_number'], layout['date'], layout['customer_name'], layout['address'], layout['locality']]
+    texts.extend(value for row in layout['items'] for value in row)
+    try:
+        '\n'.join(texts).encode('cp1252')
+        return False
+    except UnicodeEncodeError:
+        return True
+
+def _downsample_logo(path: str, width_inches: float, dpi: int) -> Tuple[bytes, float, float]:
+    """
+    Shrink a logo to the resolution it is printed at.
+
+    Returns:
+        Tuple of (image bytes, display width, display height) in points
+    """
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        display_width = width_inches * inch
+        display_height = display_width * height / width
+        if not dpi:
+            return Path(path).read_bytes(), display_width, display_height
+
+        target_width = round(width_inches * dpi)
+        if width > target_width:
+            img = img.resize((target_width, max(1, round(height * target_width / width))), Image.LANCZOS)
+
+        buffer = BytesIO()
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img.save(buffer, format='PNG', optimize=True)
+        else:
+            img.convert('RGB').save(buffer, format='JPEG', quality=85, optimize=True)
+        return buffer.getvalue(), display_width, display_height
+
+@lru_cache(maxsize=None)
+def _html_template() -> Template:
+    """Compile the HTML export template once per process"""
+    environment = Environment(
+        loader=FileSystemLoader(HTML_TEMPLATES_DIR),
+        autoescape=select_autoescape(['html']),
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    return environment.get_template('document.html')
+
+def _cell_text(value: Any) -> Any:
+    """Spreadsheet-safe cell value: numbers pass through, formula-like text is quoted"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value)
+    if text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+class GlyphFont:
+    """
+    TrueType font with a per-character glyph cache.
+
+    FreeType re-rasterizes every glyph on each draw.text() call, which
+    dominates PNG rendering; cached glyph masks are pasted instead, giving
+    the same pixels several times faster.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self._glyphs = {}
+
+    def _glyph(self, char: str):
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            left, top, right, bottom = self.font.getbbox(char)
+            mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+            ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=self.font)
+            glyph = self._glyphs[char] = (mask, left, top, self.font.getlength(char), not char.isspace())
+        return glyph
+
+    def draw(self, img: Image.Image, xy: Tuple[float, float], text: str, fill: str):
+        """Draw left/top anchored text, as ImageDraw.text() would"""
+        x, y = xy
+        ink = ImageColor.getcolor(fill, img.mode)
+        for char in text:
+            mask, left, top, advance, visible = self._glyph(char)
+            if visible:
+                img.paste(ink, (round(x + left), round(y) + top), mask)
+            x += advance
+
+class PagedItemsTable(Flowable):
+    """
+    Item table that paginates in linear time, repeating the header on every page.
+
+    A single LongTable re-measures all remaining rows at each page break, which
+    is quadratic for thousands of items. Row heights are measured once here (in
+    chunks) and each split cuts off exactly one page worth of rows.
+    """
+
+    def __init__(self, header: List[str], rows: List[List[str]], col_widths: List[float], style: TableStyle,
+                 row_heights: Optional[List[float]] = None):
+        super().__init__()
+        self.header = header
+        self.rows = rows
+        self.col_widths = col_widths
+        self.style = style
+        self._row_heights = row_heights
+
+    def _table(self, rows: List[List[str]]) -> LongTable:
+        table = LongTable([self.header] + rows, colWidths=self.col_widths, repeatRows=1)
+        table.setStyle(self.style)
+        return table
+
+    def wrap(self, availWidth, availHeight):
+        if self._row_heights is None:
+            self._row_heights = []
+            for start in range(0, max(len(self.rows), 1), TABLE_MEASURE_CHUNK):
+                table = self._table(self.rows[start:start + TABLE_MEASURE_CHUNK])
+                table.wrap(availWidth, availHeight)
+                self._row_heights += table._rowHeights if start == 0 else table._rowHeights[1:]
+        self.width = sum(self.col_widths)
+        self.height = sum(self._row_heights)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        self.wrap(availWidth, availHeight)
+        used = self._row_heights[0]
+        fits = 0
+        for height in self._row_heights[1:]:
+            if used + height > availHeight:
+                break
+            used += height
+            fits += 1
+        if fits == 0:
+            return []
+        remaining_heights = self._row_heights[:1] + self._row_heights[1 + fits:]
+        return [
+            self._table(self.rows[:fits]),
+            PagedItemsTable(self.header, self.rows[fits:], self.col_widths, self.style, remaining_heights)
+        ]
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        table = self._table(self.rows)
+        table.wrap(self.width, self.height)
+        table.drawOn(canvas, x, y, _sW)
+
+# ExportTemplate attributes that define a template (everything else on it is a cache)
+TEMPLATE_SETTINGS = frozenset((
+    'name', 'version', 'title_color', 'header_background', 'header_text_color', 'grid_color', 'docx_table_style',
+    'logo_path', 'logo_width_inches', 'logo_dpi',
+))
+
+class ExportTemplate:
+    """
+    Branding for exported documents.
+
+    Paragraph styles, table styles and fonts are built on first use and
+    cached on the template, so renders only pay for laying out the data.
+    Bump `version` whenever the branding changes.
+    """
+
+    def __init__(self, name: str, version: int = 1, title_color: str = '#1a1a1a',
+                 header_background: str = '#808080', header_text_color: str = '#f5f5f5',
+                 grid_color: str = '#000000', docx_table_style: str = 'Light Grid Accent 1',
+                 logo_path: Optional[str] = None, logo_width_inches: float = 1.5, logo_dpi: int = PDF_LOGO_DPI):
+        self.name = name
+        self.version = version
+        self.title_color = title_color
+        self.header_background = header_background
+        self.header_text_color = header_text_color
+        self.grid_color = grid_color
+        self.docx_table_style = docx_table_style
+        self.logo_path = logo_path
+        self.logo_width_inches = logo_width_inches
+        self.logo_dpi = logo_dpi
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Pickled for process pool workers: only the branding travels, cached styles and fonts are rebuilt there
+        return {key: value for key, value in self.__dict__.items() if key in TEMPLATE_SETTINGS}
+
+    @cached_property
+    def pdf_styles(self) -> Dict[str, Any]:
+        return self.pdf_styles_for(PDF_BUILTIN_FONTS)
+
+    def pdf_styles_for(self, fonts: Tuple[str, str]) -> Dict[str, Any]:
+        """PDF styles using a (regular, bold) font pair, cached per pair"""
+        cache = self.__dict__.setdefault('_pdf_styles', {})
+        if fonts not in cache:
+            cache[fonts] = self._build_pdf_styles(*fonts)
+        return cache[fonts]
+
+    def _build_pdf_styles(self, regular: str, bold: str) -> Dict[str, Any]:
+        styles = getSampleStyleSheet()
+        return {
+            'heading': ParagraphStyle(f'{self.name}Heading', parent=styles['Heading2'], fontName=bold),
+            'normal': ParagraphStyle(f'{self.name}Normal', parent=styles['Normal'], fontName=regular),
+            'title': ParagraphStyle(
+                f'{self.name}Title',
+                parent=styles['Heading1'],
+                fontName=bold,
+                fontSize=24,
+                textColor=colors.HexColor(self.title_color),
+                spaceAfter=30,
+                alignment=TA_CENTER
+            ),
+            'info_table': TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), bold),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
+            ]),
+            'items_table': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(self.header_background)),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor(self.header_text_color)),
+                ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+                ('FONTNAME', (0, 1), (-1, -1), regular),
+                ('FONTNAME', (0, 0), (-1, 0), bold),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor(self.grid_color)),
+            ]),
+            'totals_table': TableStyle([
+                ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+                ('FONTNAME', (0, 0), (-1, -1), regular),
+                ('FONTNAME', (0, -1), (-1, -1), bold),
+                ('FONTSIZE', (0, -1), (-1, -1), 14),
+                ('LINEABOVE', (0, -1), (-1, -1), 2, colors.HexColor(self.grid_color)),
+                ('TOPPADDING', (0, -1), (-1, -1), 10),
+            ]),
+        }
+
+    @cached_property
+    def pdf_logo(self) -> Optional[Tuple[bytes, float, float]]:
+        """Logo downsampled once for the PDF header, or None"""
+        if not self.logo_path:
+            return None
+        return _downsample_logo(self.logo_path, self.logo_width_inches, self.logo_dpi)
+
+    @cached_property
+    def image_fonts(self) -> Dict[str, GlyphFont]:
+        return self.scaled_image_fonts(1.0)
+
+    def scaled_image_fonts(self, scale: float) -> Dict[str, GlyphFont]:
+        """Image fonts at a scale (previews), cached per scale"""
+        cache = self.__dict__.setdefault('_scaled_image_fonts', {})
+        if scale not in cache:
+            font_path = _find_font_path()
+            if font_path is None:
+                default = GlyphFont(ImageFont.load_default())
+                cache[scale] = {name: default for name in IMAGE_FONT_SIZES}
+            else:
+                cache[scale] = {
+                    name: GlyphFont(ImageFont.truetype(font_path, max(1, round(size * scale))))
+                    for name, size in IMAGE_FONT_SIZES.items()
+                }
+        return cache[scale]
+
+# Built-in templates; tenants map onto these through TENANT_TEMPLATES
+EXPORT_TEMPLATES = {
+    'default': ExportTemplate('default', logo_path=EXPORT_LOGO_PATH),
+    'modern': ExportTemplate('modern', title_color='#0b3d91', header_background='#0b3d91',
+                             header_text_color='#ffffff', grid_color='#c8d3e6', docx_table_style='Light Grid Accent 1',
+                             logo_path=EXPORT_LOGO_PATH),
+    'minimal': ExportTemplate('minimal', title_color='#000000', header_background='#ffffff',
+                              header_text_color='#000000', grid_color='#d9d9d9', docx_table_style='Table Grid',
+                              logo_path=EXPORT_LOGO_PATH),
+}
+
+# Configuration: renderer pool
+EXPORT_POOL_KIND = os.getenv('EXPORT_POOL_KIND', 'thread')  # 'thread' or 'process'
+EXPORT_POOL_WORKERS = int(os.getenv('EXPORT_POOL_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Rendered once per worker at startup so fonts, stylesheets and imports are loaded
+WARM_UP_DOCUMENT = {
+    'invoice_number': 'INV0',
+    'date': '2000-01-01',
+    'customer_name': 'Warm Up',
+    'address': '-',
+    'city': '-',
+    'country': '-',
+    'items': [{'description': 'Item', 'quantity': 1, 'unit_price': 1, 'amount': 1}],
+    'subtotal': 1,
+    'tax_rate': 0.075,
+    'tax_amount': 0.075,
+    'delivery_rate': 0.03,
+    'delivery_amount': 0.03,
+    'total': 1.105,
+    'currency': 'NGN',
+}
+
 class ExportService:
 
-    def generate_export(self, data: Dict[str, Any], doc_type: str, format: str = 'pdf') -> BytesIO:
+    def __init__(self):
+        self.templates: Dict[str, ExportTemplate] = dict(EXPORT_TEMPLATES)
+
+    def register_template(self, template: ExportTemplate):
+        """Add or replace a branding template"""
+        self.templates[template.name] = template
+
+    def get_template(self, name: Optional[str] = None, tenant: Optional[str] = None) -> ExportTemplate:
+        """Resolve a template by explicit name, then tenant mapping, then default"""
+        name = name or TENANT_TEMPLATES.get(tenant or '') or 'default'
+        if name not in self.templates:
+            raise ValueError(f"Unknown export template: {name}. Available: {', '.join(self.templates)}")
+        return self.templates[name]
+
+    def warm_up(self):
+        """Render a sample document with every template and format so the first real export is fast"""
+        _register_pdf_fonts()
+        for template in self.templates:
+            for format in ('pdf', 'docx', 'png', 'preview', 'html', 'csv', 'xlsx'):
+                self.generate_export(WARM_UP_DOCUMENT, 'invoice', format, template)
+
+    def generate_export(self, data: Dict[str, Any], doc_type: str, format: str = 'pdf', template: Optional[str] = None,
+                        options: Optional[Dict[str, Any]] = None) -> BytesIO:
         """
         Unified export method that generates documents in the specified format.
 
         Args:
             data: Document data dictionary
             doc_type: 'invoice' or 'quote'
-            format: Export format - 'pdf', 'docx', or 'png'
+            format: Export format - 'pdf', 'docx', 'png', 'preview', 'html', 'csv' or 'xlsx'
+            template: Branding template name (default template if omitted)
+            options: Format-specific render options (see normalize_options)
 
         Returns:
             BytesIO buffer containing the generated document
         """
+        export_template = self.get_template(template)
         if format.lower() == 'pdf':
-            return self.generate_pdf(data, doc_type)
+            return self.generate_pdf(data, doc_type, export_template, options)
         elif format.lower() == 'docx':
-            return self.generate_docx(data, doc_type)
+            return self.generate_docx(data, doc_type, export_template)
         elif format.lower() == 'png':
-            return self.generate_image(data, doc_type)
+            return self.generate_image(data, doc_type, export_template, options)
+        elif format.lower() == 'preview':
+            return self.generate_preview(data, doc_type, export_template, options)
+        elif format.lower() == 'html':
+            return self.generate_html(data, doc_type, export_template)
+        elif format.lower() == 'csv':
+            return self.generate_csv(data, doc_type, options)
+        elif format.lower() == 'xlsx':
+            return self.generate_xlsx(data, doc_type)
+        else:
+            raise ValueError(f"Unsupported export format: {format}. Supported formats: pdf, docx, png, preview, html, csv, xlsx")
+
+    def normalize_options(self, format: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Validate render options for a format and fill in defaults.
+
+        pdf: compress (bool), font ('auto' embeds a subset TrueType font only when
+             text needs it, 'embedded' always does, 'builtin' never does)
+        png: compress_level (0-9), optimize (bool)
+        preview: width (pixels), image_format ('webp' or 'jpeg'), quality (1-100)
+        csv: rows ('items' for one row per line item, 'documents' for one per document)
+
+        The result is stable for equivalent requests, so it can go into cache keys.
+        """
+        options = dict(options or {})
+        if format == 'pdf':
+            normalized = {
+                'compress': bool(options.pop('compress', PDF_PAGE_COMPRESSION)),
+                'font': str(options.pop('font', PDF_FONT)).lower(),
+            }
+            if normalized['font'] not in ('auto', 'embedded', 'builtin'):
+                raise ValueError("font must be 'auto', 'embedded' or 'builtin'")
+        elif format == 'png':
+            normalized = {
+                'compress_level': int(options.pop('compress_level', PNG_COMPRESS_LEVEL)),
+                'optimize': bool(options.pop('optimize', PNG_OPTIMIZE)),
+            }
+            if not 0 <= normalized['compress_level'] <= 9:
+                raise ValueError("compress_level must be between 0 and 9")
+        elif format == 'preview':
+            normalized = {
+                'width': int(options.pop('width', PREVIEW_WIDTH)),
+                'image_format': str(options.pop('image_format', PREVIEW_FORMAT)).lower().replace('jpg', 'jpeg'),
+                'quality': int(options.pop('quality', PREVIEW_QUALITY)),
+            }
+            if not PREVIEW_MIN_WIDTH <= normalized['width'] <= IMAGE_WIDTH:
+                raise ValueError(f"width must be between {PREVIEW_MIN_WIDTH} and {IMAGE_WIDTH}")
+            if normalized['image_format'] not in ('webp', 'jpeg'):
+                raise ValueError("image_format must be 'webp' or 'jpeg'")
+            if normalized['image_format'] == 'webp' and not features.check('webp'):
+                normalized['image_format'] = 'jpeg'  # Pillow built without libwebp
+            if not 1 <= normalized['quality'] <= 100:
+                raise ValueError("quality must be between 1 and 100")
+        elif format == 'csv':
+            normalized = {'rows': str(options.pop('rows', 'items')).lower()}
+            if normalized['rows'] not in CSV_ROWS:
+                raise ValueError(f"rows must be one of: {', '.join(CSV_ROWS)}")
         else:
-            raise ValueError(f"Unsupported export format: {format}. Supported formats: pdf, docx, png")
+            normalized = {}
+        if options:
+            raise ValueError(f"Unsupported options for {format}: {', '.join(sorted(options))}")
+        return normalized
+
+    def _layout(self, data: Dict[str, Any], doc_type: str) -> Dict[str, Any]:
+        """
+        Display text of a document, shared by every renderer.
+
+        Labels, number formatting and which totals appear are decided here
+        once, so PDF, DOCX, PNG and HTML exports always agree.
+        """
+        title = "INVOICE" if doc_type == 'invoice' else "QUOTATION"
+        currency = data.get('currency', 'NGN')
+
+        totals = [
+            ('Subtotal:', f"{currency} {data.get('subtotal', 0):,.2f}"),
+            (f"Tax ({data.get('tax_rate', 0)*100:.0f}%):", f"{currency} {data.get('tax_amount', 0):,.2f}"),
+        ]
+        if doc_type == 'invoice':
+            totals.append((f"Delivery ({data.get('delivery_rate', 0)*100:.0f}%):", f"{currency} {data.get('delivery_amount', 0):,.2f}"))
+
+        return {
+            'title': title,
+            'number_label': f"{title} Number:",
+            'doc_number': str(data.get('invoice_number' if doc_type == 'invoice' else 'quote_number', 'N/A')),
+            'date': str(data.get('date', 'N/A')),
+            'bill_label': "Bill To:" if doc_type == 'invoice' else "To:",
+            'customer_name': str(data.get('customer_name', 'N/A')),
+            'address': str(data.get('address', 'N/A')),
+            'locality': f"{data.get('city', 'N/A')}, {data.get('country', 'N/A')}",
+            'item_columns': ['Description', 'Quantity', 'Unit Price', 'Amount'],
+            'items': [
+                [
+                    str(item.get('description', '')),
+                    str(item.get('quantity', 0)),
+                    f"{currency} {item.get('unit_price', 0):,.2f}",
+                    f"{currency} {item.get('amount', 0):,.2f}"
+                ]
+                for item in data.get('items', [])
+            ],
+            'totals': totals,
+            'total': ('TOTAL:', f"{currency} {data.get('total', 0):,.2f}"),
+        }
+
+    def generate_pdf(self, data: Dict[str, Any], doc_type: str, template: Optional[ExportTemplate] = None,
+                     options: Optional[Dict[str, Any]] = None) -> BytesIO:
+        """
+        Generate PDF from document data.
+
+        Options: compress (page stream compression) and font ('auto', 'embedded'
+        or 'builtin'). Built-in Helvetica adds nothing to the file but only
+        covers Western European text; embedded fonts are subset TrueType.
+        """
+        template = template or self.get_template()
+        pdf_options = self.normalize_options('pdf', options)
+        layout = self._layout(data, doc_type)
+
+        fonts = PDF_BUILTIN_FONTS
+        if pdf_options['font'] == 'embedded' or (pdf_options['font'] == 'auto' and _needs_embedded_font(layout)):
+            fonts = _register_pdf_fonts() or PDF_BUILTIN_FONTS
+        styles = template.pdf_styles_for(fonts)
 
-    def generate_pdf(self, data: Dict[str, Any], doc_type: str) -> BytesIO:
-        """Generate PDF from document data"""
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, pageCompression=int(pdf_options['compress']))
         story = []
 
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1a1a1a'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
+        # Logo, pre-downsampled to print resolution
+        if template.pdf_logo:
+            logo_bytes, logo_width, logo_height = template.pdf_logo
+            story.append(PdfImage(BytesIO(logo_bytes), width=logo_width, height=logo_height, hAlign='LEFT'))
+            story.append(Spacer(1, 0.2*inch))
 
-        title = "INVOICE" if doc_type == 'invoice' else "QUOTATION"
-        story.append(Paragraph(title, title_style))
+        # Title
+        story.append(Paragraph(layout['title'], styles['title']))
         story.append(Spacer(1, 0.3*inch))
 
         # Document info
-        doc_number = data.get('invoice_number' if doc_type == 'invoice' else 'quote_number', 'N/A')
         info_data = [
-            [f"{title} Number:", doc_number],
-            ["Date:", data.get('date', 'N/A')]
+            [layout['number_label'], layout['doc_number']],
+            ["Date:", layout['date']]
         ]
 
         info_table = Table(info_data, colWidths=[2*inch, 3*inch])
-        info_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.grey),
-        ]))
+        info_table.setStyle(styles['info_table'])
         story.append(info_table)
         story.append(Spacer(1, 0.3*inch))
 
         # Bill To / To section
-        bill_label = "Bill To:" if doc_type == 'invoice' else "To:"
-        story.append(Paragraph(bill_label, styles['Heading2']))
+        story.append(Paragraph(layout['bill_label'], styles['heading']))
         customer_info = f"""
-        <b>{data.get('customer_name', 'N/A')}</b><br/>
-        {data.get('address', 'N/A')}<br/>
-        {data.get('city', 'N/A')}, {data.get('country', 'N/A')}
+        <b>{layout['customer_name']}</b><br/>
+        {layout['address']}<br/>
+        {layout['locality']}
         """
-        story.append(Paragraph(customer_info, styles['Normal']))
+        story.append(Paragraph(customer_info, styles['normal']))
         story.append(Spacer(1, 0.3*inch))
 
-        # Items table
-        items_data = [['Description', 'Quantity', 'Unit Price', 'Amount']]
-        for item in data.get('items', []):
-            items_data.append([
-                item.get('description', ''),
-                str(item.get('quantity', 0)),
-                f"{data.get('currency', 'NGN')} {item.get('unit_price', 0):,.2f}",
-                f"{data.get('currency', 'NGN')} {item.get('amount', 0):,.2f}"
-            ])
-
-        items_table = Table(items_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
-        items_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        story.append(items_table)
+        # Items table, paginated with the header repeated on every page
+        story.append(PagedItemsTable(
+            layout['item_columns'], layout['items'],
+            [3*inch, 1*inch, 1.5*inch, 1.5*inch], styles['items_table']
+        ))
         story.append(Spacer(1, 0.3*inch))
 
         # Totals
-        totals_data = [
-            ['Subtotal:', f"{data.get('currency', 'NGN')} {data.get('subtotal', 0):,.2f}"],
-            [f"Tax ({data.get('tax_rate', 0)*100:.0f}%):", f"{data.get('currency', 'NGN')} {data.get('tax_amount', 0):,.2f}"]
-        ]
-
-        if doc_type == 'invoice':
-            totals_data.append([
-                f"Delivery ({data.get('delivery_rate', 0)*100:.0f}%):",
-                f"{data.get('currency', 'NGN')} {data.get('delivery_amount', 0):,.2f}"
-            ])
-
+        totals_data = [list(row) for row in layout['totals']]
         totals_data.append(['', ''])  # Spacer
-        totals_data.append([
-            'TOTAL:',
-            f"{data.get('currency', 'NGN')} {data.get('total', 0):,.2f}"
-        ])
+        totals_data.append(list(layout['total']))
 
         totals_table = Table(totals_data, colWidths=[5*inch, 2*inch])
-        totals_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, -1), (-1, -1), 14),
-            ('LINEABOVE', (0, -1), (-1, -1), 2, colors.black),
-            ('TOPPADDING', (0, -1), (-1, -1), 10),
-        ]))
+        totals_table.setStyle(styles['totals_table'])
         story.append(totals_table)
 
         doc.build(story)
         buffer.seek(0)
         return buffer
 
-    def generate_docx(self, data: Dict[str, Any], doc_type: str) -> BytesIO:
+    def generate_docx(self, data: Dict[str, Any], doc_type: str, template: Optional[ExportTemplate] = None) -> BytesIO:
         """Generate DOCX from document data"""
+        template = template or self.get_template()
+        layout = self._layout(data, doc_type)
         doc = Document()
 
         # Title
-        title = "INVOICE" if doc_type == 'invoice' else "QUOTATION"
-        heading = doc.add_heading(title, 0)
+        heading = doc.add_heading(layout['title'], 0)
         heading.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
         # Document info
-        doc_number = data.get('invoice_number' if doc_type == 'invoice' else 'quote_number', 'N/A')
         p = doc.add_paragraph()
-        p.add_run(f"{title} Number: ").bold = True
-        p.add_run(doc_number)
+        p.add_run(f"{layout['number_label']} ").bold = True
+        p.add_run(layout['doc_number'])
         p = doc.add_paragraph()
         p.add_run("Date: ").bold = True
-        p.add_run(data.get('date', 'N/A'))
+        p.add_run(layout['date'])
 
         doc.add_paragraph()
 
         # Bill To / To
-        bill_label = "Bill To:" if doc_type == 'invoice' else "To:"
-        doc.add_heading(bill_label, 2)
-        doc.add_paragraph(data.get('customer_name', 'N/A')).bold = True
-        doc.add_paragraph(data.get('address', 'N/A'))
-        doc.add_paragraph(f"{data.get('city', 'N/A')}, {data.get('country', 'N/A')}")
+        doc.add_heading(layout['bill_label'], 2)
+        doc.add_paragraph(layout['customer_name']).bold = True
+        doc.add_paragraph(layout['address'])
+        doc.add_paragraph(layout['locality'])
 
         doc.add_paragraph()
 
         # Items table
         table = doc.add_table(rows=1, cols=4)
-        table.style = 'Light Grid Accent 1'
+        table.style = template.docx_table_style
 
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = 'Description'
-        hdr_cells[1].text = 'Quantity'
-        hdr_cells[2].text = 'Unit Price'
-        hdr_cells[3].text = 'Amount'
+        for cell, column in zip(table.rows[0].cells, layout['item_columns']):
+            cell.text = column
 
-        for item in data.get('items', []):
-            row_cells = table.add_row().cells
-            row_cells[0].text = item.get('description', '')
-            row_cells[1].text = str(item.get('quantity', 0))
-            row_cells[2].text = f"{data.get('currency', 'NGN')} {item.get('unit_price', 0):,.2f}"
-            row_cells[3].text = f"{data.get('currency', 'NGN')} {item.get('amount', 0):,.2f}"
+        # add_row() re-scans the table on every call; clone one prepared row instead
+        template_row = table.add_row()
+        for cell in template_row.cells:
+            cell.paragraphs[0].add_run(' ')  # Placeholder so each cell has a w:t to fill
+        template_tr = template_row._tr
+        table._tbl.remove(template_tr)
+
+        for values in layout['items']:
+            tr = deepcopy(template_tr)
+            for text_element, value in zip(tr.iter(qn('w:t')), values):
+                text_element.text = value
+            table._tbl.append(tr)
 
         doc.add_paragraph()
 
         # Totals
-        p = doc.add_paragraph()
-        p.add_run(f"Subtotal: {data.get('currency', 'NGN')} {data.get('subtotal', 0):,.2f}").alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-        p = doc.add_paragraph()
-        p.add_run(f"Tax ({data.get('tax_rate', 0)*100:.0f}%): {data.get('currency', 'NGN')} {data.get('tax_amount', 0):,.2f}")
-
-        if doc_type == 'invoice':
-            p = doc.add_paragraph()
-            p.add_run(f"Delivery ({data.get('delivery_rate', 0)*100:.0f}%): {data.get('currency', 'NGN')} {data.get('delivery_amount', 0):,.2f}")
+        for label, value in layout['totals']:
+            doc.add_paragraph().add_run(f"{label} {value}")
 
         p = doc.add_paragraph()
-        run = p.add_run(f"TOTAL: {data.get('currency', 'NGN')} {data.get('total', 0):,.2f}")
+        run = p.add_run(" ".join(layout['total']))
         run.bold = True
         run.font.size = Pt(16)
 
@@ -207,77 +699,525 @@ class ExportService:
         buffer.seek(0)
         return buffer
 
-    def generate_image(self, data: Dict[str, Any], doc_type: str) -> BytesIO:
-        """Generate PNG image from document data"""
-        # Create image
-        img = Image.new('RGB', (800, 1000), color='white')
-        draw = ImageDraw.Draw(img)
+    def generate_html(self, data: Dict[str, Any], doc_type: str, template: Optional[ExportTemplate] = None) -> BytesIO:
+        """Generate HTML from document data"""
+        buffer = BytesIO()
+        for chunk in self.stream_html(data, doc_type, template):
+            buffer.write(chunk)
+        buffer.seek(0)
+        return buffer
 
-        try:
-            title_font = ImageFont.truetype("arial.ttf", 32)
-            heading_font = ImageFont.truetype("arial.ttf", 16)
-            text_font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            title_font = ImageFont.load_default()
-            heading_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
+    def stream_html(self, data: Dict[str, Any], doc_type: str, template: Optional[ExportTemplate] = None) -> Iterator[bytes]:
+        """
+        Render HTML incrementally from the compiled Jinja template.
+
+        Yields UTF-8 chunks of roughly HTML_CHUNK_SIZE so a response can start
+        before long item tables are fully rendered.
+        """
+        template = template or self.get_template()
+        pending = []
+        size = 0
+        for text in _html_template().generate(layout=self._layout(data, doc_type), template=template):
+            pending.append(text)
+            size += len(text)
+            if size >= HTML_CHUNK_SIZE:
+                yield ''.join(pending).encode('utf-8')
+                pending = []
+                size = 0
+        if pending:
+            yield ''.join(pending).encode('utf-8')
+
+    def spreadsheet_rows(self, data: Dict[str, Any], doc_type: str) -> Tuple[list, List[list]]:
+        """
+        Raw values of a document for spreadsheet exports.
+
+        Returns the document row (DOCUMENT_COLUMNS) and its line item rows
+        (ITEM_COLUMNS). Amounts stay numeric so they can be summed and pivoted.
+        """
+        doc_number = _cell_text(data.get('invoice_number' if doc_type == 'invoice' else 'quote_number'))
+        date = _cell_text(data.get('date'))
+        customer_name = _cell_text(data.get('customer_name'))
+        currency = _cell_text(data.get('currency', 'NGN'))
+        items = data.get('items', [])
+
+        document_row = [
+            doc_type, doc_number, date, customer_name, _cell_text(data.get('address')), _cell_text(data.get('city')),
+            _cell_text(data.get('country')), currency, len(items), data.get('subtotal', 0), data.get('tax_rate', 0),
+            data.get('tax_amount', 0), data.get('delivery_rate', 0) if doc_type == 'invoice' else None,
+            data.get('delivery_amount', 0) if doc_type == 'invoice' else None, data.get('total', 0),
+        ]
+        item_rows = [
+            [doc_type, doc_number, date, customer_name, currency, line, _cell_text(item.get('description', '')),
+             _cell_text(item.get('quantity', 0)), _cell_text(item.get('unit_price', 0)), _cell_text(item.get('amount', 0))]
+            for line, item in enumerate(items, start=1)
+        ]
+        return document_row, item_rows
+
+    def generate_csv(self, data: Dict[str, Any], doc_type: str, options: Optional[Dict[str, Any]] = None) -> BytesIO:
+        """Generate CSV of a document's line items, or its document row with rows='documents'"""
+        options = self.normalize_options('csv', options)
+        rows = CsvRows(self, options['rows'])
+        buffer = BytesIO()
+        buffer.write(rows.header())
+        buffer.write(rows.add(data, doc_type))
+        buffer.seek(0)
+        return buffer
+
+    def generate_xlsx(self, data: Dict[str, Any], doc_type: str) -> BytesIO:
+        """Generate an XLSX workbook with Documents and Line Items sheets"""
+        workbook = XlsxRows(self)
+        workbook.add(data, doc_type)
+        buffer = BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def generate_image(self, data: Dict[str, Any], doc_type: str, template: Optional[ExportTemplate] = None,
+                       options: Optional[Dict[str, Any]] = None) -> BytesIO:
+        """
+        Generate PNG image from document data.
+
+        The canvas grows with the number of items. Documents taller than
+        EXPORT_IMAGE_MAX_HEIGHT are split into page-sized PNGs and returned
+        as a ZIP archive (page-001.png, page-002.png, ...).
+        Options: compress_level (zlib 0-9) and optimize.
+        """
+        fonts = (template or self.get_template()).image_fonts
+        png_options = self.normalize_options('png', options)
+        blocks = self._image_blocks(data, doc_type)
+        height = max(IMAGE_PAGE_HEIGHT, IMAGE_MARGIN * 2 + sum(block_height for block_height, _ in blocks))
+
+        if height <= EXPORT_IMAGE_MAX_HEIGHT:
+            buffer = BytesIO()
+            self._draw_image_page(blocks, height, fonts).save(buffer, format='PNG', **png_options)
+            buffer.seek(0)
+            return buffer
 
-        y = 50
+        # Too tall for one image: paginate, keeping each block on a single page
+        pages = [[]]
+        y = IMAGE_MARGIN
+        for block in blocks:
+            if y + block[0] > IMAGE_PAGE_HEIGHT - IMAGE_MARGIN and pages[-1]:
+                pages.append([])
+                y = IMAGE_MARGIN
+            pages[-1].append(block)
+            y += block[0]
+
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for number, page_blocks in enumerate(pages, start=1):
+                page_buffer = BytesIO()
+                self._draw_image_page(page_blocks, IMAGE_PAGE_HEIGHT, fonts).save(page_buffer, format='PNG', **png_options)
+                archive.writestr(f"page-{number:03d}.png", page_buffer.getvalue())
+        buffer.seek(0)
+        return buffer
+
+    def generate_preview(self, data: Dict[str, Any], doc_type: str, template: Optional[ExportTemplate] = None,
+                         options: Optional[Dict[str, Any]] = None) -> BytesIO:
+        """
+        Generate a small WEBP/JPEG thumbnail of the first page for chat previews.
+
+        Drawn directly at the target size with scaled fonts (no full-size
+        render and downscale) and encoded with fast settings.
+        Options: width, image_format ('webp' or 'jpeg') and quality.
+        """
+        preview_options = self.normalize_options('preview', options)
+        scale = preview_options['width'] / IMAGE_WIDTH
+        fonts = (template or self.get_template()).scaled_image_fonts(scale)
+
+        # First page only: stop at the first block that would overflow it
+        blocks = []
+        y = IMAGE_MARGIN
+        for block in self._image_blocks(data, doc_type):
+            if y + block[0] > IMAGE_PAGE_HEIGHT - IMAGE_MARGIN and blocks:
+                break
+            blocks.append(block)
+            y += block[0]
+
+        img = self._draw_image_page(blocks, IMAGE_PAGE_HEIGHT, fonts, scale)
+        buffer = BytesIO()
+        if preview_options['image_format'] == 'webp':
+            img.save(buffer, format='WEBP', quality=preview_options['quality'], method=0)
+        else:
+            img.save(buffer, format='JPEG', quality=preview_options['quality'])
+        buffer.seek(0)
+        return buffer
+
+    def _image_blocks(self, data: Dict[str, Any], doc_type: str) -> List[Tuple[int, list]]:
+        """
+        Lay out the PNG as blocks that must stay on one page.
+
+        Returns:
+            List of (block height, [(x, y offset, text, fill, font name, anchor)])
+        """
+        layout = self._layout(data, doc_type)
 
         # Title
-        title = "INVOICE" if doc_type == 'invoice' else "QUOTATION"
-        draw.text((400, y), title, fill='black', font=title_font, anchor="mm")
-        y += 60
+        blocks = [(60, [(IMAGE_WIDTH // 2, 0, layout['title'], 'black', 'title', 'mm')])]
 
         # Document info
-        doc_number = data.get('invoice_number' if doc_type == 'invoice' else 'quote_number', 'N/A')
-        draw.text((50, y), f"{title} Number: {doc_number}", fill='black', font=text_font)
-        y += 25
-        draw.text((50, y), f"Date: {data.get('date', 'N/A')}", fill='black', font=text_font)
-        y += 40
+        blocks.append((65, [
+            (50, 0, f"{layout['number_label']} {layout['doc_number']}", 'black', 'text', None),
+            (50, 25, f"Date: {layout['date']}", 'black', 'text', None),
+        ]))
 
         # Customer info
-        bill_label = "Bill To:" if doc_type == 'invoice' else "To:"
-        draw.text((50, y), bill_label, fill='black', font=heading_font)
-        y += 25
-        draw.text((50, y), data.get('customer_name', 'N/A'), fill='black', font=text_font)
-        y += 20
-        draw.text((50, y), data.get('address', 'N/A'), fill='black', font=text_font)
-        y += 20
-        draw.text((50, y), f"{data.get('city', 'N/A')}, {data.get('country', 'N/A')}", fill='black', font=text_font)
-        y += 40
+        blocks.append((105, [
+            (50, 0, layout['bill_label'], 'black', 'heading', None),
+            (50, 25, layout['customer_name'], 'black', 'text', None),
+            (50, 45, layout['address'], 'black', 'text', None),
+            (50, 65, layout['locality'], 'black', 'text', None),
+        ]))
 
         # Items
-        draw.text((50, y), "Items:", fill='black', font=heading_font)
-        y += 30
+        blocks.append((30, [(50, 0, "Items:", 'black', 'heading', None)]))
+        for description, quantity, unit_price, amount in layout['items']:
+            blocks.append((50, [
+                (50, 0, description, 'black', 'text', None),
+                (70, 20, f"Qty: {quantity} x {unit_price} = {amount}", 'gray', 'text', None),
+            ]))
 
-        for item in data.get('items', []):
-            desc = item.get('description', '')
-            qty = item.get('quantity', 0)
-            price = item.get('unit_price', 0)
-            amount = item.get('amount', 0)
-            currency = data.get('currency', 'NGN')
+        # Totals
+        totals = []
+        offset = 20
+        for label, value in layout['totals']:
+            totals.append((50, offset, f"{label} {value}", 'black', 'text', None))
+            offset += 25
+        offset += 10
+        totals.append((50, offset, " ".join(layout['total']), 'black', 'heading', None))
+        blocks.append((offset + 25, totals))
+        return blocks
 
-            draw.text((50, y), f"{desc}", fill='black', font=text_font)
-            y += 20
-            draw.text((70, y), f"Qty: {qty} x {currency} {price:,.2f} = {currency} {amount:,.2f}", fill='gray', font=text_font)
-            y += 30
+    def _draw_image_page(self, blocks: List[Tuple[int, list]], height: int, fonts: Dict[str, GlyphFont],
+                         scale: float = 1.0) -> Image.Image:
+        """Draw blocks top to bottom on a white canvas"""
+        img = Image.new('RGB', (round(IMAGE_WIDTH * scale), round(height * scale)), color='white')
+        draw = ImageDraw.Draw(img)
+        y = IMAGE_MARGIN
+        for block_height, ops in blocks:
+            for x, offset, text, fill, font, anchor in ops:
+                xy = (x * scale, (y + offset) * scale)
+                if anchor:
+                    draw.text(xy, text, fill=fill, font=fonts[font].font, anchor=anchor)
+                else:
+                    fonts[font].draw(img, xy, text, fill)
+            y += block_height
+        return img
 
-        # Totals
-        y += 20
-        draw.text((50, y), f"Subtotal: {data.get('currency', 'NGN')} {data.get('subtotal', 0):,.2f}", fill='black', font=text_font)
-        y += 25
-        draw.text((50, y), f"Tax ({data.get('tax_rate', 0)*100:.0f}%): {data.get('currency', 'NGN')} {data.get('tax_amount', 0):,.2f}", fill='black', font=text_font)
-        y += 25
 
-        if doc_type == 'invoice':
-            draw.text((50, y), f"Delivery ({data.get('delivery_rate', 0)*100:.0f}%): {data.get('currency', 'NGN')} {data.get('delivery_amount', 0):,.2f}", fill='black', font=text_font)
-            y += 25
+class _DrainableBuffer:
+    """Write-only sink for zipfile; no tell()/seek(), so zipfile streams with data descriptors"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+class ZipStream:
+    """
+    ZIP archive built incrementally for streaming responses.
+
+    Each add() returns the archive bytes produced for that file, so callers
+    can send them immediately instead of holding the whole archive.
+    """
+
+    # Formats that are already compressed gain nothing from deflate
+    STORED_EXTENSIONS = ('.png', '.docx', '.xlsx', '.jpg', '.jpeg', '.webp', '.zip')
+
+    def __init__(self):
+        self._buffer = _DrainableBuffer()
+        self._zip = zipfile.ZipFile(self._buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, name: str, content: bytes) -> bytes:
+        compress_type = zipfile.ZIP_STORED if name.lower().endswith(self.STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+        self._zip.writestr(name, content, compress_type=compress_type)
+        return self._buffer.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the final bytes"""
+        self._zip.close()
+        return self._buffer.drain()
+
+class CsvRows:
+    """
+    CSV for many documents, produced a document at a time.
+
+    header() and each add() return encoded bytes ready to send, so a bulk
+    export streams rows without building the whole file.
+    """
+
+    def __init__(self, export_service: ExportService, rows: str = 'items'):
+        self.export_service = export_service
+        self.rows = rows
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _drain(self) -> bytes:
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text.encode('utf-8')
+
+    def header(self) -> bytes:
+        self._writer.writerow(ITEM_COLUMNS if self.rows == 'items' else DOCUMENT_COLUMNS)
+        return self._drain()
+
+    def add(self, data: Dict[str, Any], doc_type: str) -> bytes:
+        document_row, item_rows = self.export_service.spreadsheet_rows(data, doc_type)
+        if self.rows == 'items':
+            self._writer.writerows(item_rows)
+        else:
+            self._writer.writerow(document_row)
+        return self._drain()
+
+class XlsxRows:
+    """
+    XLSX workbook for many documents, in openpyxl's write-only mode.
+
+    Rows are streamed to temporary sheet files as they are added rather than
+    kept as cell objects, so memory stays flat for tens of thousands of items.
+    """
+
+    def __init__(self, export_service: ExportService):
+        self.export_service = export_service
+        self._workbook = Workbook(write_only=True)
+        self._documents = self._sheet('Documents', DOCUMENT_COLUMNS)
+        self._items = self._sheet('Line Items', ITEM_COLUMNS)
+
+    def _sheet(self, title: str, columns: Tuple[str, ...]):
+        sheet = self._workbook.create_sheet(title)
+        sheet.freeze_panes = 'A2'
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, column)
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        return sheet
+
+    def add(self, data: Dict[str, Any], doc_type: str):
+        document_row, item_rows = self.export_service.spreadsheet_rows(data, doc_type)
+        self._documents.append(document_row)
+        for row in item_rows:
+            self._items.append(row)
+
+    def save(self, stream: BinaryIO):
+        """Write the workbook; a write-only workbook can only be saved once"""
+        self._workbook.save(stream)
+
+PDF_HEADER = b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n'
 
-        y += 10
-        draw.text((50, y), f"TOTAL: {data.get('currency', 'NGN')} {data.get('total', 0):,.2f}", fill='black', font=heading_font)
+class PdfBundle:
+    """
+    Several rendered PDFs merged into one, streamed in the order they are added.
 
+    Each add() renumbers the document's pages and the objects they use and
+    returns them as PDF bytes ready to send, so only object offsets, page
+    numbers and titles stay in memory however many documents are merged.
+    close() then yields the page tree, an outline entry per document pointing
+    at its first page, and the cross-reference table.
+    """
+
+    # Object numbers written by close(); document objects are numbered after them
+    CATALOG, PAGES, OUTLINES = 1, 2, 3
+
+    def __init__(self):
+        self._position = 0
+        self._offsets = array('Q', [0, 0, 0])  # byte offset of each object, by object number - 1
+        self._pages = array('Q')  # page object numbers in order
+        self._outline: List[Tuple[str, int]] = []  # (title, first page object number)
+
+    def _write(self, chunks: List[bytes], data: bytes):
+        chunks.append(data)
+        self._position += len(data)
+
+    def _write_object(self, chunks: List[bytes], number: int, value: Any):
         buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        return buffer
+        value.write_to_stream(buffer, None)
+        self._offsets[number - 1] = self._position
+        self._write(chunks, b'%d 0 obj\n%s\nendobj\n' % (number, buffer.getvalue()))
+
+    def _renumber(self, reference: IndirectObject, numbers: Dict[int, int], queue: deque) -> IndirectObject:
+        """The bundle's reference for a document object, queueing the object to be written on first sight"""
+        if reference.idnum not in numbers:
+            numbers[reference.idnum] = len(self._offsets) + 1
+            self._offsets.append(0)
+            queue.append(reference)
+        return IndirectObject(numbers[reference.idnum], 0, None)
+
+    def _copy(self, value: Any, numbers: Dict[int, int], queue: deque) -> Any:
+        """A document object with its references renumbered for the bundle"""
+        if isinstance(value, IndirectObject):
+            return self._renumber(value, numbers, queue)
+        if isinstance(value, DictionaryObject):
+            copied = shallow_copy(value)  # keeps a stream's data
+            for key, item in value.items():
+                copied[key] = self._copy(item, numbers, queue)
+            return copied
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self._copy(item, numbers, queue) for item in value)
+        return value
+
+    def add(self, title: str, pdf_bytes: bytes) -> bytes:
+        """Append a document's pages; returns the bytes written for it"""
+        reader = PdfReader(BytesIO(pdf_bytes))
+        chunks = []
+        if not self._position:
+            self._write(chunks, PDF_HEADER)
+        numbers: Dict[int, int] = {}  # object number in the document -> number in the bundle
+        queue = deque()
+        pages = [self._renumber(page.indirect_reference, numbers, queue) for page in reader.pages]
+        if not pages:
+            raise ValueError(f"Document {title} has no pages")
+        page_numbers = {page.idnum for page in pages}
+        while queue:
+            reference = queue.popleft()
+            value = reader.get_object(reference)
+            if numbers[reference.idnum] in page_numbers:
+                # The document's own page tree isn't copied; pages hang off the bundle's
+                value = DictionaryObject({key: item for key, item in value.items() if key != '/Parent'})
+                value[NameObject('/Parent')] = IndirectObject(self.PAGES, 0, None)
+            self._write_object(chunks, numbers[reference.idnum], self._copy(value, numbers, queue))
+        self._pages.extend(page.idnum for page in pages)
+        self._outline.append((title, pages[0].idnum))
+        # Parsed objects point back at their reader; break the cycle so each document is freed right away
+        reader.resolved_objects.clear()
+        reader.flattened_pages = None
+        return b''.join(chunks)
+
+    def close(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Write the page tree, outline, catalog and cross-reference table, yielded in chunks of about chunk_size"""
+        chunks = []
+        if not self._position:
+            self._write(chunks, PDF_HEADER)
+        self._offsets[self.PAGES - 1] = self._position
+        self._write(chunks, b'%d 0 obj\n<< /Type /Pages /Count %d /Kids [' % (self.PAGES, len(self._pages)))
+        for start in range(0, len(self._pages), 512):
+            self._write(chunks, b''.join(b' %d 0 R' % number for number in self._pages[start:start + 512]))
+            yield from self._flush(chunks, chunk_size)
+        self._write(chunks, b' ] >>\nendobj\n')
+
+        first_item = len(self._offsets) + 1
+        self._offsets.extend([0] * len(self._outline))
+        for position, (title, page) in enumerate(self._outline):
+            item = DictionaryObject({
+                NameObject('/Title'): create_string_object(title),
+                NameObject('/Parent'): IndirectObject(self.OUTLINES, 0, None),
+                NameObject('/Dest'): ArrayObject([IndirectObject(page, 0, None), NameObject('/Fit')]),
+            })
+            if position:
+                item[NameObject('/Prev')] = IndirectObject(first_item + position - 1, 0, None)
+            if position < len(self._outline) - 1:
+                item[NameObject('/Next')] = IndirectObject(first_item + position + 1, 0, None)
+            self._write_object(chunks, first_item + position, item)
+            yield from self._flush(chunks, chunk_size)
+        outlines = DictionaryObject({NameObject('/Type'): NameObject('/Outlines'),
+                                     NameObject('/Count'): NumberObject(len(self._outline))})
+        if self._outline:
+            outlines[NameObject('/First')] = IndirectObject(first_item, 0, None)
+            outlines[NameObject('/Last')] = IndirectObject(first_item + len(self._outline) - 1, 0, None)
+        self._write_object(chunks, self.OUTLINES, outlines)
+        self._write_object(chunks, self.CATALOG, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(self.PAGES, 0, None),
+            NameObject('/Outlines'): IndirectObject(self.OUTLINES, 0, None),
+            NameObject('/PageMode'): NameObject('/UseOutlines'),
+        }))
+
+        xref = self._position
+        self._write(chunks, b'xref\n0 %d\n0000000000 65535 f \n' % (len(self._offsets) + 1))
+        for start in range(0, len(self._offsets), 512):
+            self._write(chunks, b''.join(b'%010d 00000 n \n' % offset for offset in self._offsets[start:start + 512]))
+            yield from self._flush(chunks, chunk_size)
+        self._write(chunks, b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                    % (len(self._offsets) + 1, self.CATALOG, xref))
+        yield from self._flush(chunks, 0)
+
+    @staticmethod
+    def _flush(chunks: List[bytes], chunk_size: int) -> Iterator[bytes]:
+        """Yield the pending bytes once there are at least chunk_size of them"""
+        if chunks and sum(len(chunk) for chunk in chunks) >= chunk_size:
+            yield b''.join(chunks)
+            chunks.clear()
+
+# Per-process service used by process pool workers
+_worker_service: Optional[ExportService] = None
+
+def _init_worker(templates: Dict[str, ExportTemplate]):
+    """Process pool initializer: build and warm a renderer with the parent's templates in this worker"""
+    global _worker_service
+    _worker_service = ExportService()
+    _worker_service.templates.update(templates)
+    _worker_service.warm_up()
+
+def _render_in_worker(data: Dict[str, Any], doc_type: str, format: str, template: Optional[str],
+                      options: Optional[Dict[str, Any]]) -> bytes:
+    return _worker_service.generate_export(data, doc_type, format, template, options).getvalue()
+
+def _ping() -> bool:
+    return True
+
+class RenderPool:
+    """
+    Runs CPU-bound export rendering off the event loop.
+
+    Uses a thread pool sharing one warmed ExportService, or a process pool
+    (EXPORT_POOL_KIND=process) where each worker warms its own renderer
+    with the service's templates as registered when the pool starts.
+    """
+
+    def __init__(self, export_service: ExportService, kind: str = EXPORT_POOL_KIND, workers: int = EXPORT_POOL_WORKERS):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unsupported renderer pool kind: {kind}. Supported: thread, process")
+        self.export_service = export_service
+        self.kind = kind
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Create the pool and pre-warm every worker (blocking; templates must be registered before this)"""
+        with self._start_lock:
+            if self._executor is not None:
+                return
+            if self.kind == 'process':
+                executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker, initargs=(self.export_service.templates,)
+                )
+                # Workers start lazily; submitting one task per worker spawns and warms them all now
+                for future in [executor.submit(_ping) for _ in range(self.workers)]:
+                    future.result()
+            else:
+                self.export_service.warm_up()
+                executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+            self._executor = executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def render(self, data: Dict[str, Any], doc_type: str, format: str, template: Optional[str] = None,
+                     options: Optional[Dict[str, Any]] = None) -> bytes:
+        """Render a document in the pool and return the file bytes"""
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            # Not started by the app's lifespan: warm up in a thread rather than on the event loop
+            await loop.run_in_executor(None, self.start)
+        if self.kind == 'process':
+            return await loop.run_in_executor(self._executor, _render_in_worker, data, doc_type, format, template, options)
+        return await loop.run_in_executor(self._executor, self._render_local, data, doc_type, format, template, options)
+
+    def _render_local(self, data: Dict[str, Any], doc_type: str, format: str, template: Optional[str],
+                      options: Optional[Dict[str, Any]]) -> bytes:
+        return self.export_service.generate_export(data, doc_type, format, template, options).getvalue()
@@ -0,0 +1,78 @@
+import os
+from io import BytesIO
+from typing import Tuple
+from PIL import Image, ImageOps
+
+# Configuration: image preprocessing before vision calls
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '1600'))  # Longest side in pixels
+IMAGE_GRAYSCALE = os.getenv('IMAGE_GRAYSCALE', 'false').lower() == 'true'
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '80'))
+
+# Formats every vision provider accepts as-is
+MEDIA_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+EXIF_ORIENTATION = 0x0112
+
+class ImageService:
+
+    def __init__(self, max_dimension: int = IMAGE_MAX_DIMENSION, grayscale: bool = IMAGE_GRAYSCALE,
+                 quality: int = IMAGE_JPEG_QUALITY):
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.quality = quality
+
+    def preprocess(self, image_bytes: bytes) -> Tuple[bytes, str]:
+        """
+        Prepare an uploaded image for a vision model.
+
+        Detects the real format, applies EXIF orientation, downsizes to the
+        configured max dimension, optionally converts to grayscale and
+        re-encodes as JPEG. Images that need none of this are passed through.
+
+        Returns:
+            Tuple of (image bytes, media type)
+        """
+        try:
+            img = Image.open(BytesIO(image_bytes))
+        except Exception as e:
+            raise ValueError(f"Unsupported or corrupt image: {e}")
+
+        source_format = img.format
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        needs_resize = max(img.size) > self.max_dimension
+        needs_rotate = orientation != 1
+
+        if source_format in MEDIA_TYPES and not (needs_resize or needs_rotate or self.grayscale):
+            return image_bytes, MEDIA_TYPES[source_format]
+
+        # Let the JPEG decoder scale down by a power of two while decoding
+        if source_format == 'JPEG' and needs_resize:
+            img.draft('RGB', (self.max_dimension, self.max_dimension))
+
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > self.max_dimension:
+            img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        return self._encode(img), 'image/jpeg'
+
+    def _encode(self, img: Image.Image) -> bytes:
+        """Re-encode as JPEG, flattening transparency onto white"""
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+
+        if self.grayscale:
+            img = img.convert('L')
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=self.quality, optimize=True)
+        return buffer.getvalue()
@@ -0,0 +1,424 @@
+import io
+import os
+import re
+import csv
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from openpyxl import load_workbook
+
+from app.enrichment import EnrichmentEngine
+from app.inventory_store import InventoryStore
+from app.numbering import NumberAllocator
+
+# Configuration: bulk inventory import
+INVENTORY_IMPORT_MAX_ROWS = int(os.getenv('INVENTORY_IMPORT_MAX_ROWS', '1000000'))
+INVENTORY_IMPORT_CHUNK_ROWS = int(os.getenv('INVENTORY_IMPORT_CHUNK_ROWS', '5000'))  # Rows enriched and written per transaction
+INVENTORY_IMPORT_SAMPLE_ROWS = int(os.getenv('INVENTORY_IMPORT_SAMPLE_ROWS', '5'))  # Rows shown to the model for ambiguous headers
+INVENTORY_IMPORT_MAX_ERRORS = int(os.getenv('INVENTORY_IMPORT_MAX_ERRORS', '1000'))  # Row errors listed (all are counted)
+
+CSV_EXTENSIONS = ['csv', 'tsv', 'txt']
+XLSX_EXTENSIONS = ['xlsx', 'xlsm']
+
+NUMBER_FIELDS = ('unit_price', 'cost_price', 'tax_rate', 'quantity_on_hand', 'low_stock_threshold', 'reorder_quantity')
+BOOLEAN_FIELDS = ('track_inventory', 'is_active')
+
+# Header spellings per inventory field, as normalized by header_words()
+HEADER_ALIASES = {
+    'inventory_id': ('inventory id', 'item id', 'id'),
+    'name': ('name', 'item', 'item name', 'product', 'product name', 'service', 'service name', 'title', 'product title'),
+    'description': ('description', 'details', 'item description', 'product description', 'long description'),
+    'sku': ('sku', 'sku code', 'item code', 'product code', 'code', 'part number', 'part no', 'barcode', 'upc', 'ean'),
+    'category': ('category', 'product category', 'category name', 'group', 'department', 'family'),
+    'item_type': ('item type', 'type', 'kind'),
+    'unit_price': ('price', 'unit price', 'selling price', 'sale price', 'sales price', 'retail price', 'sell price',
+                   'price per unit', 'list price', 'rate', 'msrp'),
+    'cost_price': ('cost', 'cost price', 'unit cost', 'purchase price', 'buying price', 'buy price', 'cost per unit',
+                   'wholesale price'),
+    'currency': ('currency', 'currency code', 'ccy'),
+    'tax_rate': ('tax', 'tax rate', 'vat', 'vat rate', 'sales tax', 'tax percent'),
+    'quantity_on_hand': ('quantity', 'qty', 'stock', 'in stock', 'on hand', 'quantity on hand', 'qty on hand',
+                         'stock quantity', 'stock qty', 'stock level', 'units', 'available', 'count'),
+    'low_stock_threshold': ('low stock', 'low stock threshold', 'minimum stock', 'min stock', 'min qty', 'reorder level',
+                            'reorder point', 'safety stock', 'alert level'),
+    'reorder_quantity': ('reorder quantity', 'reorder qty', 'order quantity', 'restock quantity'),
+    'supplier_name': ('supplier', 'supplier name', 'vendor', 'vendor name'),
+    'track_inventory': ('track inventory', 'tracked', 'track stock'),
+    'is_active': ('active', 'is active', 'status', 'enabled'),
+}
+IMPORT_FIELDS = tuple(HEADER_ALIASES)
+ALIAS_FIELDS = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+# Columns computed from others ("Stock Value", "Profit Margin"); enrichment recomputes them
+COMPUTED_HEADER_WORDS = frozenset(('value', 'total', 'amount', 'margin', 'profit', 'markup'))
+
+CURRENCY_SYMBOLS = {'₦': 'NGN', '$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY', '₹': 'INR', '₵': 'GHS'}
+CURRENCY_CODES = frozenset(('NGN', 'USD', 'EUR', 'GBP', 'CAD', 'AUD', 'JPY', 'CNY', 'INR', 'ZAR', 'KES', 'GHS'))
+CURRENCY_PATTERN = re.compile(r'[₦$€£¥₹₵]|\b(?:' + '|'.join(CURRENCY_CODES) + r')\b', re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r'-?(?:\d+\.?\d*|\.\d+)')
+
+TRUE_VALUES = frozenset(('true', 'yes', 'y', '1', 'active', 'enabled', 'on', 'x'))
+FALSE_VALUES = frozenset(('false', 'no', 'n', '0', 'inactive', 'disabled', 'off'))
+ITEM_TYPES = {'product': 'product', 'products': 'product', 'goods': 'product', 'good': 'product',
+              'service': 'service', 'services': 'service', 'labour': 'service', 'labor': 'service'}
+
+class ColumnMapping:
+    """Which spreadsheet column holds which inventory field"""
+
+    def __init__(self, columns: Dict[int, str], has_header: bool = True, currency: Optional[str] = None,
+                 mapped_by: str = 'headers'):
+        self.columns = columns  # Column index -> inventory field
+        self.has_header = has_header
+        self.currency = currency  # Currency of prices named by a header ("Price (NGN)") or the model
+        self.mapped_by = mapped_by  # 'headers' (heuristic) or 'model'
+
+    def describe(self, header: Sequence[Any]) -> Tuple[Dict[str, str], List[str]]:
+        """Mapped columns by their header label (or column letter) and the labels of ignored columns"""
+        labels = [
+            str(header[index]).strip() if self.has_header and index < len(header) and header[index] not in (None, '')
+            else column_letter(index)
+            for index in range(len(header))
+        ]
+        mapped = {labels[index] if index < len(labels) else column_letter(index): field
+                  for index, field in sorted(self.columns.items())}
+        ignored = [label for index, label in enumerate(labels) if index not in self.columns]
+        return mapped, ignored
+
+def column_letter(index: int) -> str:
+    """Spreadsheet column letter of a 0-based index (0 -> A, 26 -> AA)"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def header_words(label: Any) -> Tuple[str, Optional[str]]:
+    """Lower-case words of a header label without punctuation, and any currency it names ('Price (₦)')"""
+    text = '' if label is None else str(label)
+    match = CURRENCY_PATTERN.search(text)
+    currency = None
+    if match:
+        currency = CURRENCY_SYMBOLS.get(match.group(0)) or match.group(0).upper()
+        text = CURRENCY_PATTERN.sub(' ', text)
+    text = text.replace('%', ' percent ').replace('#', ' number ')
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower())), currency
+
+def _header_field(words: str) -> Tuple[Optional[str], List[str]]:
+    """Field of one normalized header: an exact alias, or else the longest alias it contains"""
+    if words in ALIAS_FIELDS:
+        return ALIAS_FIELDS[words], []
+    if not words or COMPUTED_HEADER_WORDS.intersection(words.split()):
+        return None, []
+    padded = f' {words} '
+    found = [(len(alias), field) for alias, field in ALIAS_FIELDS.items() if f' {alias} ' in padded]
+    if not found:
+        return None, []
+    longest = max(length for length, _ in found)
+    fields = sorted({field for length, field in found if length == longest})
+    return (fields[0], []) if len(fields) == 1 else (None, fields)
+
+def _is_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        parse_number(value)
+        return True
+    except ValueError:
+        return False
+
+def detect_columns(header: Sequence[Any], sample: Sequence[Sequence[Any]]) -> Tuple[ColumnMapping, List[str]]:
+    """
+    Map columns from their header labels.
+
+    Args:
+        header: First non-empty row
+        sample: Following rows, used to spot unlabelled numeric columns
+
+    Returns:
+        The mapping, and why it is ambiguous (empty when the headers are clear).
+        Of several columns claiming one field, the mapping keeps the first.
+    """
+    columns: Dict[int, str] = {}
+    reasons = []
+    currencies = set()
+    for index, label in enumerate(header):
+        words, currency = header_words(label)
+        field, candidates = _header_field(words)
+        if candidates:
+            reasons.append(f"column {column_letter(index)} ({label}) could be {' or '.join(candidates)}")
+        if field is None:
+            continue
+        if field in columns.values():
+            first = next(column for column, mapped in columns.items() if mapped == field)
+            reasons.append(f"columns {column_letter(first)} and {column_letter(index)} both look like {field}")
+            continue
+        columns[index] = field
+        if currency and field in ('unit_price', 'cost_price'):
+            currencies.add(currency)
+
+    if not columns or any(_is_number(label) for label in header if label not in (None, '')):
+        return ColumnMapping({}, has_header=False), ["the first row doesn't look like a header"]
+    if 'name' not in columns.values():
+        reasons.append("no column looks like the item name")
+    if 'unit_price' not in columns.values():
+        numeric = [
+            index for index in range(len(header)) if index not in columns and any(
+                index < len(row) and row[index] not in (None, '') for row in sample
+            ) and all(index >= len(row) or row[index] in (None, '') or _is_number(row[index]) for row in sample)
+        ]
+        if numeric:
+            reasons.append(f"no price column, but column {column_letter(numeric[0])} ({header[numeric[0]]}) holds numbers")
+    currency = currencies.pop() if len(currencies) == 1 else None
+    return ColumnMapping(columns, currency=currency), reasons
+
+def mapping_from_model(result: Dict[str, Any], width: int) -> ColumnMapping:
+    """
+    Validate the model's column mapping (see prompts/inventory_import_prompt.txt).
+
+    Raises:
+        ValueError: If it maps no name column
+    """
+    columns: Dict[int, str] = {}
+    for key, field in (result.get('columns') or {}).items():
+        try:
+            index = int(key)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < width and field in IMPORT_FIELDS and field not in columns.values():
+            columns[index] = field
+    if 'name' not in columns.values():
+        raise ValueError("The model found no item name column")
+    currency = str(result.get('currency') or '').strip().upper() or None
+    return ColumnMapping(columns, has_header=result.get('has_header', True) is not False,
+                         currency=currency if currency in CURRENCY_CODES else None, mapped_by='model')
+
+def sample_text(rows: Sequence[Sequence[Any]], max_cell: int = 60) -> str:
+    """Rows as ' | '-separated lines for the column mapping prompt"""
+    return '\n'.join(
+        ' | '.join('' if cell is None else str(cell).strip()[:max_cell] for cell in row) for row in rows
+    )
+
+def parse_number(value: Any) -> Tuple[Union[int, float], Optional[str]]:
+    """
+    Number of a cell, and the currency it shows.
+
+    Accepts '₦450,000.00', 'USD 1200', '7.5%', '(300)' (negative) and '1.234,56'.
+
+    Raises:
+        ValueError: If the cell isn't a number
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a number")
+    if isinstance(value, (int, float)):
+        if value != value:  # NaN
+            raise ValueError("NaN is not a number")
+        return value, None
+
+    text = str(value).strip()
+    if NUMBER_PATTERN.fullmatch(text):  # Plain numbers, the common case
+        return (float(text) if '.' in text else int(text)), None
+    match = CURRENCY_PATTERN.search(text)
+    currency = (CURRENCY_SYMBOLS.get(match.group(0)) or match.group(0).upper()) if match else None
+    text = re.sub(r'\s', '', CURRENCY_PATTERN.sub('', text).replace('%', ''))
+    negative = text.startswith('(') and text.endswith(')')
+    text = text.strip('()')
+    if ',' in text and '.' in text:
+        text = text.replace('.', '').replace(',', '.') if text.rfind(',') > text.rfind('.') else text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '') if re.fullmatch(r'-?\d{1,3}(,\d{3})+', text) else text.replace(',', '.')
+    if not NUMBER_PATTERN.fullmatch(text):
+        raise ValueError(f"{value!r} is not a number")
+    number = int(text) if re.fullmatch(r'-?\d+', text) else float(text)
+    return (-number if negative else number), currency
+
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"{value!r} is not yes or no")
+
+def read_rows(file: BinaryIO, filename: str) -> Iterator[Tuple[int, List[Any]]]:
+    """
+    Stream the non-empty rows of a CSV or XLSX upload with their 1-based row numbers.
+
+    CSV is decoded as UTF-8 (Windows-1252 if the start isn't valid UTF-8) with
+    the delimiter sniffed from the start; XLSX is read in openpyxl's read-only
+    mode from the first sheet. Neither loads the whole file.
+
+    Raises:
+        ValueError: If the file type isn't supported
+    """
+    extension = filename.lower().rsplit('.', 1)[-1]
+    if extension in XLSX_EXTENSIONS:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            for number, row in enumerate(workbook.worksheets[0].iter_rows(values_only=True), start=1):
+                if any(cell not in (None, '') for cell in row):
+                    yield number, list(row)
+        finally:
+            workbook.close()
+        return
+    if extension not in CSV_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {extension}. Supported: CSV, TSV, XLSX")
+
+    start = file.read(64 * 1024)
+    file.seek(0)
+    try:
+        sample, encoding = start.decode('utf-8-sig'), 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        if e.start < len(start) - 3:  # Not just a character cut off at the end of the sample
+            sample, encoding = start.decode('cp1252', errors='replace'), 'cp1252'
+        else:
+            sample, encoding = start[:e.start].decode('utf-8-sig'), 'utf-8-sig'
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel_tab if extension == 'tsv' else csv.excel
+
+    text = io.TextIOWrapper(file, encoding=encoding, errors='replace', newline='')
+    try:
+        reader = csv.reader(text, dialect)
+        line = 1
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield line, row
+            line = reader.line_num + 1
+    finally:
+        text.detach()  # Leave the upload open for its owner
+
+class InventoryImporter:
+    """
+    Imports spreadsheet rows into the inventory store.
+
+    Rows are converted to inventory items, enriched (profit margin and stock
+    value, as for extracted items) and upserted a chunk per transaction. A row that can't be converted or written is reported with its
+    row number and the import carries on.
+    """
+
+    def __init__(self, store: InventoryStore, engine: EnrichmentEngine, number_allocator: NumberAllocator,
+                 chunk_rows: int = INVENTORY_IMPORT_CHUNK_ROWS, max_rows: int = INVENTORY_IMPORT_MAX_ROWS,
+                 max_errors: int = INVENTORY_IMPORT_MAX_ERRORS):
+        self.store = store
+        self.engine = engine
+        self.number_allocator = number_allocator
+        self.chunk_rows = chunk_rows
+        self.max_rows = max_rows
+        self.max_errors = max_errors
+
+    @staticmethod
+    def row_item(cells: Sequence[Any], mapping: ColumnMapping, currency: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Inventory item of one row, with the inventory prompt's defaults for missing fields.
+
+        Raises:
+            ValueError: If the row has no name or a cell can't be read
+        """
+        item: Dict[str, Any] = {}
+        shown_currency = None
+        for index, field in mapping.columns.items():
+            value = cells[index] if index < len(cells) else None
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            try:
+                if field in NUMBER_FIELDS:
+                    item[field], shown = parse_number(value)
+                    shown_currency = shown_currency or shown
+                elif field in BOOLEAN_FIELDS:
+                    item[field] = parse_bool(value)
+                elif field == 'item_type':
+                    item[field] = ITEM_TYPES[str(value).strip().lower()]
+                elif field == 'currency':
+                    code = CURRENCY_SYMBOLS.get(str(value).strip(), str(value).strip().upper())
+                    if not re.fullmatch(r'[A-Z]{3}', code):
+                        raise ValueError(f"{value!r} is not a currency code")
+                    item[field] = code
+                else:
+                    item[field] = str(value).strip()
+            except KeyError:
+                raise ValueError(f"{field}: {value!r} is not product or service")
+            except ValueError as e:
+                raise ValueError(f"{field}: {e}")
+
+        if not item.get('name'):
+            raise ValueError("No item name")
+        # Spreadsheets often hold a 7.5% rate as 0.075
+        if 0 < item.get('tax_rate', 0) < 1:
+            item['tax_rate'] = round(item['tax_rate'] * 100, 6)
+        item.setdefault('currency', shown_currency or mapping.currency or currency)
+        if not item['currency']:
+            raise ValueError("No currency (add a currency column or pass a default currency)")
+        item.setdefault('unit_price', 0)
+        item.setdefault('cost_price', 0)
+        item.setdefault('tax_rate', 0)
+        item.setdefault('item_type', 'product')
+        item.setdefault('track_inventory', item['item_type'] == 'product')
+        item.setdefault('is_active', True)
+        return item
+
+    def _write(self, chunk: List[Tuple[int, Dict[str, Any]]], tenant_id: Optional[str], report: Dict[str, Any]):
+        """Number, enrich and upsert a chunk; if it conflicts, write its rows one by one to find the bad ones"""
+        now = datetime.now()
+        created_at = now.strftime('%Y-%m-%d %H:%M:%S')
+        for _, item in chunk:
+            if not item.get('inventory_id'):
+                item['inventory_id'] = self.number_allocator.allocate('inventory', tenant_id, now)
+            item.setdefault('created_at', created_at)
+        # Per item on purpose: copying each item dict is most of the cost, so NumPy columns don't make this faster
+        enriched = [self.engine.enrich_inventory(item) for _, item in chunk]
+        try:
+            report['imported'] += self.store.upsert(enriched, tenant_id)
+            return
+        except ValueError:
+            pass
+        for (row, _), item in zip(chunk, enriched):
+            try:
+                report['imported'] += self.store.upsert([item], tenant_id)
+            except ValueError as e:
+                self._fail(report, row, str(e))
+
+    def _fail(self, report: Dict[str, Any], row: int, error: str):
+        report['failed'] += 1
+        if len(report['errors']) < self.max_errors:
+            report['errors'].append({'row': row, 'error': error})
+
+    def import_rows(self, rows: Iterator[Tuple[int, Sequence[Any]]], mapping: ColumnMapping,
+                    tenant_id: Optional[str] = None, currency: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Import data rows (header already consumed) into the store.
+
+        Args:
+            rows: (row number, cells) pairs, e.g. from read_rows()
+            mapping: Column mapping from detect_columns() or mapping_from_model()
+            tenant_id: Tenant owning the items
+            currency: Currency of rows that show none
+
+        Returns:
+            Report with rows read, imported and failed, the first row errors,
+            and whether the row limit cut the file short
+        """
+        report = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'truncated': False}
+        currency = (currency or '').strip().upper() or None
+        chunk = []
+        for row, cells in rows:
+            if report['rows'] >= self.max_rows:
+                report['truncated'] = True
+                break
+            report['rows'] += 1
+            try:
+                chunk.append((row, self.row_item(cells, mapping, currency)))
+            except ValueError as e:
+                self._fail(report, row, str(e))
+                continue
+            if len(chunk) >= self.chunk_rows:
+                self._write(chunk, tenant_id, report)
+                chunk = []
+        if chunk:
+            self._write(chunk, tenant_id, report)
+        return report
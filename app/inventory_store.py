@@ -0,0 +1,342 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app.enrichment import MONEY_SCALE, QUANTITY_SCALE, from_minor, line_amount, to_fixed
+
+# Configuration: inventory store
+INVENTORY_STORE_PATH = os.getenv('INVENTORY_STORE_PATH', 'data/inventory.db')
+PERSIST_INVENTORY = os.getenv('PERSIST_INVENTORY', 'true').lower() == 'true'  # Save items extracted by /api/generate
+INVENTORY_MARGIN_BUCKETS = [  # Edges of the profit margin histogram, in percent
+    float(edge) for edge in os.getenv('INVENTORY_MARGIN_BUCKETS', '0,10,20,30,50,100').split(',')
+]
+
+MARGIN_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Columns copied out of an enriched item; the full item is kept as JSON in `data`
+ITEM_COLUMNS = (
+    'inventory_id', 'sku', 'name', 'description', 'category', 'item_type', 'currency', 'unit_price', 'cost_price',
+    'tax_rate', 'quantity_on_hand', 'low_stock_threshold', 'reorder_quantity', 'supplier_name', 'track_inventory',
+    'is_active', 'profit_margin', 'stock_value_minor', 'created_at', 'updated_at', 'data'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    inventory_id TEXT NOT NULL,
+    sku TEXT COLLATE NOCASE,
+    name TEXT NOT NULL COLLATE NOCASE,
+    description TEXT,
+    category TEXT COLLATE NOCASE,
+    item_type TEXT,
+    currency TEXT,
+    unit_price REAL NOT NULL,
+    cost_price REAL NOT NULL,
+    tax_rate REAL NOT NULL,
+    quantity_on_hand REAL,
+    low_stock_threshold REAL,
+    reorder_quantity REAL,
+    supplier_name TEXT,
+    track_inventory INTEGER NOT NULL,
+    is_active INTEGER NOT NULL,
+    profit_margin REAL NOT NULL,
+    stock_value_minor INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS items_inventory_id ON items (tenant_id, inventory_id);
+CREATE UNIQUE INDEX IF NOT EXISTS items_sku ON items (tenant_id, sku) WHERE sku IS NOT NULL;
+CREATE INDEX IF NOT EXISTS items_name ON items (tenant_id, name);
+CREATE INDEX IF NOT EXISTS items_category ON items (tenant_id, category);
+CREATE INDEX IF NOT EXISTS items_margin ON items (tenant_id, profit_margin);
+CREATE INDEX IF NOT EXISTS items_low_stock ON items (tenant_id, quantity_on_hand - low_stock_threshold)
+    WHERE quantity_on_hand IS NOT NULL AND low_stock_threshold IS NOT NULL;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    name, content='items', content_rowid='id', tokenize='trigram'
+);
+
+-- Running totals per category and currency, so stock value reports don't scan the items
+CREATE TABLE IF NOT EXISTS category_totals (
+    tenant_id TEXT NOT NULL,
+    category TEXT NOT NULL COLLATE NOCASE,
+    currency TEXT NOT NULL,
+    items INTEGER NOT NULL,
+    quantity REAL NOT NULL,
+    stock_value_minor INTEGER NOT NULL,
+    margin_sum REAL NOT NULL,
+    PRIMARY KEY (tenant_id, category, currency)
+);
+
+CREATE TRIGGER IF NOT EXISTS items_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, name) VALUES (new.id, new.name);
+    INSERT INTO category_totals VALUES (
+        new.tenant_id, coalesce(new.category, ''), coalesce(new.currency, ''),
+        1, coalesce(new.quantity_on_hand, 0), new.stock_value_minor, new.profit_margin
+    ) ON CONFLICT (tenant_id, category, currency) DO UPDATE SET
+        items = items + 1, quantity = quantity + excluded.quantity,
+        stock_value_minor = stock_value_minor + excluded.stock_value_minor, margin_sum = margin_sum + excluded.margin_sum;
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    UPDATE category_totals SET
+        items = items - 1, quantity = quantity - coalesce(old.quantity_on_hand, 0),
+        stock_value_minor = stock_value_minor - old.stock_value_minor, margin_sum = margin_sum - old.profit_margin
+    WHERE tenant_id = old.tenant_id AND category = coalesce(old.category, '') AND currency = coalesce(old.currency, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_update AFTER UPDATE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO items_fts (rowid, name) VALUES (new.id, new.name);
+    UPDATE category_totals SET
+        items = items - 1, quantity = quantity - coalesce(old.quantity_on_hand, 0),
+        stock_value_minor = stock_value_minor - old.stock_value_minor, margin_sum = margin_sum - old.profit_margin
+    WHERE tenant_id = old.tenant_id AND category = coalesce(old.category, '') AND currency = coalesce(old.currency, '');
+    INSERT INTO category_totals VALUES (
+        new.tenant_id, coalesce(new.category, ''), coalesce(new.currency, ''),
+        1, coalesce(new.quantity_on_hand, 0), new.stock_value_minor, new.profit_margin
+    ) ON CONFLICT (tenant_id, category, currency) DO UPDATE SET
+        items = items + 1, quantity = quantity + excluded.quantity,
+        stock_value_minor = stock_value_minor + excluded.stock_value_minor, margin_sum = margin_sum + excluded.margin_sum;
+END;
+"""
+
+# An item matches an existing row by inventory_id, or else by SKU. Either way the stored
+# inventory_id and created_at are kept, in the columns and in the item JSON.
+_UPDATE_COLUMNS = ', '.join(
+    f"{column} = excluded.{column}"
+    for column in ITEM_COLUMNS if column not in ('inventory_id', 'created_at', 'data')
+) + ", data = json_set(excluded.data, '$.inventory_id', inventory_id, '$.created_at', created_at)"
+
+UPSERT = f"""
+INSERT INTO items (tenant_id, {', '.join(ITEM_COLUMNS)}) VALUES ({', '.join('?' * (len(ITEM_COLUMNS) + 1))})
+ON CONFLICT (tenant_id, inventory_id) DO UPDATE SET {_UPDATE_COLUMNS}
+ON CONFLICT (tenant_id, sku) WHERE sku IS NOT NULL DO UPDATE SET {_UPDATE_COLUMNS}
+"""
+
+class InventoryStore:
+    """
+    Inventory items in SQLite, shared by every worker.
+
+    Lookups by SKU, name and category use indexes, name search uses an FTS5
+    trigram index (any 3+ character substring), and low-stock queries use an
+    index on quantity_on_hand - low_stock_threshold. Stock values are kept in
+    minor units, and per-category totals are maintained by triggers, so
+    reports read a handful of rows whatever the number of items.
+    """
+
+    def __init__(self, path: str = INVENTORY_STORE_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _query(self, sql: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        connection = self._connect()
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _row(item: Dict[str, Any], tenant_id: str, now: str) -> tuple:
+        """Column values of an enriched inventory item"""
+        if not item.get('inventory_id'):
+            raise ValueError("Inventory items need an inventory_id (enrich them first)")
+        if not item.get('name'):
+            raise ValueError(f"Inventory item {item['inventory_id']} has no name")
+
+        quantity = item.get('quantity_on_hand')
+        cost_price = item.get('cost_price') or 0
+        stock_value = 0
+        if quantity and cost_price > 0:
+            stock_value = line_amount(to_fixed(quantity, QUANTITY_SCALE), to_fixed(cost_price, MONEY_SCALE))
+        tax_rate = item.get('tax_rate_percentage', (item.get('tax_rate') or 0) * 100)
+
+        return (
+            tenant_id, item['inventory_id'], (item.get('sku') or '').strip() or None, item['name'],
+            item.get('description'), item.get('category') or None, item.get('item_type'), item.get('currency'),
+            item.get('unit_price') or 0, cost_price, tax_rate or 0, quantity, item.get('low_stock_threshold'),
+            item.get('reorder_quantity'), item.get('supplier_name'), bool(item.get('track_inventory')),
+            item.get('is_active', True) is not False, item.get('profit_margin') or 0, stock_value,
+            item.get('created_at') or now, now, json.dumps(item)
+        )
+
+    def upsert(self, items: Iterable[Dict[str, Any]], tenant_id: Optional[str] = None) -> int:
+        """
+        Insert or update enriched inventory items in one transaction.
+
+        Args:
+            items: Items as returned by inventory enrichment (with inventory_id)
+            tenant_id: Tenant owning the items (shared default store if omitted)
+
+        Returns:
+            Number of items written
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [self._row(item, tenant_id or '', now) for item in items]
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(UPSERT, rows)
+            connection.execute("COMMIT")
+        except sqlite3.IntegrityError as e:
+            connection.execute("ROLLBACK")
+            raise ValueError(f"Conflicting inventory items (an inventory_id and a SKU of different items?): {e}")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return len(rows)
+
+    def get(self, inventory_id: str, tenant_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT data FROM items WHERE tenant_id = ? AND inventory_id = ?", (tenant_id or '', inventory_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def find(self, query: Optional[str] = None, sku: Optional[str] = None, category: Optional[str] = None,
+             tenant_id: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Items matching every given filter.
+
+        Args:
+            query: Name search; 3+ characters match anywhere in the name (best matches first), shorter ones a name prefix
+            sku: Exact SKU
+            category: Exact category (case-insensitive)
+            tenant_id: Tenant owning the items
+            limit: Maximum number of items
+            offset: Items to skip, for paging
+        """
+        conditions = ["items.tenant_id = ?"]
+        parameters: List[Any] = [tenant_id or '']
+        source = "items"
+        order = "items.name"
+        if query and len(query.strip()) >= 3:
+            source = "items_fts JOIN items ON items.id = items_fts.rowid"
+            conditions.append("items_fts MATCH ?")
+            parameters.append('"' + query.strip().replace('"', '""') + '"')
+            order = "items_fts.rank"
+        elif query and query.strip():
+            conditions.append("items.name LIKE ?")
+            parameters.append(query.strip().replace('%', '').replace('_', '') + '%')
+        if sku:
+            conditions.append("items.sku = ?")
+            parameters.append(sku.strip())
+        if category:
+            conditions.append("items.category = ?")
+            parameters.append(category)
+
+        rows = self._query(
+            f"SELECT items.data FROM {source} WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ? OFFSET ?",
+            parameters + [limit, offset]
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def by_skus(self, skus: Iterable[str], tenant_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Items with any of the given SKUs (case-insensitive), keyed by upper-cased SKU"""
+        skus = list({sku.strip().upper() for sku in skus if sku and sku.strip()})
+        if not skus:
+            return {}
+        rows = self._query(
+            f"SELECT sku, data FROM items WHERE tenant_id = ? AND sku IN ({', '.join('?' * len(skus))})",
+            [tenant_id or ''] + skus
+        )
+        return {sku.upper(): json.loads(data) for sku, data in rows}
+
+    def match_names(self, terms: Sequence[str], tenant_id: Optional[str] = None, limit: int = 20,
+                    match_all: bool = False) -> List[Dict[str, Any]]:
+        """Active items whose name contains any (or with match_all, every one) of the terms (3+ characters each), best matches first"""
+        terms = [term for term in dict.fromkeys(term.strip() for term in terms) if len(term) >= 3]
+        if not terms:
+            return []
+        rows = self._query(
+            "SELECT items.data FROM items_fts JOIN items ON items.id = items_fts.rowid "
+            "WHERE items.tenant_id = ? AND items.is_active AND items_fts MATCH ? ORDER BY items_fts.rank LIMIT ?",
+            (tenant_id or '', (' AND ' if match_all else ' OR ').join('"' + term.replace('"', '""') + '"' for term in terms), limit)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def low_stock(self, tenant_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Items at or below their low_stock_threshold, furthest below first"""
+        rows = self._query(
+            "SELECT data, low_stock_threshold - quantity_on_hand FROM items "
+            "WHERE tenant_id = ? AND quantity_on_hand IS NOT NULL AND low_stock_threshold IS NOT NULL "
+            "AND quantity_on_hand - low_stock_threshold <= 0 "
+            "ORDER BY quantity_on_hand - low_stock_threshold LIMIT ?",
+            (tenant_id or '', limit)
+        )
+        return [{**json.loads(data), 'shortfall': shortfall} for data, shortfall in rows]
+
+    def stock_value_by_category(self, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Item count, quantity and stock value (at cost) per category and currency, highest value first"""
+        rows = self._query(
+            "SELECT category, currency, items, quantity, stock_value_minor FROM category_totals "
+            "WHERE tenant_id = ? AND items > 0 ORDER BY stock_value_minor DESC",
+            (tenant_id or '',)
+        )
+        return [
+            {'category': category or None, 'currency': currency or None, 'items': items,
+             'quantity': quantity, 'stock_value': from_minor(stock_value)}
+            for category, currency, items, quantity, stock_value in rows
+        ]
+
+    def margin_distribution(self, tenant_id: Optional[str] = None,
+                            edges: Sequence[float] = INVENTORY_MARGIN_BUCKETS) -> Dict[str, Any]:
+        """
+        Profit margin summary: count, average, range, percentiles and a histogram.
+
+        The margins are read in one ordered pass over the margin index into a
+        NumPy array; percentiles are then positions in it and bucket counts
+        come from one vectorized search for the edges.
+
+        Returns:
+            Dict with items, average, min, max, percentiles ({'p50': ...}) and
+            buckets ([{'from', 'to', 'items'}], open-ended at both ends)
+        """
+        edges = sorted(edges)
+        connection = self._connect()
+        try:
+            cursor = connection.execute(
+                "SELECT profit_margin FROM items INDEXED BY items_margin WHERE tenant_id = ? ORDER BY profit_margin",
+                (tenant_id or '',)
+            )
+            margins = np.fromiter((row[0] for row in cursor), dtype=np.float64)
+            count = len(margins)
+            if not count:
+                return {'items': 0, 'average': None, 'min': None, 'max': None, 'percentiles': {}, 'buckets': []}
+
+            # Items below each edge; a bucket [from, to) holds the difference
+            below = [0, *np.searchsorted(margins, edges, side='left').tolist(), count]
+            bounds = [None, *edges, None]
+            return {
+                'items': count,
+                'average': round(float(margins.mean()), 2),
+                'min': float(margins[0]),
+                'max': float(margins[-1]),
+                # Nearest-rank percentiles
+                'percentiles': {f'p{p}': float(margins[round(p / 100 * (count - 1))]) for p in MARGIN_PERCENTILES},
+                'buckets': [
+                    {'from': low, 'to': high, 'items': high_below - low_below}
+                    for low, high, low_below, high_below in zip(bounds, bounds[1:], below, below[1:])
+                ]
+            }
+        finally:
+            connection.close()
@@ -0,0 +1,345 @@
+import asyncio
+import json
+import threading
+import os
+import shutil
+import sqlite3
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Configuration: background jobs
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))  # Jobs run at once per server process, apart from interactive requests
+JOBS_QUEUE_PATH = os.getenv('JOBS_QUEUE_PATH', 'data/jobs.db')  # SQLite file shared by every worker ('' keeps jobs in memory)
+JOBS_ARTIFACT_DIR = os.getenv('JOBS_ARTIFACT_DIR', 'data/jobs')
+JOBS_TTL_SECONDS = int(os.getenv('JOBS_TTL_SECONDS', '86400'))  # Finished jobs and their artifacts are kept this long
+JOBS_CLEANUP_INTERVAL = int(os.getenv('JOBS_CLEANUP_INTERVAL', '300'))
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '60'))  # A running job without a heartbeat this long is run again
+JOBS_WEBHOOK_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv('JOBS_WEBHOOK_HOSTS', 'localhost,127.0.0.1,::1').split(',') if host.strip()
+)
+JOBS_WEBHOOK_TIMEOUT = float(os.getenv('JOBS_WEBHOOK_TIMEOUT', '10'))
+
+# A job whose worker died this many times (lease expired) is failed instead of run again
+MAX_ATTEMPTS = 3
+# Idle workers look for jobs submitted by other server processes this often
+POLL_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    callback_url TEXT,
+    progress TEXT,
+    error TEXT,
+    artifact TEXT,
+    media_type TEXT,
+    webhook TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+"""
+
+# The oldest queued job, or a running one whose worker stopped sending heartbeats
+CLAIM = """
+UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ?, heartbeat = ?
+WHERE job_id = (
+    SELECT job_id FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)
+    ORDER BY created LIMIT 1
+)
+RETURNING job_id, kind, params, attempts
+"""
+
+# Runs a job: (params, job directory, live progress dict) -> (artifact file name in the job directory, media type)
+Handler = Callable[[Dict[str, Any], Path, Dict[str, Any]], Awaitable[Tuple[str, str]]]
+
+def check_callback_url(url: str) -> str:
+    """A webhook URL on an allowed local host (JOBS_WEBHOOK_HOSTS); raises ValueError otherwise"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or (parsed.hostname or '').lower() not in JOBS_WEBHOOK_HOSTS:
+        raise ValueError(
+            f"callback_url must be an http(s) URL on one of: {', '.join(sorted(JOBS_WEBHOOK_HOSTS))}"
+        )
+    return url
+
+def _timestamp(seconds: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(seconds).isoformat() if seconds else None
+
+def _post_json(url: str, body: bytes):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=JOBS_WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+class JobQueue:
+    """
+    Background jobs for work that outlasts an HTTP request.
+
+    Jobs are rows in SQLite: a file when path is set, so queued jobs survive
+    restarts and are shared by server processes, otherwise an in-memory
+    database. Workers claim the oldest queued job in one UPDATE and send
+    heartbeats while it runs; a job whose heartbeats stop (its process died)
+    is claimed again. Each job has a directory for its inputs and artifact,
+    removed with the job ttl seconds after it finishes.
+
+    Only `workers` jobs run at once per process, whatever the interactive
+    traffic. Each runs on its own event loop in a job thread, so blocking
+    calls in a handler (provider SDKs, rendering, OCR) never stall the
+    server's loop, its requests or the heartbeats.
+    """
+
+    def __init__(self, path: str = JOBS_QUEUE_PATH, artifact_dir: str = JOBS_ARTIFACT_DIR, workers: int = JOBS_WORKERS,
+                 ttl: int = JOBS_TTL_SECONDS, cleanup_interval: int = JOBS_CLEANUP_INTERVAL,
+                 lease: int = JOBS_LEASE_SECONDS):
+        self.path = path
+        self.artifact_dir = Path(artifact_dir)
+        self.workers = workers
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.lease = lease
+        self.handlers: Dict[str, Handler] = {}
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection, used from the event loop only; every statement is a short single-row query
+        self._connection = sqlite3.connect(path or ':memory:', timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        if path:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+
+    def register(self, kind: str, handler: Handler):
+        """Run jobs of this kind with handler"""
+        self.handlers[kind] = handler
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.artifact_dir / job_id
+
+    def allocate(self) -> Tuple[str, Path]:
+        """A new job id and its empty directory, for inputs to be written before the job is submitted"""
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        return job_id, job_dir
+
+    def submit(self, job_id: str, kind: str, params: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue an allocated job.
+
+        Args:
+            job_id: Id from allocate(), whose directory holds the job's inputs
+            kind: Registered handler kind
+            params: JSON-serializable handler parameters
+            callback_url: Local URL to POST the job's final status to
+
+        Returns:
+            Status of the queued job
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        if callback_url:
+            check_callback_url(callback_url)
+        self._connection.execute(
+            "INSERT INTO jobs (job_id, kind, status, params, callback_url, created) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(params), callback_url, time.time())
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public status of a job, or None if unknown or expired; progress is live while this process runs it"""
+        row = self._connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        progress = dict(self._live[job_id]) if job_id in self._live else None
+        if progress is None:
+            progress = json.loads(row['progress']) if row['progress'] else {}
+        return {
+            "job_id": row['job_id'],
+            "kind": row['kind'],
+            "status": row['status'],
+            "created_at": _timestamp(row['created']),
+            "started_at": _timestamp(row['started']),
+            "finished_at": _timestamp(row['finished']),
+            "expires_at": _timestamp(row['finished'] + self.ttl if row['finished'] else None),
+            "attempts": row['attempts'],
+            "progress": progress,
+            "error": row['error'],
+            "artifact": row['artifact'],
+            "media_type": row['media_type'],
+            "webhook": row['webhook'],
+        }
+
+    def artifact(self, job_id: str) -> Optional[Tuple[Path, str]]:
+        """Path and media type of a completed job's artifact"""
+        row = self._connection.execute(
+            "SELECT artifact, media_type FROM jobs WHERE job_id = ? AND status = 'completed'", (job_id,)
+        ).fetchone()
+        if row is None or not row['artifact']:
+            return None
+        return self.job_dir(job_id) / row['artifact'], row['media_type']
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        return self._connection.execute(CLAIM, (now, now, now - self.lease)).fetchone()
+
+    def _finish(self, job_id: str, status: str, progress: Dict[str, Any], error: Optional[str] = None,
+                artifact: Optional[str] = None, media_type: Optional[str] = None):
+        self._connection.execute(
+            "UPDATE jobs SET status = ?, progress = ?, error = ?, artifact = ?, media_type = ?, finished = ? WHERE job_id = ?",
+            (status, json.dumps(progress, default=str), error, artifact, media_type, time.time(), job_id)
+        )
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self._connection.execute(
+                "UPDATE jobs SET heartbeat = ?, progress = ? WHERE job_id = ? AND status = 'running'",
+                (time.time(), json.dumps(dict(self._live.get(job_id, {})), default=str), job_id)
+            )
+
+    async def _call(self, handler: Handler, params: Dict[str, Any], job_dir: Path, progress: Dict[str, Any]):
+        """Run a handler to completion on a private event loop in a job thread; cancelling cancels the handler"""
+        cancelled = threading.Event()
+        running: Dict[str, Any] = {}
+
+        def run():
+            loop = asyncio.new_event_loop()
+            try:
+                task = loop.create_task(handler(params, job_dir, progress))
+                running.update(loop=loop, task=task)
+                if cancelled.is_set():
+                    task.cancel()
+                return loop.run_until_complete(task)
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.run_until_complete(loop.shutdown_default_executor())
+                loop.close()
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+        except asyncio.CancelledError:
+            cancelled.set()
+            if 'task' in running:
+                running['loop'].call_soon_threadsafe(running['task'].cancel)
+            raise
+
+    async def _run(self, job: sqlite3.Row):
+        job_id = job['job_id']
+        progress: Dict[str, Any] = {}
+        self._live[job_id] = progress
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            if job['attempts'] > MAX_ATTEMPTS:
+                raise RuntimeError(f"Job was interrupted {MAX_ATTEMPTS} times")
+            handler = self.handlers.get(job['kind'])
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind '{job['kind']}'")
+            artifact, media_type = await self._call(handler, json.loads(job['params']), self.job_dir(job_id), progress)
+            self._finish(job_id, 'completed', progress, artifact=artifact, media_type=media_type)
+        except asyncio.CancelledError:
+            # Server shutting down: queue the job again for the next start (or another process). Only a
+            # lease expiry (a process that died) counts as an interruption, so deploys don't use up attempts
+            self._connection.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1 WHERE job_id = ?", (job_id,)
+            )
+            raise
+        except Exception as e:
+            self._finish(job_id, 'failed', progress, error=str(getattr(e, 'detail', None) or e))
+        finally:
+            heartbeat.cancel()
+            self._live.pop(job_id, None)
+        await self._notify(job_id)
+
+    async def _notify(self, job_id: str):
+        """POST the final status to the job's callback_url, recording whether it was delivered"""
+        row = self._connection.execute("SELECT callback_url FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or not row['callback_url']:
+            return
+        try:
+            await asyncio.to_thread(_post_json, row['callback_url'], json.dumps(self.status(job_id)).encode('utf-8'))
+            webhook = "delivered"
+        except Exception as e:
+            webhook = f"failed: {e}"
+        self._connection.execute("UPDATE jobs SET webhook = ? WHERE job_id = ?", (webhook, job_id))
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            job = self._claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Remove jobs finished more than ttl seconds ago, with their directories.
+
+        Directories of no known job (jobs of an in-memory queue before a
+        restart) are removed once they are as old.
+
+        Returns:
+            Number of directories removed
+        """
+        cutoff = (now or time.time()) - self.ttl
+        expired = [row['job_id'] for row in self._connection.execute(
+            "SELECT job_id FROM jobs WHERE finished < ?", (cutoff,)
+        )]
+        self._connection.execute("DELETE FROM jobs WHERE finished < ?", (cutoff,))
+        removed = 0
+        if self.artifact_dir.is_dir():
+            for entry in self.artifact_dir.iterdir():
+                if entry.name in expired or (
+                    entry.stat().st_mtime < cutoff and
+                    self._connection.execute("SELECT 1 FROM jobs WHERE job_id = ?", (entry.name,)).fetchone() is None
+                ):
+                    shutil.rmtree(entry, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    async def _clean(self):
+        while True:
+            try:
+                self.expire()
+            except Exception as e:
+                # A locked database or an unremovable directory must not end expiry for good
+                print(f"Job cleanup failed: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def start(self):
+        """Start the worker pool and the expiry loop on the running event loop"""
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._clean()))
+
+    async def stop(self):
+        """Stop the workers; jobs they were running are queued again"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            # Cancelled handlers stop at their next await; don't hold shutdown for a blocking call in progress
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -1,12 +1,38 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Header, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from typing import Optional, Dict, Any
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.datastructures import Headers
+from typing import Optional, Dict, Any, List, Union
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime
+from itertools import chain, islice
+from pathlib import Path
 from dotenv import load_dotenv
 from app.ai_service import AIService
-from app.export_service import ExportService
-import base64
+from app.catalog import CATALOG_ENABLED, CatalogResolver
+from app.customer_directory import CUSTOMER_DIRECTORY_ENABLED, CustomerDirectory
+from app.enrichment import EnrichmentEngine
+from app.inventory_import import (
+    CSV_EXTENSIONS, INVENTORY_IMPORT_SAMPLE_ROWS, IMPORT_FIELDS, XLSX_EXTENSIONS, InventoryImporter, detect_columns,
+    mapping_from_model, read_rows, sample_text
+)
+from app.inventory_store import InventoryStore, PERSIST_INVENTORY
+from app.jobs import JobQueue, check_callback_url
+from app.numbering import NumberAllocator
+from app.export_service import CsvRows, ExportService, ExportTemplate, PdfBundle, RenderPool, XlsxRows, ZipStream
+from app.image_service import ImageService
+from app.render_cache import RenderCache
+from app.schemas import (
+    CustomerListResponse, GenerateResponse, InventoryData, JobStatusResponse, InventoryImportResponse, InventoryListResponse, InventoryUpsertResponse,
+    MarginDistributionResponse, OrjsonResponse, RecalculateResponse, StockValueResponse
+)
+import asyncio
+import shutil
+import tempfile
+import zipfile
+import uuid
 import os
 
 load_dotenv()
@@ -15,7 +41,55 @@ load_dotenv()
 DEFAULT_TAX_RATE = float(os.getenv('DEFAULT_TAX_RATE', '7.5'))  # 7.5% default
 DEFAULT_DELIVERY_RATE = float(os.getenv('DEFAULT_DELIVERY_RATE', '3.0'))  # 3% default
 
+# Configuration: Multi-file uploads
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', '20'))
+MAX_ZIP_ENTRY_BYTES = int(os.getenv('MAX_ZIP_ENTRY_BYTES', str(25 * 1024 * 1024)))
+
+# Configuration: Bulk export
+BULK_EXPORT_MAX_DOCUMENTS = int(os.getenv('BULK_EXPORT_MAX_DOCUMENTS', '1000'))
+BULK_EXPORT_WINDOW = int(os.getenv('BULK_EXPORT_WINDOW', '0'))  # Renders in flight per bulk export (0 = 2x pool workers)
+BULK_EXPORT_HISTORY = int(os.getenv('BULK_EXPORT_HISTORY', '100'))  # Finished exports kept for progress polling
+
+# Configuration: Background jobs (queue, workers and retention in app/jobs.py)
+JOBS_RENDER_WINDOW = int(os.getenv('JOBS_RENDER_WINDOW', '0'))  # Renders in flight per bulk export job (0 = pool workers)
+
+# Configuration: Recalculation
+RECALCULATE_MAX_DOCUMENTS = int(os.getenv('RECALCULATE_MAX_DOCUMENTS', '1000'))
+
+# Configuration: Inventory
+INVENTORY_UPSERT_MAX_ITEMS = int(os.getenv('INVENTORY_UPSERT_MAX_ITEMS', '10000'))
+
+EXPORT_MEDIA_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'png': 'image/png',
+    'preview': 'image/webp',
+    'html': 'text/html; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+BULK_MEDIA_TYPES = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+    'csv': EXPORT_MEDIA_TYPES['csv'],
+    'xlsx': EXPORT_MEDIA_TYPES['xlsx']
+}
+
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
+DOCUMENT_EXTENSIONS = ['pdf', 'docx', 'doc', 'txt']
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-warm the renderer pool so the first export doesn't pay for font/stylesheet loading
+    await run_in_threadpool(render_pool.start)
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    render_pool.shutdown()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Quotla AI Document Generator",
     description="""
 ## AI-Powered Invoice & Quote Generator
@@ -85,8 +159,20 @@ app.add_middleware(
 
 ai_service = AIService()
 export_service = ExportService()
-
-# Models removed - using Form parameters for unified endpoint compatibility
+render_pool = RenderPool(export_service)
+render_cache = RenderCache()
+image_service = ImageService()
+enrichment_engine = EnrichmentEngine(DEFAULT_TAX_RATE, DEFAULT_DELIVERY_RATE)
+number_allocator = NumberAllocator()
+inventory_store = InventoryStore()
+catalog_resolver = CatalogResolver(inventory_store)
+customer_directory = CustomerDirectory()
+inventory_importer = InventoryImporter(inventory_store, enrichment_engine, number_allocator)
+job_queue = JobQueue()
+bulk_exports: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+# Request models removed - using Form parameters for unified endpoint compatibility
+# Response models (app/schemas.py) document the JSON endpoints; responses are serialized with orjson
 
 @app.get(
     "/",
@@ -150,113 +236,113 @@ Use multipart/form-data with:
 - `success`: Boolean
 - `document_type`: Detected/specified type
 - `data`: Structured document data
-- `text_output`: Formatted text
+- `text_output`: Formatted text (omitted with `include_text=false`)
 - `needs_currency`: Boolean (if currency required)
+
+**Smaller responses:** `fields` returns only the listed `data` fields (e.g. `invoice_number,total`),
+and `include_text=false` skips formatting `text_output` altogether.
     """,
-    response_description="Structured document data with enriched fields and calculations"
+    response_description="Structured document data with enriched fields and calculations",
+    response_model=GenerateResponse,
+    response_class=OrjsonResponse
 )
 async def generate_document(
     prompt: str = Form(None, description="Text prompt or instructions for extraction"),
     file: Optional[UploadFile] = File(None, description="Optional file upload (PDF, DOCX, TXT, or image)"),
     document_type: Optional[str] = Form(None, description="Force type: 'invoice', 'quote', or 'inventory' (auto-detected if omitted)"),
-    history: Optional[str] = Form(None, description="JSON string of conversation history")
+    history: Optional[str] = Form(None, description="JSON string of conversation history"),
+    files: Optional[List[UploadFile]] = File(None, description="Multiple files or ZIP archives processed in one request"),
+    batch_mode: str = Form('merge', description="For multiple files: 'merge' into one document or 'separate' for one document per file"),
+    tenant_id: Optional[str] = Form(None, description="Tenant whose document number sequence and format are used"),
+    fields: Optional[str] = Form(None, description="Comma-separated data fields to return, e.g. 'invoice_number,total' (all if omitted)"),
+    include_text: bool = Form(True, description="Include the formatted text_output (false skips formatting it)")
 ):
     try:
-        # Parse history if provided
-        parsed_history = []
-        if history:
-            import json
-            try:
-                parsed_history = json.loads(history)
-            except:
-                pass
-
-        # If no file provided, treat as text-only request
-        if not file:
-            # Prompt is required for text-only
-            if not prompt:
-                raise HTTPException(status_code=400, detail="Either 'prompt' or 'file' must be provided")
-
-            # Use AI to detect document type if not specified
-            detection_result = document_type or _ai_detect_type(prompt)
-
-            # Handle conversational requests
-            if isinstance(detection_result, dict) and detection_result.get('document_type') == 'conversation':
-                return {
-                    "success": True,
-                    "document_type": "conversation",
-                    "message": detection_result.get('message', 'Hello! I help generate invoices and quotes. Just describe what you need!'),
-                    "text_output": detection_result.get('message', 'Hello! I help generate invoices and quotes. Just describe what you need!')
-                }
-
-            # Extract document type from detection result
-            doc_type = detection_result if isinstance(detection_result, str) else detection_result.get('document_type', 'quote')
-            data = await ai_service.extract_document_data(prompt, parsed_history, doc_type)
+        uploads = ([file] if file else []) + (files or [])
+        return OrjsonResponse(await _generate(
+            prompt, uploads, document_type, history, batch_mode, tenant_id, _parse_fields(fields), include_text
+        ))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        else:
-            # File upload path
-            file_bytes = await file.read()
-            filename = file.filename or "document"
-            file_ext = filename.lower().split('.')[-1]
+@app.post(
+    "/api/recalculate",
+    tags=["Document Generation"],
+    summary="Recalculate Edited Documents",
+    description="""
+Recompute the totals of documents edited by the user, without calling the AI model.
 
-            # Use prompt or default extraction instruction
-            extraction_prompt = prompt or "Extract all document data from this file"
-
-            # Detect document type
-            doc_type = document_type or _ai_detect_type(extraction_prompt)
-            if isinstance(doc_type, dict):
-                doc_type = doc_type.get('document_type', 'quote')
-
-            # Determine file type and process accordingly
-            image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
-            document_extensions = ['pdf', 'docx', 'doc', 'txt']
-
-            if file_ext in image_extensions:
-                # Use vision AI for images
-                image_b64 = base64.b64encode(file_bytes).decode('utf-8')
-                data = await ai_service.extract_with_image(extraction_prompt, image_b64, doc_type)
-            elif file_ext in document_extensions:
-                # Extract text and process
-                data = await ai_service.extract_from_file(extraction_prompt, file_bytes, filename, doc_type)
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Unsupported file type: {file_ext}. Supported: PDF, DOCX, TXT, JPEG, PNG"
-                )
+Send a document (the `data` field from `/api/generate`) or an array of them as the JSON body.
+Item amounts, subtotal, tax, delivery and total are recalculated from the quantities, unit
+prices and rates, and `text_output` is regenerated.
 
-        # Check if currency is missing (except for inventory which handles it differently)
-        if doc_type != 'inventory' and not data.get('currency'):
-            return {
-                "success": False,
-                "needs_currency": True,
-                "message": "Please specify the currency for this document (e.g., NGN, USD, EUR, GBP)",
-                "detected_document_type": doc_type,
-                "partial_data": data
-            }
+**Rates:** `tax_rate_percentage` / `delivery_rate_percentage` are used when present (edit
+those, e.g. `8` for 8%); otherwise `tax_rate` / `delivery_rate` are read as percentages, as in
+model output. Rates of an already generated document are kept as they are, including 0.
 
-        # For inventory, check currency but don't fail if missing
-        if doc_type == 'inventory' and not data.get('currency'):
-            return {
-                "success": False,
-                "needs_currency": True,
-                "message": "Please specify the currency for pricing (e.g., NGN, USD, EUR, GBP)",
-                "detected_document_type": doc_type,
-                "partial_data": data
-            }
+**Numbers:** the document number and date are kept unless `assign_number=true`
+(documents without a number always get one).
 
-        enriched = _enrich_data(data, doc_type)
-        text_output = _format_text(enriched, doc_type)
+**Example:**
+```bash
+curl -X POST "http://localhost:8000/api/recalculate" \\
+  -H "Content-Type: application/json" \\
+  -d '{"invoice_number": "INV20241201000042", "currency": "NGN", "tax_rate_percentage": 8,
+       "items": [{"description": "Chairs", "quantity": 12, "unit_price": 5000}]}'
+```
 
-        return {
-            "success": True,
-            "document_type": doc_type,
-            "data": enriched,
-            "text_output": text_output
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+**Response:**
+- Single document: `success`, `document_type`, `data` and `text_output`, as from `/api/generate`
+- Array: `success` and `documents`, one such entry per document in order
+
+`fields` and `include_text` trim the response as in `/api/generate`.
+    """,
+    response_description="Recalculated document data and text output",
+    response_model=RecalculateResponse,
+    response_class=OrjsonResponse
+)
+async def recalculate_document(
+    document: Union[Dict[str, Any], List[Dict[str, Any]]] = Body(..., description="Document JSON or an array of documents"),
+    document_type: Optional[str] = Query(None, description="Type of every document: 'invoice', 'quote' or 'inventory' (inferred per document if omitted)"),
+    assign_number: bool = Query(False, description="Assign a new document number and date"),
+    tenant_id: Optional[str] = Query(None, description="Tenant whose number sequence and format are used for new numbers"),
+    fields: Optional[str] = Query(None, description="Comma-separated data fields to return (all if omitted)"),
+    include_text: bool = Query(True, description="Include the formatted text_output (false skips formatting it)")
+):
+    projection = _parse_fields(fields)
+    documents = document if isinstance(document, list) else [document]
+    if len(documents) > RECALCULATE_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"Too many documents (max {RECALCULATE_MAX_DOCUMENTS})")
+
+    doc_types = []
+    for index, data in enumerate(documents):
+        doc_type = document_type or _infer_document_type(data)
+        if doc_type not in ('invoice', 'quote', 'inventory'):
+            raise HTTPException(status_code=400, detail=f"Could not determine type of document {index}; pass document_type")
+        doc_types.append(doc_type)
+
+    # Arrays of invoices and quotes are totalled in one columnar pass
+    enriched_documents = None
+    if len(documents) > 1 and 'inventory' not in doc_types:
+        try:
+            enriched_documents = _recalculate_batch(documents, doc_types, assign_number, tenant_id)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            pass  # Recalculate one at a time below to report which document is invalid
+
+    results = []
+    for index, (data, doc_type) in enumerate(zip(documents, doc_types)):
+        try:
+            enriched = enriched_documents[index] if enriched_documents else _recalculate(data, doc_type, assign_number, tenant_id)
+            result = _document_result(enriched, doc_type, projection, include_text)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Document {index} could not be recalculated: {e!r}")
+        results.append(result)
+
+    if isinstance(document, list):
+        return OrjsonResponse({"success": True, "documents": results})
+    return OrjsonResponse(results[0])
 
 @app.post(
     "/api/generate/invoice",
@@ -270,7 +356,7 @@ Legacy endpoint for backward compatibility.
 **Same as `/api/generate` but:**
 - Always generates an invoice (never a quote)
 - Includes delivery charges (3% of subtotal)
-- Uses invoice numbering format: INV{timestamp}
+- Numbered `INV{date:%Y%m%d}{seq:06d}` by default (`NUMBER_FORMAT`); tenant formats from `TENANT_NUMBER_FORMATS` need `/api/generate` with a `tenant_id`
 
 **Example:**
 ```json
@@ -280,13 +366,15 @@ Legacy endpoint for backward compatibility.
 ```
     """,
     response_description="Invoice data with tax and delivery calculations",
+    response_model=GenerateResponse,
+    response_class=OrjsonResponse,
     deprecated=True
 )
 async def generate_invoice(
     prompt: str = Form(...),
     history: Optional[str] = Form(None)
 ):
-    return await generate_document(prompt=prompt, file=None, document_type="invoice", history=history)
+    return await generate_document(prompt=prompt, file=None, document_type="invoice", history=history, files=None, batch_mode='merge', tenant_id=None, fields=None, include_text=True)
 
 @app.post(
     "/api/generate/quote",
@@ -300,7 +388,7 @@ Legacy endpoint for backward compatibility.
 **Same as `/api/generate` but:**
 - Always generates a quote (never an invoice)
 - No delivery charges (quotes only include tax)
-- Uses quote numbering format: QT{timestamp}
+- Numbered `QT{date:%Y%m%d}{seq:06d}` by default (`NUMBER_FORMAT`); tenant formats from `TENANT_NUMBER_FORMATS` need `/api/generate` with a `tenant_id`
 
 **Example:**
 ```json
@@ -310,13 +398,15 @@ Legacy endpoint for backward compatibility.
 ```
     """,
     response_description="Quote data with tax calculations (no delivery)",
+    response_model=GenerateResponse,
+    response_class=OrjsonResponse,
     deprecated=True
 )
 async def generate_quote(
     prompt: str = Form(...),
     history: Optional[str] = Form(None)
 ):
-    return await generate_document(prompt=prompt, file=None, document_type="quote", history=history)
+    return await generate_document(prompt=prompt, file=None, document_type="quote", history=history, files=None, batch_mode='merge', tenant_id=None, fields=None, include_text=True)
 
 @app.post(
     "/api/generate/with-file",
@@ -330,6 +420,8 @@ Legacy endpoint for backward compatibility.
 Simply use the main `/api/generate` endpoint and include your file - it automatically detects whether you're uploading text, documents, or images.
     """,
     response_description="Extracted document data from file",
+    response_model=GenerateResponse,
+    response_class=OrjsonResponse,
     deprecated=True
 )
 async def generate_with_file(
@@ -337,12 +429,12 @@ async def generate_with_file(
     file: UploadFile = File(..., description="Document or image file (PDF, DOCX, TXT, JPEG, PNG, etc.)"),
     document_type: Optional[str] = Form(None, description="Force document type: 'invoice' or 'quote' (auto-detected if omitted)")
 ):
-    return await generate_document(prompt=prompt, file=file, document_type=document_type, history=None)
+    return await generate_document(prompt=prompt, file=file, document_type=document_type, history=None, files=None, batch_mode='merge', tenant_id=None, fields=None, include_text=True)
 
 @app.post(
     "/api/export",
     tags=["Export Formats"],
-    summary="Universal Export (PDF, DOCX, PNG)",
+    summary="Universal Export (PDF, DOCX, PNG, Preview, HTML, CSV, XLSX)",
     description="""
 Generate document from text, files, or images and download in your preferred format.
 
@@ -369,11 +461,26 @@ Generate document from text, files, or images and download in your preferred for
    - Use for: Editable templates, custom branding, further modifications
 
 3. **PNG (Image)** - `format=png`
-   - 800×1000 pixel resolution
+   - 800 pixels wide, at least 1000 high (very long documents come back as a ZIP of pages)
    - Clean white background
    - Professional typography
    - Use for: Social media, WhatsApp, quick previews, mobile sharing
 
+4. **Preview** - `format=preview`
+   - Small WEBP/JPEG thumbnail of the first page, rendered in a few milliseconds
+   - Tune with `options`, e.g. `{"width": 300, "image_format": "jpeg"}`
+   - Use for: Chat previews before download
+
+5. **HTML** - `format=html`
+   - Standalone page streamed straight from a compiled template, no renderer pool round trip
+   - Same layout as PDF/DOCX, with print CSS for headless printing
+   - Use for: Showing a document in the browser
+
+6. **CSV / XLSX (Spreadsheet)** - `format=csv` or `format=xlsx`
+   - Raw numeric amounts, one row per line item keyed by document number
+   - XLSX adds a Documents sheet with customer details and totals; CSV gives it with `options={"rows": "documents"}`
+   - Use for: Accounting imports, pivot tables
+
 **Example:**
 ```bash
 curl -X POST "http://localhost:8000/api/export" \\
@@ -390,7 +497,12 @@ Binary file in the specified format with appropriate filename (e.g., INV20241201
             "content": {
                 "application/pdf": {},
                 "application/vnd.openxmlformats-officedocument.wordprocessingml.document": {},
-                "image/png": {}
+                "image/png": {},
+                "image/webp": {},
+                "image/jpeg": {},
+                "text/html": {},
+                "text/csv": {},
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": {}
             },
             "description": "Successfully generated document in requested format"
         }
@@ -401,45 +513,485 @@ async def export_document(
     prompt: str = Form(None),
     file: Optional[UploadFile] = File(None),
     document_type: Optional[str] = Form(None),
-    history: Optional[str] = Form(None)
+    history: Optional[str] = Form(None),
+    template: Optional[str] = Form(None, description="Branding template: 'default', 'modern', 'minimal' (tenant default if omitted)"),
+    tenant_id: Optional[str] = Form(None, description="Tenant identifier used to pick its branding template and number sequence"),
+    data: Optional[str] = Form(None, description="JSON of a previously generated document (the 'data' field from /api/generate); skips AI extraction"),
+    formats: Optional[str] = Form(None, description="Comma-separated formats rendered into one ZIP bundle, e.g. 'pdf,docx,png'"),
+    options: Optional[str] = Form(None, description="JSON render options, e.g. {\"font\": \"embedded\"} for pdf, {\"compress_level\": 1} for png or {\"width\": 300, \"image_format\": \"jpeg\"} for preview, {\"rows\": \"documents\"} for csv"),
+    if_none_match: Optional[str] = Header(None)
 ):
     try:
-        # Validate format
-        valid_formats = ['pdf', 'docx', 'png']
-        format_lower = format.lower()
-        if format_lower not in valid_formats:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid format '{format}'. Supported formats: {', '.join(valid_formats)}"
-            )
-
-        # Generate document data
-        enriched, doc_type = await _generate_document_data(prompt, file, document_type, history)
-
-        # Generate export in specified format
-        export_buffer = export_service.generate_export(enriched, doc_type, format_lower)
+        # Validate format(s)
+        valid_formats = list(EXPORT_MEDIA_TYPES)
+        requested = [f.strip().lower() for f in formats.split(',') if f.strip()] if formats else [format.lower()]
+        requested = list(dict.fromkeys(requested))
+        for format_lower in requested:
+            if format_lower not in valid_formats:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid format '{format_lower}'. Supported formats: {', '.join(valid_formats)}"
+                )
+        format_lower = requested[0]
 
-        # Determine media type and file extension
-        media_types = {
-            'pdf': 'application/pdf',
-            'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'png': 'image/png'
-        }
+        # Resolve branding and render options before spending an AI call
+        try:
+            export_template = export_service.get_template(template, tenant_id)
+            render_options = _parse_render_options(options, requested)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Generate document data, or reuse a document the client already has
+        if data:
+            enriched, doc_type = _parse_document_json(data, document_type)
+        else:
+            enriched, doc_type = await _generate_document_data(prompt, file, document_type, history, tenant_id)
 
         # Generate filename
         doc_number = enriched.get('invoice_number' if doc_type == 'invoice' else 'quote_number', 'document')
-        filename = f"{doc_number}.{format_lower}"
 
-        return StreamingResponse(
-            export_buffer,
-            media_type=media_types[format_lower],
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        # Several formats: data was generated once, render them concurrently into a streamed ZIP
+        if len(requested) > 1:
+            return StreamingResponse(
+                _stream_export_bundle(enriched, doc_type, requested, export_template, doc_number, render_options, bool(data)),
+                media_type='application/zip',
+                headers={"Content-Disposition": f"attachment; filename={doc_number}.zip"}
+            )
+
+        # A prompt export is a newly numbered document that can't match an earlier render, so only
+        # re-exports of `data` go through the render cache and answer conditional requests
+        if data:
+            cache_key = RenderCache.make_key(enriched, doc_type, format_lower, export_template.name, export_template.version,
+                                             render_options[format_lower])
+            cache_headers = {"ETag": f'"{cache_key}"'}
+
+            # Client already has this exact render
+            if _etag_matches(if_none_match, cache_headers["ETag"]):
+                return Response(status_code=304, headers=cache_headers)
+        else:
+            cache_key, cache_headers = None, {}
+
+        # HTML is cheap to render: stream it straight from the template instead of going through the pool
+        if format_lower == 'html' and (cache_key is None or cache_key not in render_cache):
+            return StreamingResponse(
+                _stream_html_cached(enriched, doc_type, export_template, cache_key) if cache_key
+                else export_service.stream_html(enriched, doc_type, export_template),
+                media_type=EXPORT_MEDIA_TYPES['html'],
+                headers={"Content-Disposition": f"inline; filename={doc_number}.html", **cache_headers}
+            )
+
+        if cache_key:
+            export_bytes = await _render_cached(enriched, doc_type, format_lower, export_template, render_options[format_lower], cache_key)
+        else:
+            export_bytes = await render_pool.render(enriched, doc_type, format_lower, export_template.name, render_options[format_lower])
+        extension, media_type = _export_file_type(format_lower, export_bytes)
+        disposition = 'inline' if format_lower == 'html' else 'attachment'
+
+        return Response(
+            content=export_bytes,
+            media_type=media_type,
+            headers={"Content-Disposition": f"{disposition}; filename={doc_number}.{extension}", **cache_headers}
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post(
+    "/api/export/bulk",
+    tags=["Export Formats"],
+    summary="Bulk Export (ZIP, merged PDF, or CSV/XLSX rows)",
+    description="""
+Render many previously generated documents at once, e.g. for month-end runs.
+
+Send a JSON array of documents (each the 'data' field from /api/generate) in `documents`,
+or upload it as a `.json` file. Documents are rendered across the renderer pool with a
+bounded number in flight, so memory stays flat however many documents are sent.
+
+**Outputs:**
+- `output=zip` - Each document in `format`, streamed into the ZIP as it finishes rendering
+- `output=pdf` - One PDF with every document in order and an outline entry per document
+- `output=csv` - One CSV of every document's line items (or one row per document with `rows=documents`), streamed a document at a time
+- `output=xlsx` - One workbook with Documents and Line Items sheets, written in constant memory
+
+The response carries an `X-Export-Id` header; poll `GET /api/export/bulk/{export_id}`
+for progress. Documents that fail to render are skipped and reported there
+(and in `errors.txt` inside the ZIP).
+    """,
+    response_description="Streamed ZIP archive, merged PDF, CSV or XLSX",
+    responses={
+        200: {
+            "content": {
+                "application/zip": {},
+                "application/pdf": {},
+                "text/csv": {},
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": {}
+            },
+            "description": "Bulk export stream"
+        }
+    }
+)
+async def export_bulk(
+    documents: Optional[str] = Form(None, description="JSON array of documents"),
+    file: Optional[UploadFile] = File(None, description="JSON file containing an array of documents"),
+    output: str = Form('zip', description="'zip' for one file per document, 'pdf' for a single merged PDF, 'csv' or 'xlsx' for spreadsheet rows"),
+    format: str = Form('pdf', description="Per-document format inside the ZIP: 'pdf', 'docx', or 'png'"),
+    document_type: Optional[str] = Form(None, description="Type of every document (inferred per document if omitted)"),
+    template: Optional[str] = Form(None),
+    tenant_id: Optional[str] = Form(None),
+    rows: str = Form('items', description="For output=csv: 'items' for one row per line item, 'documents' for one per document")
+):
+    output, format, export_template, csv_options = _bulk_options(output, format, template, tenant_id, rows)
+    payload = documents if documents else (await file.read()).decode('utf-8') if file else None
+    if not payload:
+        raise HTTPException(status_code=400, detail="Provide documents as a JSON array or upload a JSON file")
+    batch = _parse_document_list(payload, document_type)
+
+    export_id = uuid.uuid4().hex
+    progress = {"export_id": export_id, **_bulk_progress(output, format, len(batch))}
+    bulk_exports[export_id] = progress
+    while len(bulk_exports) > BULK_EXPORT_HISTORY:
+        bulk_exports.popitem(last=False)
+
+    headers = {
+        "X-Export-Id": export_id,
+        "Content-Disposition": f"attachment; filename=bulk-{export_id[:8]}.{output}"
+    }
+    return StreamingResponse(
+        _stream_bulk(batch, output, format, export_template, csv_options['rows'], progress),
+        media_type=BULK_MEDIA_TYPES[output],
+        headers=headers
+    )
+
+@app.get(
+    "/api/export/bulk/{export_id}",
+    tags=["Export Formats"],
+    summary="Bulk Export Progress",
+    description="Progress of a bulk export: documents rendered, failed and overall status."
+)
+async def export_bulk_progress(export_id: str):
+    progress = bulk_exports.get(export_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown bulk export '{export_id}'")
+    return progress
+
+@app.post(
+    "/api/jobs/generate",
+    tags=["Jobs"],
+    summary="Submit a Generation Job",
+    description="""
+Run `/api/generate` in the background, for large files and batches that outlast the HTTP timeout.
+
+Takes the same fields as `/api/generate` and returns `202` with a `job_id` straight away.
+Poll `GET /api/jobs/{job_id}` until `status` is `completed` or `failed`, or pass a
+`callback_url` on a local host (`JOBS_WEBHOOK_HOSTS`) to receive that status as a POST.
+The response `/api/generate` would have given is then at `GET /api/jobs/{job_id}/artifact`.
+
+Jobs run on their own worker pool (`JOBS_WORKERS`), so they never hold up interactive requests.
+    """,
+    status_code=202,
+    response_model=JobStatusResponse,
+    response_class=OrjsonResponse
+)
+async def submit_generate_job(
+    prompt: str = Form(None, description="Text prompt or instructions for extraction"),
+    file: Optional[UploadFile] = File(None, description="Optional file upload (PDF, DOCX, TXT, or image)"),
+    document_type: Optional[str] = Form(None, description="Force type: 'invoice', 'quote', or 'inventory' (auto-detected if omitted)"),
+    history: Optional[str] = Form(None, description="JSON string of conversation history"),
+    files: Optional[List[UploadFile]] = File(None, description="Multiple files or ZIP archives processed in one job"),
+    batch_mode: str = Form('merge', description="For multiple files: 'merge' into one document or 'separate' for one document per file"),
+    tenant_id: Optional[str] = Form(None, description="Tenant whose document number sequence and format are used"),
+    fields: Optional[str] = Form(None, description="Comma-separated data fields to return, e.g. 'invoice_number,total' (all if omitted)"),
+    include_text: bool = Form(True, description="Include the formatted text_output (false skips formatting it)"),
+    callback_url: Optional[str] = Form(None, description="Local URL to POST the final job status to")
+):
+    uploads = ([file] if file else []) + (files or [])
+    if not prompt and not uploads:
+        raise HTTPException(status_code=400, detail="Either 'prompt' or 'file' must be provided")
+    _parse_fields(fields)
+
+    async def save_inputs(job_dir: Path) -> Dict[str, Any]:
+        stored = []
+        for index, upload in enumerate(uploads):
+            filename = upload.filename or "document"
+            name = f"{index}-{Path(filename).name}"
+            await run_in_threadpool(_save_upload, upload, job_dir / name)
+            stored.append([name, filename, upload.content_type])
+        return {
+            "prompt": prompt, "files": stored, "document_type": document_type, "history": history,
+            "batch_mode": batch_mode, "tenant_id": tenant_id, "fields": fields, "include_text": include_text
+        }
+
+    return await _submit_job('generate', save_inputs, callback_url)
+
+@app.post(
+    "/api/jobs/export/bulk",
+    tags=["Jobs"],
+    summary="Submit a Bulk Export Job",
+    description="""
+Run `/api/export/bulk` in the background and keep the result for download.
+
+Takes the same fields as `/api/export/bulk` and returns `202` with a `job_id`. `progress` in
+`GET /api/jobs/{job_id}` counts documents rendered and failed; when the job is `completed`,
+`GET /api/jobs/{job_id}/artifact` downloads the ZIP, PDF, CSV or XLSX until the job expires
+(`JOBS_TTL_SECONDS` after it finished).
+
+Export jobs keep at most `JOBS_RENDER_WINDOW` renders in flight each, leaving renderer
+capacity for interactive exports.
+    """,
+    status_code=202,
+    response_model=JobStatusResponse,
+    response_class=OrjsonResponse
+)
+async def submit_bulk_export_job(
+    documents: Optional[str] = Form(None, description="JSON array of documents"),
+    file: Optional[UploadFile] = File(None, description="JSON file containing an array of documents"),
+    output: str = Form('zip', description="'zip' for one file per document, 'pdf' for a single merged PDF, 'csv' or 'xlsx' for spreadsheet rows"),
+    format: str = Form('pdf', description="Per-document format inside the ZIP: 'pdf', 'docx', or 'png'"),
+    document_type: Optional[str] = Form(None, description="Type of every document (inferred per document if omitted)"),
+    template: Optional[str] = Form(None),
+    tenant_id: Optional[str] = Form(None),
+    rows: str = Form('items', description="For output=csv: 'items' for one row per line item, 'documents' for one per document"),
+    callback_url: Optional[str] = Form(None, description="Local URL to POST the final job status to")
+):
+    _bulk_options(output, format, template, tenant_id, rows)
+    if not documents and not file:
+        raise HTTPException(status_code=400, detail="Provide documents as a JSON array or upload a JSON file")
+    if documents:
+        _parse_document_list(documents, document_type)
+
+    async def save_inputs(job_dir: Path) -> Dict[str, Any]:
+        if documents:
+            (job_dir / "documents.json").write_text(documents, encoding='utf-8')
+        else:
+            await run_in_threadpool(_save_upload, file, job_dir / "documents.json")
+        return {
+            "output": output, "format": format, "document_type": document_type,
+            "template": template, "tenant_id": tenant_id, "rows": rows
+        }
+
+    return await _submit_job('export_bulk', save_inputs, callback_url)
+
+@app.get(
+    "/api/jobs/{job_id}",
+    tags=["Jobs"],
+    summary="Job Status",
+    description="""
+Status of a background job: `queued`, `running`, `completed` or `failed`, with its progress,
+error, artifact name and, when a `callback_url` was given, whether the webhook was delivered.
+Jobs are forgotten `JOBS_TTL_SECONDS` after they finish (`expires_at`).
+    """,
+    response_model=JobStatusResponse,
+    response_class=OrjsonResponse
+)
+async def job_status(job_id: str):
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return OrjsonResponse(status)
+
+@app.get(
+    "/api/jobs/{job_id}/artifact",
+    tags=["Jobs"],
+    summary="Download Job Artifact",
+    description="The result of a completed job: the generation response JSON, or the bulk export file.",
+    responses={200: {"description": "Job artifact"}, 409: {"description": "Job not completed"}}
+)
+async def job_artifact(job_id: str):
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    artifact = job_queue.artifact(job_id)
+    if artifact is None:
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}; no artifact")
+    path, media_type = artifact
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+@app.post(
+    "/api/inventory",
+    tags=["Inventory"],
+    summary="Save Inventory Items",
+    description="""
+Insert or update inventory items in the inventory store, without calling the AI model.
+
+Send one item or an array of items as the JSON body: raw items (as in the inventory prompt) or
+the `data` of an inventory response from `/api/generate`. Profit margin and stock value are
+recomputed, and items without an `inventory_id` get one.
+
+An item updates an existing item with the same `inventory_id`, or else with the same `sku`;
+the existing `inventory_id` and `created_at` are kept. All items are written in one transaction.
+
+Inventory items extracted by `/api/generate` are saved automatically (`PERSIST_INVENTORY`).
+    """,
+    response_model=InventoryUpsertResponse,
+    response_class=OrjsonResponse
+)
+async def upsert_inventory(
+    items: Union[Dict[str, Any], List[Dict[str, Any]]] = Body(..., description="Inventory item JSON or an array of items"),
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the items")
+):
+    items = items if isinstance(items, list) else [items]
+    if len(items) > INVENTORY_UPSERT_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {INVENTORY_UPSERT_MAX_ITEMS})")
+
+    enriched = []
+    for index, item in enumerate(items):
+        if not item.get('name'):
+            raise HTTPException(status_code=400, detail=f"Item {index} has no name")
+        try:
+            enriched.append(_enrich_data(_edited_document(item), 'inventory', False, tenant_id))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Item {index} is invalid: {e!r}")
+
+    try:
+        stored = await run_in_threadpool(inventory_store.upsert, enriched, tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return OrjsonResponse({"success": True, "stored": stored})
+
+@app.post(
+    "/api/inventory/import",
+    tags=["Inventory"],
+    summary="Import Inventory Spreadsheet",
+    description="""
+Import inventory items from a CSV or XLSX file (first sheet), one item per row.
+
+Columns are mapped to inventory fields from their headers ("Product", "SKU", "Selling Price",
+"Qty", ...). Only when the headers are ambiguous (no name column, two price columns, no header
+row) is the AI model asked once, with the first few rows, to map them.
+
+Rows are streamed: each chunk is enriched (profit margin, stock value) and written in one
+transaction, as in `POST /api/inventory`. A row that can't be read or written is listed in
+`errors` with its row number, and the import carries on.
+
+Prices may show their currency ("₦450,000", "USD 12"); otherwise the currency column, a currency
+in the price header ("Price (NGN)") or the `currency` parameter is used.
+    """,
+    response_model=InventoryImportResponse,
+    response_class=OrjsonResponse
+)
+async def import_inventory(
+    file: UploadFile = File(..., description="CSV, TSV or XLSX file of inventory items"),
+    tenant_id: Optional[str] = Form(None, description="Tenant owning the items"),
+    currency: Optional[str] = Form(None, description="Currency of rows that show none, e.g. NGN")
+):
+    filename = file.filename or "inventory.csv"
+    extension = filename.lower().rsplit('.', 1)[-1]
+    if extension not in CSV_EXTENSIONS + XLSX_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {extension}. Supported: CSV, TSV, XLSX")
+
+    try:
+        report = await run_in_threadpool(_import_inventory, file.file, filename, tenant_id, currency)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return OrjsonResponse({"success": True, **report})
+
+@app.get(
+    "/api/inventory",
+    tags=["Inventory"],
+    summary="Search Inventory",
+    description="""
+Find inventory items by name, SKU or category.
+
+`q` matches any part of the name when it has 3 or more characters (best matches first), and
+the start of the name when shorter. Filters combine.
+    """,
+    response_model=InventoryListResponse,
+    response_class=OrjsonResponse
+)
+async def search_inventory(
+    q: Optional[str] = Query(None, description="Name search, e.g. 'laptop'"),
+    sku: Optional[str] = Query(None, description="Exact SKU"),
+    category: Optional[str] = Query(None, description="Exact category (case-insensitive)"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of items"),
+    offset: int = Query(0, ge=0, description="Items to skip, for paging"),
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the items")
+):
+    items = await run_in_threadpool(inventory_store.find, q, sku, category, tenant_id, limit, offset)
+    return OrjsonResponse({"success": True, "items": items})
+
+@app.get(
+    "/api/inventory/low-stock",
+    tags=["Inventory"],
+    summary="Low Stock Items",
+    description="Items whose `quantity_on_hand` is at or below their `low_stock_threshold`, furthest below first, each with its `shortfall`.",
+    response_model=InventoryListResponse,
+    response_class=OrjsonResponse
+)
+async def low_stock_inventory(
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of items"),
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the items")
+):
+    items = await run_in_threadpool(inventory_store.low_stock, tenant_id, limit)
+    return OrjsonResponse({"success": True, "items": items})
+
+@app.get(
+    "/api/inventory/analytics/stock-value",
+    tags=["Inventory"],
+    summary="Stock Value by Category",
+    description="Item count, quantity on hand and stock value at cost per category and currency, highest value first.",
+    response_model=StockValueResponse,
+    response_class=OrjsonResponse
+)
+async def inventory_stock_value(
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the items")
+):
+    categories = await run_in_threadpool(inventory_store.stock_value_by_category, tenant_id)
+    return OrjsonResponse({"success": True, "categories": categories})
+
+@app.get(
+    "/api/inventory/analytics/margins",
+    tags=["Inventory"],
+    summary="Profit Margin Distribution",
+    description="Count, average, range, percentiles (p10 to p90) and a histogram of profit margins (`INVENTORY_MARGIN_BUCKETS`).",
+    response_model=MarginDistributionResponse,
+    response_class=OrjsonResponse
+)
+async def inventory_margins(
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the items")
+):
+    distribution = await run_in_threadpool(inventory_store.margin_distribution, tenant_id)
+    return OrjsonResponse({"success": True, **distribution})
+
+@app.get(
+    "/api/inventory/{inventory_id}",
+    tags=["Inventory"],
+    summary="Get Inventory Item",
+    description="A stored inventory item by its `inventory_id`.",
+    response_model=InventoryData,
+    response_class=OrjsonResponse
+)
+async def get_inventory_item(
+    inventory_id: str,
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the item")
+):
+    item = await run_in_threadpool(inventory_store.get, inventory_id, tenant_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Unknown inventory item '{inventory_id}'")
+    return OrjsonResponse(item)
+
+@app.get(
+    "/api/customers",
+    tags=["Customers"],
+    summary="Search Customers",
+    description="""
+Customers recorded from past invoices and quotes, with the address, city and country used to
+complete new documents that name them.
+
+`q` matches any part of the name when it has 3 or more characters (best matches first), and
+the start of the name when shorter. Without `q`, the most recently seen customers are listed.
+    """,
+    response_model=CustomerListResponse,
+    response_class=OrjsonResponse
+)
+async def search_customers(
+    q: Optional[str] = Query(None, description="Name search, e.g. 'tech corp'"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of customers"),
+    tenant_id: Optional[str] = Query(None, description="Tenant owning the customers")
+):
+    customers = await run_in_threadpool(customer_directory.search, q, tenant_id, limit)
+    return OrjsonResponse({"success": True, "customers": customers})
+
 @app.post(
     "/api/export/pdf",
     tags=["Export Formats (Legacy)"],
@@ -489,7 +1041,7 @@ async def export_pdf(
     history: Optional[str] = Form(None)
 ):
     # Redirect to unified endpoint
-    return await export_document(format='pdf', prompt=prompt, file=file, document_type=document_type, history=history)
+    return await export_document(format='pdf', prompt=prompt, file=file, document_type=document_type, history=history, template=None, tenant_id=None, data=None, formats=None, options=None, if_none_match=None)
 
 @app.post(
     "/api/export/docx",
@@ -546,7 +1098,7 @@ async def export_docx(
     history: Optional[str] = Form(None)
 ):
     # Redirect to unified endpoint
-    return await export_document(format='docx', prompt=prompt, file=file, document_type=document_type, history=history)
+    return await export_document(format='docx', prompt=prompt, file=file, document_type=document_type, history=history, template=None, tenant_id=None, data=None, formats=None, options=None, if_none_match=None)
 
 @app.post(
     "/api/export/png",
@@ -565,7 +1117,7 @@ Generate document from text, files, or images and download as PNG image.
 - Combination of prompt + file
 
 **Image Specifications:**
-- Resolution: 800×1000 pixels
+- Resolution: 800 pixels wide, at least 1000 high (very long documents come back as a ZIP of pages)
 - Format: PNG (lossless)
 - Background: Clean white
 - Professional typography
@@ -606,7 +1158,743 @@ async def export_png(
     history: Optional[str] = Form(None)
 ):
     # Redirect to unified endpoint
-    return await export_document(format='png', prompt=prompt, file=file, document_type=document_type, history=history)
+    return await export_document(format='png', prompt=prompt, file=file, document_type=document_type, history=history, template=None, tenant_id=None, data=None, formats=None, options=None, if_none_match=None)
+
+def _parse_fields(fields: Optional[str]) -> Optional[frozenset]:
+    """Data fields named in a comma-separated `fields` parameter (None returns every field)"""
+    if fields is None:
+        return None
+    names = frozenset(name.strip() for name in fields.split(',') if name.strip())
+    if not names:
+        raise HTTPException(status_code=400, detail="fields must name at least one data field")
+    return names
+
+def _document_result(enriched: Dict[str, Any], doc_type: str, fields: Optional[frozenset] = None,
+                     include_text: bool = True) -> Dict[str, Any]:
+    """Response entry for an enriched document, projected to the requested fields"""
+    result = {
+        "success": True,
+        "document_type": doc_type,
+        "data": enriched if fields is None else {key: value for key, value in enriched.items() if key in fields}
+    }
+    # Formatting is the costliest part of a response, so it only runs when the text is wanted
+    if include_text:
+        result["text_output"] = _format_text(enriched, doc_type)
+    return result
+
+def _build_document_response(data: Dict[str, Any], doc_type: str, tenant_id: Optional[str] = None,
+                             fields: Optional[frozenset] = None, include_text: bool = True) -> Dict[str, Any]:
+    """Currency check, enrichment and formatting shared by single and batch generation"""
+    # Check if currency is missing (except for inventory which handles it differently)
+    if doc_type != 'inventory' and not data.get('currency'):
+        return {
+            "success": False,
+            "needs_currency": True,
+            "message": "Please specify the currency for this document (e.g., NGN, USD, EUR, GBP)",
+            "detected_document_type": doc_type,
+            "partial_data": data
+        }
+
+    # For inventory, check currency but don't fail if missing
+    if doc_type == 'inventory' and not data.get('currency'):
+        return {
+            "success": False,
+            "needs_currency": True,
+            "message": "Please specify the currency for pricing (e.g., NGN, USD, EUR, GBP)",
+            "detected_document_type": doc_type,
+            "partial_data": data
+        }
+
+    enriched = _enrich_data(data, doc_type, tenant_id=tenant_id)
+    if doc_type == 'inventory' and PERSIST_INVENTORY and enriched.get('name'):
+        enriched = _persist_inventory(enriched, tenant_id)
+    return _document_result(enriched, doc_type, fields, include_text)
+
+async def _document_response(data: Dict[str, Any], doc_type: str, tenant_id: Optional[str] = None,
+                             fields: Optional[frozenset] = None, include_text: bool = True) -> Dict[str, Any]:
+    """_build_document_response, in the thread pool when it writes the item to the inventory store"""
+    if doc_type == 'inventory' and PERSIST_INVENTORY:
+        return await run_in_threadpool(_build_document_response, data, doc_type, tenant_id, fields, include_text)
+    return _build_document_response(data, doc_type, tenant_id, fields, include_text)
+
+def _persist_inventory(item: Dict[str, Any], tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """Save an extracted inventory item; returns it as stored (an item with the same SKU keeps its ID)"""
+    inventory_store.upsert([item], tenant_id)
+    if item.get('sku'):
+        stored = inventory_store.find(sku=item['sku'], tenant_id=tenant_id, limit=1)
+        if stored:
+            return stored[0]
+    return item
+
+def _import_inventory(file, filename: str, tenant_id: Optional[str] = None, currency: Optional[str] = None) -> Dict[str, Any]:
+    """Map a spreadsheet's columns (asking the model only if the headers are ambiguous) and import its rows"""
+    rows = read_rows(file, filename)
+    head = list(islice(rows, INVENTORY_IMPORT_SAMPLE_ROWS + 1))
+    if not head:
+        raise ValueError("The file has no rows")
+    header = head[0][1]
+
+    mapping, header_issues = detect_columns(header, [cells for _, cells in head[1:]])
+    if header_issues:
+        try:
+            mapping = _ai_map_columns([cells for _, cells in head])
+        except Exception:
+            # Without the model, clear-enough headers are still usable
+            if 'name' not in mapping.columns.values():
+                raise ValueError(f"Could not map the columns: {'; '.join(header_issues)}")
+
+    report = inventory_importer.import_rows(chain(head[1:] if mapping.has_header else head, rows), mapping, tenant_id, currency)
+    columns, ignored = mapping.describe(header)
+    return {
+        **report, "columns": columns, "ignored_columns": ignored, "mapped_by": mapping.mapped_by,
+        "has_header": mapping.has_header, "header_issues": header_issues
+    }
+
+def _ai_map_columns(rows: List[List[Any]]):
+    """Ask the model which inventory field each column holds, from the first rows of a spreadsheet"""
+    template = (ai_service.prompts_dir / "inventory_import_prompt.txt").read_text()
+    prompt = template.replace("{fields}", ", ".join(IMPORT_FIELDS)).replace("{rows}", sample_text(rows))
+    result = ai_service.complete_json(prompt, max_tokens=500)
+    return mapping_from_model(result, max(len(row) for row in rows))
+
+def _prompt_references(prompt: str, tenant_id: Optional[str] = None) -> str:
+    references = []
+    if CATALOG_ENABLED:
+        references.append(catalog_resolver.prompt_reference(prompt, tenant_id))
+    if CUSTOMER_DIRECTORY_ENABLED:
+        references.append(customer_directory.prompt_reference(prompt, tenant_id))
+    return "\n\n".join(reference for reference in references if reference)
+
+async def _with_references(prompt: str, doc_type: str, tenant_id: Optional[str] = None) -> str:
+    """Invoice/quote request with the few catalog rows and known customers it may refer to appended (never whole tables)"""
+    if doc_type not in ('invoice', 'quote'):
+        return prompt
+    reference = await run_in_threadpool(_prompt_references, prompt, tenant_id)
+    return f"{prompt}\n\n{reference}" if reference else prompt
+
+def _complete_references(data: Dict[str, Any], tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    if CATALOG_ENABLED:
+        data = catalog_resolver.resolve(data, tenant_id)
+    if CUSTOMER_DIRECTORY_ENABLED:
+        data = customer_directory.complete(data, tenant_id)
+        customer_directory.record([data], tenant_id)
+    return data
+
+async def _resolve_references(data: Dict[str, Any], doc_type: str, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """Fill extracted invoice/quote items from the inventory catalog and missing customer details from the customer directory"""
+    if doc_type not in ('invoice', 'quote'):
+        return data
+    return await run_in_threadpool(_complete_references, data, tenant_id)
+
+async def _generate(
+    prompt: Optional[str],
+    uploads: List[UploadFile],
+    document_type: Optional[str],
+    history: Optional[str],
+    batch_mode: str,
+    tenant_id: Optional[str],
+    projection: Optional[frozenset],
+    include_text: bool
+) -> Dict[str, Any]:
+    """The /api/generate pipeline, shared with generation jobs: a prompt and uploads to a response dict"""
+    # Parse history if provided
+    parsed_history = []
+    if history:
+        import json
+        try:
+            parsed_history = json.loads(history)
+        except:
+            pass
+
+    # Several files or a ZIP archive go through the batch path
+    if len(uploads) > 1 or any(_is_zip(upload) for upload in uploads):
+        return await _generate_from_batch(prompt, uploads, document_type, batch_mode, tenant_id, projection, include_text)
+    file = uploads[0] if uploads else None
+
+    # If no file provided, treat as text-only request
+    if not file:
+        # Prompt is required for text-only
+        if not prompt:
+            raise HTTPException(status_code=400, detail="Either 'prompt' or 'file' must be provided")
+
+        # Use AI to detect document type if not specified
+        detection_result = document_type or _ai_detect_type(prompt)
+
+        # Handle conversational requests
+        if isinstance(detection_result, dict) and detection_result.get('document_type') == 'conversation':
+            return {
+                "success": True,
+                "document_type": "conversation",
+                "message": detection_result.get('message', 'Hello! I help generate invoices and quotes. Just describe what you need!'),
+                "text_output": detection_result.get('message', 'Hello! I help generate invoices and quotes. Just describe what you need!')
+            }
+
+        # Extract document type from detection result
+        doc_type = detection_result if isinstance(detection_result, str) else detection_result.get('document_type', 'quote')
+        data = await ai_service.extract_document_data(await _with_references(prompt, doc_type, tenant_id), parsed_history, doc_type)
+
+    else:
+        # File upload path
+        file_bytes = await file.read()
+        filename = file.filename or "document"
+        file_ext = filename.lower().split('.')[-1]
+
+        # Use prompt or default extraction instruction
+        extraction_prompt = prompt or "Extract all document data from this file"
+
+        # Detect document type
+        doc_type = document_type or _ai_detect_type(extraction_prompt)
+        if isinstance(doc_type, dict):
+            doc_type = doc_type.get('document_type', 'quote')
+
+        # Determine file type and process accordingly
+        if file_ext in IMAGE_EXTENSIONS:
+            # Use vision AI for images
+            image_bytes, media_type = await run_in_threadpool(image_service.preprocess, file_bytes)
+            data = await ai_service.extract_from_image(extraction_prompt, image_bytes, doc_type, media_type)
+        elif file_ext in DOCUMENT_EXTENSIONS:
+            # Extract text and process
+            data = await ai_service.extract_from_file(extraction_prompt, file_bytes, filename, doc_type)
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type: {file_ext}. Supported: PDF, DOCX, TXT, JPEG, PNG"
+            )
+
+    data = await _resolve_references(data, doc_type, tenant_id)
+    return await _document_response(data, doc_type, tenant_id, projection, include_text)
+
+def _is_zip(upload: UploadFile) -> bool:
+    """Whether an upload is a ZIP archive of documents/images"""
+    filename = (upload.filename or '').lower()
+    return filename.endswith('.zip') or upload.content_type in ('application/zip', 'application/x-zip-compressed')
+
+async def _iter_batch_files(uploads: List[UploadFile]):
+    """Yield (filename, bytes) for every upload, streaming ZIP archives entry by entry (read and inflated in the thread pool)"""
+    count = 0
+    for upload in uploads:
+        if _is_zip(upload):
+            try:
+                archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"Invalid ZIP archive: {upload.filename}")
+            with archive:
+                for info in archive.infolist():
+                    filename = Path(info.filename).name
+                    file_ext = filename.lower().split('.')[-1]
+                    if info.is_dir() or info.filename.startswith('__MACOSX/') or file_ext not in IMAGE_EXTENSIONS + DOCUMENT_EXTENSIONS:
+                        continue
+                    if info.file_size > MAX_ZIP_ENTRY_BYTES:
+                        raise HTTPException(status_code=400, detail=f"ZIP entry too large: {info.filename}")
+                    count += 1
+                    if count > MAX_BATCH_FILES:
+                        raise HTTPException(status_code=400, detail=f"Too many files. Maximum per request: {MAX_BATCH_FILES}")
+                    yield filename, await run_in_threadpool(archive.read, info)
+        else:
+            filename = upload.filename or f"document{count + 1}"
+            file_ext = filename.lower().split('.')[-1]
+            if file_ext not in IMAGE_EXTENSIONS + DOCUMENT_EXTENSIONS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type: {file_ext}. Supported: PDF, DOCX, TXT, JPEG, PNG, ZIP"
+                )
+            count += 1
+            if count > MAX_BATCH_FILES:
+                raise HTTPException(status_code=400, detail=f"Too many files. Maximum per request: {MAX_BATCH_FILES}")
+            yield filename, await upload.read()
+
+def _prepare_batch_file(filename: str, file_bytes: bytes) -> Dict[str, Any]:
+    """Preprocess/OCR an image or extract text from a document (runs in the thread pool)"""
+    file_ext = filename.lower().split('.')[-1]
+    if file_ext in IMAGE_EXTENSIONS:
+        image_bytes, media_type = image_service.preprocess(file_bytes)
+        # Confident OCR text goes to the cheaper text model instead of vision
+        if ai_service.ocr_service.available:
+            text, confidence = ai_service.ocr_service.ocr_image_bytes(image_bytes)
+            if ai_service.ocr_service.is_confident(text, confidence):
+                return {'filename': filename, 'kind': 'text', 'text': text}
+        return {'filename': filename, 'kind': 'image', 'images': [(image_bytes, media_type)]}
+
+    text = ai_service._extract_text_from_file(file_bytes, filename)
+    if not text.strip() and file_ext == 'pdf':
+        # Scanned PDF the OCR stage could not read
+        return {'filename': filename, 'kind': 'image', 'images': ai_service._rasterize_pdf(file_bytes)}
+    return {'filename': filename, 'kind': 'text', 'text': text}
+
+async def _extract_from_parts(prompt: str, parts: List[Dict[str, Any]], doc_type: str) -> Dict[str, Any]:
+    """Send prepared files to the model: images in one multi-image vision call, text in one text call"""
+    texts = [f"--- {part['filename']} ---\n{part['text']}" for part in parts if part['kind'] == 'text']
+    images = [image for part in parts if part['kind'] == 'image' for image in part['images']]
+    if images:
+        if texts:
+            prompt = f"{prompt}\n\nAdditional document content:\n" + "\n\n".join(texts)
+        return await ai_service.extract_with_images(prompt, images, doc_type)
+    return await ai_service.extract_from_text(prompt, "\n\n".join(texts), doc_type)
+
+def _extract_part(prompt: str, part: Dict[str, Any], doc_type: str) -> Dict[str, Any]:
+    """Extract one prepared file on a private event loop (runs in the thread pool)"""
+    return asyncio.run(_extract_from_parts(prompt, [part], doc_type))
+
+async def _generate_from_batch(
+    prompt: Optional[str],
+    uploads: List[UploadFile],
+    document_type: Optional[str],
+    batch_mode: str,
+    tenant_id: Optional[str] = None,
+    fields: Optional[frozenset] = None,
+    include_text: bool = True
+) -> Dict[str, Any]:
+    """Generate one merged document, or one document per file, from several uploads"""
+    if batch_mode not in ('merge', 'separate'):
+        raise HTTPException(status_code=400, detail="batch_mode must be 'merge' or 'separate'")
+
+    extraction_prompt = prompt or "Extract all document data from these files"
+    doc_type = document_type or _ai_detect_type(extraction_prompt)
+    if isinstance(doc_type, dict):
+        doc_type = doc_type.get('document_type', 'quote')
+
+    # Start preparing each file as soon as it is read so text extraction runs in parallel
+    tasks = []
+    try:
+        async for filename, file_bytes in _iter_batch_files(uploads):
+            tasks.append(asyncio.ensure_future(run_in_threadpool(_prepare_batch_file, filename, file_bytes)))
+        if not tasks:
+            raise HTTPException(status_code=400, detail="No supported files found in upload")
+        parts = await asyncio.gather(*tasks)
+    except BaseException:
+        # A bad upload (or a failed file) abandons the batch: don't leave the other files' tasks unawaited
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    if batch_mode == 'merge':
+        data = await _extract_from_parts(extraction_prompt, parts, doc_type)
+        data = await _resolve_references(data, doc_type, tenant_id)
+        return await _document_response(data, doc_type, tenant_id, fields, include_text)
+
+    # The provider SDK calls block, so each file is extracted in its own pool thread
+    results = await asyncio.gather(
+        *(run_in_threadpool(_extract_part, extraction_prompt, part, doc_type) for part in parts),
+        return_exceptions=True
+    )
+    documents = []
+    for part, result in zip(parts, results):
+        if isinstance(result, Exception):
+            documents.append({"filename": part['filename'], "success": False, "error": str(result)})
+        else:
+            result = await _resolve_references(result, doc_type, tenant_id)
+            documents.append({"filename": part['filename'], **await _document_response(result, doc_type, tenant_id, fields, include_text)})
+
+    return {
+        "success": any(document['success'] for document in documents),
+        "batch_mode": "separate",
+        "document_type": doc_type,
+        "documents": documents
+    }
+
+def _parse_render_options(options: Optional[str], formats: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Parse the options JSON and normalize it per format (options a format doesn't use are rejected)"""
+    import json
+    try:
+        parsed = json.loads(options) if options else {}
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid options JSON: {e}")
+    if not isinstance(parsed, dict):
+        raise ValueError("Options JSON must be an object")
+
+    normalized = {}
+    used = set()
+    for format in formats:
+        accepted = {
+            'pdf': ('compress', 'font'),
+            'png': ('compress_level', 'optimize'),
+            'preview': ('width', 'image_format', 'quality'),
+            'csv': ('rows',),
+        }.get(format, ())
+        relevant = {key: value for key, value in parsed.items() if key in accepted}
+        used.update(relevant)
+        normalized[format] = export_service.normalize_options(format, relevant)
+    unknown = set(parsed) - used
+    if unknown:
+        raise ValueError(f"Unsupported options for {', '.join(formats)}: {', '.join(sorted(unknown))}")
+    return normalized
+
+def _export_file_type(format: str, content: bytes) -> tuple[str, str]:
+    """File extension and media type of a render; very long PNG exports come back as a ZIP of pages"""
+    if format == 'png' and content[:4] == b'PK\x03\x04':
+        return 'zip', 'application/zip'
+    if format == 'preview':
+        return ('webp', 'image/webp') if content[:4] == b'RIFF' else ('jpg', 'image/jpeg')
+    return format, EXPORT_MEDIA_TYPES[format]
+
+async def _render_cached(
+    enriched: Dict[str, Any],
+    doc_type: str,
+    format: str,
+    export_template: ExportTemplate,
+    options: Optional[Dict[str, Any]] = None,
+    cache_key: Optional[str] = None
+) -> bytes:
+    """Serve a render from the cache, or render it in the renderer pool and cache it"""
+    cache_key = cache_key or RenderCache.make_key(enriched, doc_type, format, export_template.name, export_template.version, options)
+    export_bytes = await _cache_io(render_cache.get, cache_key)
+    if export_bytes is None:
+        # Render in the renderer pool so the event loop stays free
+        export_bytes = await render_pool.render(enriched, doc_type, format, export_template.name, options)
+        await _cache_io(render_cache.put, cache_key, export_bytes)
+    return export_bytes
+
+async def _cache_io(function, *args):
+    """Call a render cache method, in the thread pool when its disk tier may read or write files"""
+    if render_cache.disk_dir:
+        return await run_in_threadpool(function, *args)
+    return function(*args)
+
+def _stream_html_cached(enriched: Dict[str, Any], doc_type: str, export_template: ExportTemplate, cache_key: str):
+    """Stream HTML chunks as the template renders them, caching the full page once complete"""
+    chunks = []
+    for chunk in export_service.stream_html(enriched, doc_type, export_template):
+        chunks.append(chunk)
+        yield chunk
+    render_cache.put(cache_key, b''.join(chunks))
+
+async def _stream_export_bundle(
+    enriched: Dict[str, Any],
+    doc_type: str,
+    formats: List[str],
+    export_template: ExportTemplate,
+    doc_number: str,
+    render_options: Dict[str, Dict[str, Any]],
+    cached: bool = True
+):
+    """
+    Render all formats concurrently and stream each into the ZIP as soon as it finishes.
+
+    Only re-exports of given data (cached) go through the render cache; a prompt
+    export is a newly numbered document whose renders would never be hit again.
+    """
+    async def render(format: str):
+        if cached:
+            return format, await _render_cached(enriched, doc_type, format, export_template, render_options[format])
+        return format, await render_pool.render(enriched, doc_type, format, export_template.name, render_options[format])
+
+    tasks = [asyncio.ensure_future(render(format)) for format in formats]
+    try:
+        zip_stream = ZipStream()
+        for next_render in asyncio.as_completed(tasks):
+            format, export_bytes = await next_render
+            yield zip_stream.add(f"{doc_number}.{_export_file_type(format, export_bytes)[0]}", export_bytes)
+        yield zip_stream.close()
+    finally:
+        # Client went away or a render failed: don't leave the other renders running unawaited
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def _parse_document_list(payload: str, document_type: Optional[str]) -> List[tuple[Dict[str, Any], str]]:
+    """Parse a JSON array of documents for bulk export, checking every entry up front"""
+    import json
+    try:
+        documents = json.loads(payload)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid documents JSON: {e}")
+    if not isinstance(documents, list) or not documents:
+        raise HTTPException(status_code=400, detail="Documents JSON must be a non-empty array")
+    if len(documents) > BULK_EXPORT_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"Too many documents (max {BULK_EXPORT_MAX_DOCUMENTS})")
+
+    batch = []
+    for index, document in enumerate(documents):
+        if not isinstance(document, dict):
+            raise HTTPException(status_code=400, detail=f"Document {index} must be an object")
+        doc_type = document_type or _infer_document_type(document)
+        if not doc_type:
+            raise HTTPException(status_code=400, detail=f"Could not determine type of document {index}; pass document_type")
+        batch.append((document, doc_type))
+    return batch
+
+def _bulk_filename(document: Dict[str, Any], doc_type: str, index: int, extension: str, used: set) -> str:
+    """Document number as filename, disambiguated when a batch repeats a number"""
+    doc_number = str(document.get('invoice_number' if doc_type == 'invoice' else 'quote_number') or f'document-{index + 1}')
+    filename = f"{doc_number}.{extension}"
+    if filename in used:
+        filename = f"{doc_number}-{index + 1}.{extension}"
+    used.add(filename)
+    return filename
+
+def _bulk_options(output: str, format: str, template: Optional[str], tenant_id: Optional[str], rows: str):
+    """Validated (output, per-document format, template, CSV options) of a bulk export"""
+    output = output.lower()
+    format = output if output != 'zip' else format.lower()
+    if output not in BULK_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid output '{output}'. Supported outputs: zip, pdf, csv, xlsx")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format '{format}'. Supported formats: {', '.join(EXPORT_MEDIA_TYPES)}"
+        )
+    try:
+        return output, format, export_service.get_template(template, tenant_id), export_service.normalize_options('csv', {'rows': rows})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _bulk_progress(output: str, format: str, total: int) -> Dict[str, Any]:
+    return {
+        "status": "rendering",
+        "output": output,
+        "format": format,
+        "total": total,
+        "rendered": 0,
+        "failed": 0,
+        "errors": [],
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None
+    }
+
+def _stream_bulk(
+    batch: List[tuple[Dict[str, Any], str]],
+    output: str,
+    format: str,
+    export_template: ExportTemplate,
+    rows: str,
+    progress: Dict[str, Any],
+    window: int = 0
+):
+    """The byte stream of a bulk export in the given output"""
+    if output == 'csv':
+        return _stream_bulk_csv(batch, rows, progress)
+    if output == 'xlsx':
+        return _stream_bulk_xlsx(batch, progress)
+    if output == 'pdf':
+        return _stream_bulk_pdf(batch, export_template, progress, window=window)
+    return _stream_bulk_zip(batch, format, export_template, progress, window=window)
+
+async def _render_bulk(
+    batch: List[tuple[Dict[str, Any], str]],
+    format: str,
+    export_template: ExportTemplate,
+    progress: Dict[str, Any],
+    ordered: bool,
+    window: int = 0
+):
+    """
+    Render a batch across the renderer pool with a bounded window of renders in flight.
+
+    Yields (index, rendered bytes or None on failure) in completion order, or in
+    batch order when ordered is set. Only the window's results are held in memory.
+    Bulk renders bypass the render cache so a month-end run doesn't evict it.
+    """
+    window = window or BULK_EXPORT_WINDOW or render_pool.workers * 2
+    queue = iter(enumerate(batch))
+    pending = deque()
+
+    async def render(index: int, document: Dict[str, Any], doc_type: str):
+        try:
+            return index, await render_pool.render(document, doc_type, format, export_template.name)
+        except Exception as e:
+            progress["failed"] += 1
+            progress["errors"].append({"index": index, "error": str(e)})
+            return index, None
+
+    def fill():
+        for index, (document, doc_type) in queue:
+            pending.append(asyncio.ensure_future(render(index, document, doc_type)))
+            if len(pending) >= window:
+                break
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                task = pending.popleft()
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                task = done.pop()
+                pending.remove(task)
+            index, content = await task
+            if content is not None:
+                progress["rendered"] += 1
+            fill()
+            yield index, content
+    except BaseException:
+        # Client went away or rendering broke: stop the renders still in flight
+        for task in pending:
+            task.cancel()
+        progress["status"] = "failed"
+        progress["finished_at"] = datetime.now().isoformat()
+        raise
+
+def _finish_bulk(progress: Dict[str, Any]):
+    progress["status"] = "completed"
+    progress["finished_at"] = datetime.now().isoformat()
+
+async def _stream_bulk_zip(
+    batch: List[tuple[Dict[str, Any], str]],
+    format: str,
+    export_template: ExportTemplate,
+    progress: Dict[str, Any],
+    window: int = 0
+):
+    """Stream a ZIP of the batch, writing each document as soon as it renders"""
+    zip_stream = ZipStream()
+    used = set()
+    async for index, content in _render_bulk(batch, format, export_template, progress, ordered=False, window=window):
+        if content is not None:
+            document, doc_type = batch[index]
+            extension = _export_file_type(format, content)[0]
+            yield zip_stream.add(_bulk_filename(document, doc_type, index, extension, used), content)
+    if progress["errors"]:
+        report = "\n".join(f"document {error['index']}: {error['error']}" for error in sorted(progress["errors"], key=lambda e: e['index']))
+        yield zip_stream.add("errors.txt", report.encode('utf-8'))
+    yield zip_stream.close()
+    _finish_bulk(progress)
+
+async def _stream_bulk_pdf(
+    batch: List[tuple[Dict[str, Any], str]],
+    export_template: ExportTemplate,
+    progress: Dict[str, Any],
+    window: int = 0
+):
+    """Merge the batch into one PDF in document order, streaming each document's pages as it renders"""
+    bundle = PdfBundle()
+    used = set()
+    async for index, content in _render_bulk(batch, 'pdf', export_template, progress, ordered=True, window=window):
+        if content is not None:
+            document, doc_type = batch[index]
+            title = _bulk_filename(document, doc_type, index, 'pdf', used).removesuffix('.pdf')
+            yield await run_in_threadpool(bundle.add, title, content)
+    async for chunk in iterate_in_threadpool(bundle.close()):
+        yield chunk
+    _finish_bulk(progress)
+
+def _add_bulk_rows(add, document: Dict[str, Any], doc_type: str, index: int, progress: Dict[str, Any]):
+    """Add one document's spreadsheet rows, recording a failure instead of stopping the export"""
+    try:
+        result = add(document, doc_type)
+    except Exception as e:
+        progress["failed"] += 1
+        progress["errors"].append({"index": index, "error": str(e)})
+        return None
+    progress["rendered"] += 1
+    return result
+
+async def _stream_bulk_csv(batch: List[tuple[Dict[str, Any], str]], rows: str, progress: Dict[str, Any]):
+    """Stream CSV rows for the batch a document at a time; nothing goes through the renderer pool"""
+    csv_rows = CsvRows(export_service, rows)
+    yield csv_rows.header()
+    for index, (document, doc_type) in enumerate(batch):
+        content = await run_in_threadpool(_add_bulk_rows, csv_rows.add, document, doc_type, index, progress)
+        if content:
+            yield content
+    _finish_bulk(progress)
+
+async def _stream_bulk_xlsx(
+    batch: List[tuple[Dict[str, Any], str]],
+    progress: Dict[str, Any],
+    chunk_size: int = 64 * 1024
+):
+    """Write the batch into a write-only workbook, then stream it from a spooled file"""
+    def build(merged):
+        workbook = XlsxRows(export_service)
+        for index, (document, doc_type) in enumerate(batch):
+            _add_bulk_rows(workbook.add, document, doc_type, index, progress)
+        workbook.save(merged)
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as merged:
+        await run_in_threadpool(build, merged)
+        merged.seek(0)
+        _finish_bulk(progress)
+        while chunk := merged.read(chunk_size):
+            yield chunk
+
+def _save_upload(upload: UploadFile, path: Path):
+    upload.file.seek(0)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(upload.file, f)
+
+async def _submit_job(kind: str, save_inputs, callback_url: Optional[str] = None) -> OrjsonResponse:
+    """Allocate a job, save its inputs into the job directory and queue it; 202 with the job status"""
+    try:
+        if callback_url:
+            check_callback_url(callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job_id, job_dir = job_queue.allocate()
+    try:
+        params = await save_inputs(job_dir)
+        status = job_queue.submit(job_id, kind, params, callback_url)
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    return OrjsonResponse(status, status_code=202, headers={"Location": f"/api/jobs/{job_id}"})
+
+async def _run_generate_job(params: Dict[str, Any], job_dir: Path, progress: Dict[str, Any]) -> tuple[str, str]:
+    """Generation job: the /api/generate pipeline over the uploads saved in the job directory"""
+    handles = [open(job_dir / name, 'rb') for name, _, _ in params['files']]
+    progress["files"] = len(handles)
+    try:
+        uploads = [
+            UploadFile(handle, filename=filename, headers=Headers({"content-type": content_type} if content_type else {}))
+            for handle, (_, filename, content_type) in zip(handles, params['files'])
+        ]
+        result = await _generate(
+            params['prompt'], uploads, params['document_type'], params['history'], params['batch_mode'],
+            params['tenant_id'], _parse_fields(params['fields']), params['include_text']
+        )
+    finally:
+        for handle in handles:
+            handle.close()
+    (job_dir / "result.json").write_bytes(OrjsonResponse(result).body)
+    return "result.json", "application/json"
+
+async def _run_bulk_export_job(params: Dict[str, Any], job_dir: Path, progress: Dict[str, Any]) -> tuple[str, str]:
+    """Bulk export job: the export is written into the job directory instead of a response"""
+    output, format, export_template, csv_options = _bulk_options(
+        params['output'], params['format'], params['template'], params['tenant_id'], params['rows']
+    )
+    payload = await run_in_threadpool((job_dir / "documents.json").read_text, 'utf-8')
+    batch = _parse_document_list(payload, params['document_type'])
+    progress.update(_bulk_progress(output, format, len(batch)))
+
+    artifact = f"bulk-{job_dir.name[:8]}.{output}"
+    window = JOBS_RENDER_WINDOW or render_pool.workers
+    with open(job_dir / artifact, 'wb') as f:
+        async for chunk in _stream_bulk(batch, output, format, export_template, csv_options['rows'], progress, window):
+            f.write(chunk)
+    return artifact, BULK_MEDIA_TYPES[output]
+
+def _parse_document_json(data: str, document_type: Optional[str]) -> tuple[Dict[str, Any], str]:
+    """Parse document JSON sent back by a client and work out its type"""
+    import json
+    try:
+        document = json.loads(data)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid document JSON: {e}")
+    if not isinstance(document, dict):
+        raise HTTPException(status_code=400, detail="Document JSON must be an object")
+
+    doc_type = document_type or _infer_document_type(document)
+    if not doc_type:
+        raise HTTPException(status_code=400, detail="Could not determine document type; pass document_type")
+    return document, doc_type
+
+def _infer_document_type(document: Dict[str, Any]) -> Optional[str]:
+    """Enriched documents carry a type-specific number field"""
+    if 'invoice_number' in document:
+        return 'invoice'
+    if 'quote_number' in document:
+        return 'quote'
+    if 'inventory_id' in document:
+        return 'inventory'
+    return None
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header (weak comparison, lists and '*')"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag for candidate in candidates)
 
 def _detect_type(prompt: str) -> str:
     """Simple keyword-based detection (fallback)"""
@@ -641,84 +1929,71 @@ def _ai_detect_type(prompt: str):
         # Fallback to simple detection on error
         return _detect_type(prompt)
 
-def _enrich_data(data: Dict[str, Any], doc_type: str) -> Dict[str, Any]:
-    # Handle inventory separately
-    if doc_type == 'inventory':
-        # Generate unique inventory item ID
-        data['inventory_id'] = f"ITEM{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        data['created_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        # Convert tax rate to both formats
-        tax_rate = data.get('tax_rate', 0)
-        data['tax_rate_percentage'] = tax_rate
-        data['tax_rate'] = tax_rate / 100  # Convert to decimal
-
-        # Calculate profit margin if both prices provided
-        if data.get('cost_price', 0) > 0 and data.get('unit_price', 0) > 0:
-            profit = data['unit_price'] - data['cost_price']
-            data['profit_margin'] = (profit / data['cost_price']) * 100
-            data['profit_per_unit'] = profit
-        else:
-            data['profit_margin'] = 0
-            data['profit_per_unit'] = 0
-
-        # Calculate total stock value if quantity provided
-        if data.get('quantity_on_hand') and data.get('cost_price', 0) > 0:
-            data['total_stock_value'] = data['quantity_on_hand'] * data['cost_price']
-        else:
-            data['total_stock_value'] = 0
-
-        return data
-
-    # Handle invoices and quotes
-    if doc_type == 'invoice':
-        data['invoice_number'] = f"INV{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    else:
-        data['quote_number'] = f"QT{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    data['date'] = datetime.now().strftime('%Y-%m-%d')
-
-    for item in data.get('items', []):
-        if 'amount' not in item:
-            item['amount'] = item.get('quantity', 0) * item.get('unit_price', 0)
-
-    subtotal = sum(item.get('amount', 0) for item in data.get('items', []))
-    data['subtotal'] = subtotal
-
-    # Handle tax rate - AI returns as percentage (8 for 8%), convert to decimal
-    # Use user-provided rate if available, otherwise use configured default
-    tax_rate = data.get('tax_rate', 0)
-    if tax_rate == 0 and subtotal > 0:
-        tax_rate = DEFAULT_TAX_RATE
-    # Store as decimal for calculations, but keep percentage in separate field for display
-    data['tax_rate_percentage'] = tax_rate
-    data['tax_rate'] = tax_rate / 100  # Convert to decimal (8 -> 0.08)
-    data['tax_amount'] = subtotal * data['tax_rate']
+def _edited_document(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a document the client edited, ready to be enriched again"""
+    data = dict(data)
+    # Enriched documents hold rates as decimals next to their percentages; enrichment takes percentages
+    for rate in ('tax_rate', 'delivery_rate'):
+        if f'{rate}_percentage' in data:
+            data[rate] = data[f'{rate}_percentage']
+    # Quantities or prices may have been edited, so stored amounts can't be trusted
+    if 'items' in data:
+        data['items'] = [{key: value for key, value in item.items() if key != 'amount'} for item in data['items']]
+    return data
 
-    if doc_type == 'invoice':
-        # Handle delivery rate - AI returns as percentage (3 for 3%), convert to decimal
-        # Use user-provided rate if available, otherwise use configured default
-        delivery_rate = data.get('delivery_rate', 0)
-        if delivery_rate == 0 and subtotal > 0:
-            delivery_rate = DEFAULT_DELIVERY_RATE
-        data['delivery_rate_percentage'] = delivery_rate
-        data['delivery_rate'] = delivery_rate / 100  # Convert to decimal (3 -> 0.03)
-        data['delivery_amount'] = subtotal * data['delivery_rate']
-        data['total'] = subtotal + data['tax_amount'] + data['delivery_amount']
-    else:
-        data['total'] = subtotal + data['tax_amount']
+def _recalculate(data: Dict[str, Any], doc_type: str, assign_number: bool = False, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """Re-enrich a document the client edited, recomputing every amount"""
+    return _enrich_data(_edited_document(data), doc_type, assign_number, tenant_id)
+
+def _recalculate_batch(documents: List[Dict[str, Any]], doc_types: List[str], assign_number: bool = False,
+                       tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """_recalculate for many invoices and quotes, totalled in one columnar pass"""
+    numbered = [
+        _number_document(_edited_document(data), doc_type, assign_number, tenant_id)
+        for data, doc_type in zip(documents, doc_types)
+    ]
+    return enrichment_engine.enrich_batch(numbered, doc_types)
+
+def _number_document(data: Dict[str, Any], doc_type: str, assign_number: bool = True,
+                     tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """Assign an invoice/quote number and date when asked or missing (mutates data)"""
+    number_field = 'invoice_number' if doc_type == 'invoice' else 'quote_number'
+    if assign_number or not data.get(number_field):
+        now = datetime.now()
+        data[number_field] = number_allocator.allocate(doc_type, tenant_id, now)
+        data['date'] = now.strftime('%Y-%m-%d')
+    elif not data.get('date'):
+        data['date'] = datetime.now().strftime('%Y-%m-%d')
 
     # Keep currency as provided (including None/null if not specified)
     if 'currency' not in data or data['currency'] is None:
         data['currency'] = None
-
     return data
 
+def _enrich_data(data: Dict[str, Any], doc_type: str, assign_number: bool = True,
+                 tenant_id: Optional[str] = None) -> Dict[str, Any]:
+    """Number a document and compute its totals; returns a new dict and leaves data untouched"""
+    data = dict(data)
+
+    # Handle inventory separately
+    if doc_type == 'inventory':
+        # Generate unique inventory item ID
+        if assign_number or 'inventory_id' not in data:
+            now = datetime.now()
+            data['inventory_id'] = number_allocator.allocate('inventory', tenant_id, now)
+            data['created_at'] = now.strftime('%Y-%m-%d %H:%M:%S')
+
+        return enrichment_engine.enrich_inventory(data)
+
+    # Handle invoices and quotes: fixed-point totals, default rates where the model gave none
+    return enrichment_engine.enrich(_number_document(data, doc_type, assign_number, tenant_id), doc_type)
+
 async def _generate_document_data(
     prompt: str,
     file: Optional[UploadFile] = None,
     document_type: Optional[str] = None,
-    history: Optional[str] = None
+    history: Optional[str] = None,
+    tenant_id: Optional[str] = None
 ) -> tuple[Dict[str, Any], str]:
     """Shared logic for generating document data - used by all export endpoints"""
     # Parse history if provided
@@ -739,7 +2014,7 @@ async def _generate_document_data(
         if isinstance(doc_type, dict):
             doc_type = doc_type.get('document_type', 'quote')
 
-        data = await ai_service.extract_document_data(prompt, parsed_history, doc_type)
+        data = await ai_service.extract_document_data(await _with_references(prompt, doc_type, tenant_id), parsed_history, doc_type)
     else:
         # File upload path
         file_bytes = await file.read()
@@ -751,13 +2026,10 @@ async def _generate_document_data(
         if isinstance(doc_type, dict):
             doc_type = doc_type.get('document_type', 'quote')
 
-        image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
-        document_extensions = ['pdf', 'docx', 'doc', 'txt']
-
-        if file_ext in image_extensions:
-            image_b64 = base64.b64encode(file_bytes).decode('utf-8')
-            data = await ai_service.extract_with_image(extraction_prompt, image_b64, doc_type)
-        elif file_ext in document_extensions:
+        if file_ext in IMAGE_EXTENSIONS:
+            image_bytes, media_type = await run_in_threadpool(image_service.preprocess, file_bytes)
+            data = await ai_service.extract_from_image(extraction_prompt, image_bytes, doc_type, media_type)
+        elif file_ext in DOCUMENT_EXTENSIONS:
             data = await ai_service.extract_from_file(extraction_prompt, file_bytes, filename, doc_type)
         else:
             raise HTTPException(
@@ -765,6 +2037,8 @@ async def _generate_document_data(
                 detail=f"Unsupported file type: {file_ext}. Supported: PDF, DOCX, TXT, JPEG, PNG"
             )
 
+    data = await _resolve_references(data, doc_type, tenant_id)
+
     # Check for currency
     if not data.get('currency'):
         raise HTTPException(
@@ -772,7 +2046,7 @@ async def _generate_document_data(
             detail="Currency not specified. Please include currency in your prompt (e.g., NGN, USD, EUR)"
         )
 
-    enriched = _enrich_data(data, doc_type)
+    enriched = _enrich_data(data, doc_type, tenant_id=tenant_id)
     return enriched, doc_type
 
 def _format_text(data: Dict[str, Any], doc_type: str) -> str:
@@ -845,6 +2119,9 @@ Tax ({data.get('tax_rate_percentage', data['tax_rate']*100):.1f}%): {data['curre
 
 TOTAL: {data['currency']} {data['total']:,.2f}"""
 
+job_queue.register('generate', _run_generate_job)
+job_queue.register('export_bulk', _run_bulk_export_job)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,120 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Configuration: document numbers
+NUMBER_STORE_PATH = os.getenv('NUMBER_STORE_PATH', 'data/numbering.db')  # SQLite file shared by every worker
+NUMBER_BLOCK_SIZE = int(os.getenv('NUMBER_BLOCK_SIZE', '100'))  # Sequence values leased per store transaction
+NUMBER_FORMAT = os.getenv('NUMBER_FORMAT', '{prefix}{date:%Y%m%d}{seq:06d}')
+TENANT_NUMBER_FORMATS = json.loads(  # e.g. '{"acme": "ACME-{date:%Y}-{seq:05d}", "globex": {"invoice": "GX{seq:08d}"}}'
+    os.getenv('TENANT_NUMBER_FORMATS', '{}')
+)
+
+NUMBER_PREFIXES = {'invoice': 'INV', 'quote': 'QT', 'inventory': 'ITEM'}
+
+class NumberAllocator:
+    """
+    Unique document numbers across threads, worker processes and restarts.
+
+    Each (tenant, document type) has its own sequence in a shared SQLite file.
+    A process leases a block of NUMBER_BLOCK_SIZE values in one short
+    transaction and hands them out from memory, so the store is only touched
+    once per block rather than once per request. Values left in a block when a
+    process exits are never reused, so sequences can have gaps but never repeat.
+    """
+
+    def __init__(self, path: str = NUMBER_STORE_PATH, block_size: int = NUMBER_BLOCK_SIZE,
+                 number_format: str = NUMBER_FORMAT, tenant_formats: Optional[Dict[str, object]] = None):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.path = path
+        self.block_size = block_size
+        self.number_format = number_format
+        self.tenant_formats = TENANT_NUMBER_FORMATS if tenant_formats is None else tenant_formats
+        self._blocks: Dict[str, Tuple[int, int, int]] = {}  # scope -> (next value, end, owning pid)
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sequences (scope TEXT PRIMARY KEY, next_value INTEGER NOT NULL)"
+            )
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _lease(self, scope: str) -> int:
+        """Reserve the next block of a sequence in the store and return its first value"""
+        connection = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so concurrent leases queue instead of deadlocking
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT next_value FROM sequences WHERE scope = ?", (scope,)).fetchone()
+            start = row[0] if row else 1
+            connection.execute(
+                "INSERT INTO sequences (scope, next_value) VALUES (?, ?) "
+                "ON CONFLICT(scope) DO UPDATE SET next_value = excluded.next_value",
+                (scope, start + self.block_size)
+            )
+            connection.execute("COMMIT")
+            return start
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def next_value(self, scope: str) -> int:
+        """Next value of a sequence, leasing a new block when the current one runs out"""
+        with self._lock:
+            value, end, pid = self._blocks.get(scope, (0, 0, 0))
+            # A forked child inherits its parent's block; using it would hand out the same numbers twice
+            if value >= end or pid != os.getpid():
+                value = self._lease(scope)
+                end = value + self.block_size
+            self._blocks[scope] = (value + 1, end, os.getpid())
+            return value
+
+    def format_for(self, doc_type: str, tenant_id: Optional[str] = None) -> str:
+        """Number format of a tenant and document type, falling back to NUMBER_FORMAT"""
+        tenant_format = self.tenant_formats.get(tenant_id or '')
+        if isinstance(tenant_format, dict):
+            tenant_format = tenant_format.get(doc_type)
+        number_format = tenant_format or self.number_format
+        if '{seq' not in number_format:
+            raise ValueError(f"Number format must contain {{seq}} to be unique: {number_format}")
+        return number_format
+
+    def allocate(self, doc_type: str, tenant_id: Optional[str] = None, now: Optional[datetime] = None) -> str:
+        """
+        Allocate a formatted document number.
+
+        Formats are str.format templates with {prefix} (INV, QT or ITEM),
+        {date} (a datetime, e.g. {date:%Y%m%d}), {seq} (the sequence value,
+        e.g. {seq:06d}) and {tenant}.
+
+        Args:
+            doc_type: 'invoice', 'quote' or 'inventory'
+            tenant_id: Tenant with its own sequence (shared default sequence if omitted)
+            now: Date used in the number (current time if omitted)
+
+        Returns:
+            Document number, e.g. INV20241201000042
+        """
+        number_format = self.format_for(doc_type, tenant_id)
+        seq = self.next_value(f"{tenant_id or ''}:{doc_type}")
+        return number_format.format(
+            prefix=NUMBER_PREFIXES.get(doc_type, doc_type.upper()),
+            date=now or datetime.now(),
+            seq=seq,
+            tenant=tenant_id or ''
+        )
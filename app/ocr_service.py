@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import List, Tuple
+from PIL import Image
+
+try:
+    import pytesseract
+except ImportError:  # Optional: local OCR is skipped when pytesseract is not installed
+    pytesseract = None
+
+# Configuration: local OCR for scanned PDFs and images
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'true').lower() == 'true'
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(min(4, os.cpu_count() or 1))))
+OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+OCR_MIN_CONFIDENCE = float(os.getenv('OCR_MIN_CONFIDENCE', '70'))  # Mean word confidence (0-100) to trust OCR text
+OCR_MIN_CHARACTERS = int(os.getenv('OCR_MIN_CHARACTERS', '20'))
+OCR_PDF_RESOLUTION = int(os.getenv('OCR_PDF_RESOLUTION', '200'))  # DPI used to rasterize scanned PDF pages
+
+class OCRService:
+
+    def __init__(self):
+        self.available = OCR_ENABLED and pytesseract is not None and self._tesseract_installed()
+        self._executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='ocr') if self.available else None
+
+    def _tesseract_installed(self) -> bool:
+        """pytesseract is only a wrapper; the tesseract binary must be on PATH"""
+        try:
+            pytesseract.get_tesseract_version()
+            return True
+        except Exception:
+            print("OCR disabled: tesseract binary not found")
+            return False
+
+    def is_confident(self, text: str, confidence: float) -> bool:
+        """Whether OCR text is good enough to skip the vision model"""
+        return confidence >= OCR_MIN_CONFIDENCE and len(text.strip()) >= OCR_MIN_CHARACTERS
+
+    def ocr_image(self, image: Image.Image) -> Tuple[str, float]:
+        """
+        Run Tesseract on a single image.
+
+        Returns:
+            Tuple of (text with original line breaks, mean word confidence 0-100)
+        """
+        if image.mode != 'L':
+            image = image.convert('L')
+        result = pytesseract.image_to_data(image, lang=OCR_LANGUAGE, output_type=pytesseract.Output.DICT)
+
+        lines = {}
+        confidences = []
+        for i, word in enumerate(result['text']):
+            confidence = float(result['conf'][i])
+            if not word.strip() or confidence < 0:
+                continue
+            key = (result['block_num'][i], result['par_num'][i], result['line_num'][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(confidence)
+
+        text = "\n".join(" ".join(words) for words in lines.values())
+        mean_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, mean_confidence
+
+    def ocr_image_bytes(self, image_bytes: bytes) -> Tuple[str, float]:
+        """Run Tesseract on an encoded image"""
+        return self.ocr_image(Image.open(BytesIO(image_bytes)))
+
+    def submit_image_bytes(self, image_bytes: bytes) -> Future:
+        """Queue an encoded image on the OCR worker pool"""
+        return self._executor.submit(self.ocr_image_bytes, image_bytes)
+
+    def ocr_images(self, images: List[Image.Image]) -> List[Tuple[str, float]]:
+        """OCR several images (e.g. rasterized PDF pages) across the worker pool, preserving order"""
+        return list(self._executor.map(self.ocr_image, images))
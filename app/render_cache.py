@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+# Configuration: rendered export cache
+RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # In-memory tier
+RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR')  # Optional disk tier, disabled when unset
+RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv('RENDER_CACHE_DISK_MAX_BYTES', str(1024 * 1024 * 1024)))
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered exports.
+
+    Keys are a hash of the canonical document JSON, document type, format and
+    template version, so the same document is only rendered once per format.
+    The memory tier is an LRU bounded by total bytes; the optional disk tier
+    is bounded the same way and evicts least recently written files.
+    """
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES, disk_dir: Optional[str] = RENDER_CACHE_DIR,
+                 disk_max_bytes: int = RENDER_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._disk_entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._disk_size = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            # Index existing files oldest first so eviction order survives restarts
+            for path in sorted(self.disk_dir.glob('*/*'), key=lambda p: p.stat().st_mtime):
+                if path.suffix != '.tmp':
+                    size = path.stat().st_size
+                    self._disk_entries[path.name] = size
+                    self._disk_size += size
+
+    @staticmethod
+    def make_key(data: Dict[str, Any], doc_type: str, format: str, template: str, template_version: int,
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """Canonical hash of everything that affects the rendered bytes"""
+        canonical = json.dumps(
+            {'data': data, 'doc_type': doc_type, 'format': format, 'template': template,
+             'template_version': template_version, 'options': options or {}},
+            sort_keys=True, separators=(',', ':'), default=str
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries or key in self._disk_entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return content
+            on_disk = key in self._disk_entries
+
+        if on_disk:
+            try:
+                content = self._disk_path(key).read_bytes()
+            except OSError:
+                content = None
+            if content is not None:
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                    self._put_memory(key, content)
+                return content
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key: str, content: bytes):
+        with self._lock:
+            self._put_memory(key, content)
+        if self.disk_dir and len(content) <= self.disk_max_bytes:
+            self._put_disk(key, content)
+
+    def _put_memory(self, key: str, content: bytes):
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        if len(content) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = content
+        self._size += len(content)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats['evictions'] += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def _put_disk(self, key: str, content: bytes):
+        path = self._disk_path(key)
+        path.parent.mkdir(exist_ok=True)
+        # A temporary file of its own per writer: concurrent puts of one key each replace the file whole
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as tmp_file:
+            tmp_file.write(content)
+        try:
+            os.replace(tmp_file.name, path)
+        except OSError:
+            os.unlink(tmp_file.name)
+            raise
+
+        with self._lock:
+            self._disk_size -= self._disk_entries.pop(key, 0)
+            self._disk_entries[key] = len(content)
+            self._disk_size += len(content)
+            evicted = []
+            while self._disk_size > self.disk_max_bytes:
+                old_key, size = self._disk_entries.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                self._disk_path(old_key).unlink()
+            except OSError:
+                pass
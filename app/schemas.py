@@ -0,0 +1,205 @@
+from typing import Any, Dict, List, Literal, Optional, Union
+
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.responses import JSONResponse
+
+# Every data field is optional: a `fields=` projection may leave any of them out,
+# and the model can return extra fields, which are passed through as they are.
+
+class LineItem(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    description: Optional[str] = None
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    amount: Optional[float] = None
+
+class DocumentData(BaseModel):
+    """Fields shared by invoices and quotes"""
+    model_config = ConfigDict(extra='allow')
+
+    date: Optional[str] = None
+    currency: Optional[str] = None
+    customer_name: Optional[str] = None
+    address: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+    items: Optional[List[LineItem]] = None
+    subtotal: Optional[float] = None
+    tax_rate: Optional[float] = None
+    tax_rate_percentage: Optional[float] = None
+    tax_amount: Optional[float] = None
+    total: Optional[float] = None
+
+class InvoiceData(DocumentData):
+    invoice_number: Optional[str] = None
+    delivery_rate: Optional[float] = None
+    delivery_rate_percentage: Optional[float] = None
+    delivery_amount: Optional[float] = None
+
+class QuoteData(DocumentData):
+    quote_number: Optional[str] = None
+
+class InventoryData(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    inventory_id: Optional[str] = None
+    created_at: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    item_type: Optional[str] = None
+    sku: Optional[str] = None
+    category: Optional[str] = None
+    currency: Optional[str] = None
+    unit_price: Optional[float] = None
+    cost_price: Optional[float] = None
+    profit_per_unit: Optional[float] = None
+    profit_margin: Optional[float] = None
+    tax_rate: Optional[float] = None
+    tax_rate_percentage: Optional[float] = None
+    track_inventory: Optional[bool] = None
+    quantity_on_hand: Optional[float] = None
+    low_stock_threshold: Optional[float] = None
+    reorder_quantity: Optional[float] = None
+    total_stock_value: Optional[float] = None
+    supplier_name: Optional[str] = None
+    is_active: Optional[bool] = None
+
+class DocumentResponse(BaseModel):
+    """A generated or recalculated document; text_output is left out with include_text=false"""
+    success: bool
+    document_type: Literal['invoice', 'quote', 'inventory']
+    data: Union[InvoiceData, QuoteData, InventoryData]
+    text_output: Optional[str] = None
+
+class ConversationResponse(BaseModel):
+    """Reply to a prompt that doesn't describe a document"""
+    success: bool
+    document_type: Literal['conversation']
+    message: str
+    text_output: str
+
+class CurrencyRequiredResponse(BaseModel):
+    """The prompt gave no currency; ask for one and send the prompt again"""
+    success: Literal[False]
+    needs_currency: Literal[True]
+    message: str
+    detected_document_type: str
+    partial_data: Dict[str, Any]
+
+class BatchDocumentResult(BaseModel):
+    """One file of a batch_mode='separate' upload: a document response, or an error"""
+    model_config = ConfigDict(extra='allow')
+
+    filename: str
+    success: bool
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    success: bool
+    batch_mode: Literal['separate']
+    document_type: str
+    documents: List[BatchDocumentResult]
+
+class RecalculateBatchResponse(BaseModel):
+    success: bool
+    documents: List[DocumentResponse]
+
+class InventoryListResponse(BaseModel):
+    success: bool
+    items: List[InventoryData]
+
+class InventoryUpsertResponse(BaseModel):
+    success: bool
+    stored: int
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class InventoryImportResponse(BaseModel):
+    """Outcome of a spreadsheet import; errors lists the first INVENTORY_IMPORT_MAX_ERRORS failed rows"""
+    success: bool
+    rows: int
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+    truncated: bool
+    columns: Dict[str, str]
+    ignored_columns: List[str]
+    mapped_by: Literal['headers', 'model']
+    has_header: bool
+    header_issues: List[str]
+
+class CustomerData(BaseModel):
+    """A customer of past invoices and quotes, with the details used to complete new ones"""
+    customer_name: str
+    address: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+    documents: int
+    last_seen: str
+
+class CustomerListResponse(BaseModel):
+    success: bool
+    customers: List[CustomerData]
+
+class JobStatusResponse(BaseModel):
+    """A background job; progress is job-specific (documents rendered for bulk exports)"""
+    job_id: str
+    kind: Literal['generate', 'export_bulk']
+    status: Literal['queued', 'running', 'completed', 'failed']
+    created_at: str
+    started_at: Optional[str]
+    finished_at: Optional[str]
+    expires_at: Optional[str]
+    attempts: int
+    progress: Dict[str, Any]
+    error: Optional[str]
+    artifact: Optional[str]
+    media_type: Optional[str]
+    webhook: Optional[str]
+
+class CategoryStockValue(BaseModel):
+    category: Optional[str]
+    currency: Optional[str]
+    items: int
+    quantity: float
+    stock_value: float
+
+class StockValueResponse(BaseModel):
+    success: bool
+    categories: List[CategoryStockValue]
+
+class MarginBucket(BaseModel):
+    """Items with from <= profit_margin < to (no bound when null)"""
+    from_: Optional[float] = Field(alias='from')
+    to: Optional[float]
+    items: int
+
+class MarginDistributionResponse(BaseModel):
+    success: bool
+    items: int
+    average: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+    percentiles: Dict[str, float]
+    buckets: List[MarginBucket]
+
+GenerateResponse = Union[DocumentResponse, CurrencyRequiredResponse, ConversationResponse, BatchResponse]
+RecalculateResponse = Union[DocumentResponse, RecalculateBatchResponse]
+
+class OrjsonResponse(JSONResponse):
+    """
+    JSON response serialized with orjson.
+
+    Endpoints return plain dicts in this response, so they skip both
+    response-model validation and FastAPI's jsonable_encoder; the models above
+    only document the schema. Same output as fastapi.responses.ORJSONResponse,
+    which newer FastAPI releases deprecate.
+    """
+    media_type = 'application/json'
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,35 @@
+"""
+Shared pytest setup for the Quotla AI Document Generator tests.
+
+Puts the project root on sys.path so tests import the app package, and
+provides stores backed by SQLite files in each test's temporary directory.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.customer_directory import CustomerDirectory
+from app.enrichment import EnrichmentEngine
+from app.inventory_store import InventoryStore
+from app.numbering import NumberAllocator
+
+@pytest.fixture
+def inventory_store(tmp_path) -> InventoryStore:
+    return InventoryStore(str(tmp_path / 'inventory.db'))
+
+@pytest.fixture
+def number_allocator(tmp_path) -> NumberAllocator:
+    return NumberAllocator(str(tmp_path / 'numbering.db'))
+
+@pytest.fixture
+def customer_directory(tmp_path) -> CustomerDirectory:
+    return CustomerDirectory(str(tmp_path / 'customers.db'))
+
+@pytest.fixture
+def engine() -> EnrichmentEngine:
+    """Engine with the default 7.5% tax and 3% delivery rates"""
+    return EnrichmentEngine(7.5, 3.0)
@@ -283,8 +283,83 @@ def test_calculation_accuracy():
         print_result("Calculation Accuracy", False, time.time() - start, f"Error: {str(e)}")
         return False
 
+def test_recalculate():
+    """Test 11: Recalculate an edited document without the AI model"""
+    start = time.time()
+    try:
+        document = {
+            "invoice_number": "INV20241201153045",
+            "date": "2024-12-01",
+            "currency": "NGN",
+            "tax_rate": 0.1,
+            "tax_rate_percentage": 10,
+            "delivery_rate": 0.05,
+            "delivery_rate_percentage": 0,
+            "items": [{"description": "Chairs", "quantity": 120, "unit_price": 1000, "amount": 100000}]
+        }
+        response = requests.post(f"{BASE_URL}/api/recalculate", json=[document, document])
+        duration = time.time() - start
+
+        if response.status_code == 200:
+            results = response.json()["documents"]
+            data = results[0]["data"]
+            success = (
+                len(results) == 2 and
+                data["invoice_number"] == document["invoice_number"] and
+                data["items"][0]["amount"] == 120000 and
+                data["tax_amount"] == 12000 and
+                data["delivery_amount"] == 0 and
+                data["total"] == 132000 and
+                "TOTAL: NGN 132,000.00" in results[0]["text_output"]
+            )
+            details = f"Total: {data['total']:,.2f} | Number kept: {data['invoice_number'] == document['invoice_number']}"
+        else:
+            success = False
+            details = f"Status: {response.status_code}"
+
+        print_result("Recalculate", success, duration, details)
+        return success
+    except Exception as e:
+        print_result("Recalculate", False, time.time() - start, f"Error: {str(e)}")
+        return False
+
+def test_response_projection():
+    """Test 12: Only the requested data fields, without text_output"""
+    start = time.time()
+    try:
+        document = {
+            "invoice_number": "INV20241201153045",
+            "date": "2024-12-01",
+            "currency": "NGN",
+            "items": [{"description": "Chairs", "quantity": 12, "unit_price": 5000}]
+        }
+        response = requests.post(
+            f"{BASE_URL}/api/recalculate",
+            params={"fields": "invoice_number,total", "include_text": "false"},
+            json=document
+        )
+        duration = time.time() - start
+
+        if response.status_code == 200:
+            result = response.json()
+            success = (
+                result["success"] and
+                set(result["data"]) == {"invoice_number", "total"} and
+                "text_output" not in result
+            )
+            details = f"Keys: {sorted(result)} | Data: {result['data']} | {len(response.content)} bytes"
+        else:
+            success = False
+            details = f"Status: {response.status_code}"
+
+        print_result("Response Projection", success, duration, details)
+        return success
+    except Exception as e:
+        print_result("Response Projection", False, time.time() - start, f"Error: {str(e)}")
+        return False
+
 def run_performance_benchmark():
-    """Test 11: Performance benchmark (5 requests)"""
+    """Test 13: Performance benchmark (5 requests)"""
     print("\n" + "="*60)
     print("PERFORMANCE BENCHMARK - 5 Sequential Requests")
     print("="*60)
@@ -333,6 +408,8 @@ def main():
         test_large_numbers,
         test_currency_extraction,
         test_calculation_accuracy,
+        test_recalculate,
+        test_response_projection,
     ]
 
     results = []
@@ -0,0 +1,666 @@
+"""
+Offline Performance Benchmarks for Quotla AI Document Generator
+
+These exercise the services directly (no running server or API keys needed).
+
+Run with: python tests/test_benchmarks.py
+"""
+
+import sys
+import time
+import base64
+import asyncio
+import zipfile
+import tempfile
+import csv
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+from openpyxl import Workbook
+from pydantic import TypeAdapter
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.enrichment import EnrichmentEngine
+from app.image_service import ImageService
+from app.catalog import CatalogResolver
+from app.customer_directory import CustomerDirectory
+from app.inventory_import import InventoryImporter, detect_columns, read_rows
+from app.inventory_store import InventoryStore
+from app.numbering import NumberAllocator
+from app.schemas import GenerateResponse, OrjsonResponse
+from app.export_service import (
+    CsvRows, ExportService, ExportTemplate, RenderPool, XlsxRows, _find_font_path, DOCUMENT_COLUMNS, ITEM_COLUMNS
+)
+
+SAMPLE_INVOICE = {
+    'invoice_number': 'INV20241201153045',
+    'date': '2024-12-01',
+    'customer_name': 'Tech Corp Ltd',
+    'address': 'Plot 45, Victoria Island',
+    'city': 'Lagos',
+    'country': 'Nigeria',
+    'items': [
+        {'description': f'Product {i}', 'quantity': i + 1, 'unit_price': 5000, 'amount': (i + 1) * 5000}
+        for i in range(10)
+    ],
+    'subtotal': 275000,
+    'tax_rate': 0.075,
+    'tax_amount': 20625,
+    'delivery_rate': 0.03,
+    'delivery_amount': 8250,
+    'total': 303875,
+    'currency': 'NGN',
+}
+
+def print_benchmark(name: str, duration: float, details: str = ""):
+    print(f"\n  {name} | {duration * 1000:.1f}ms")
+    if details:
+        print(f"    {details}")
+
+def create_phone_photo(width: int = 4000, height: int = 3000) -> bytes:
+    """Create a 12 MP JPEG with photo-like noise and EXIF orientation"""
+    noise = Image.effect_noise((width // 4, height // 4), 40).resize((width, height))
+    img = Image.merge('RGB', (noise, noise.transpose(Image.FLIP_LEFT_RIGHT), noise.transpose(Image.FLIP_TOP_BOTTOM)))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees, as phones usually store portrait shots
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=92, exif=exif)
+    return buffer.getvalue()
+
+def run_image_preprocessing_benchmark():
+    """Payload bytes and latency for a vision upload, before and after preprocessing"""
+    print("\n" + "="*60)
+    print("IMAGE PREPROCESSING - 12 MP phone photo")
+    print("="*60)
+
+    photo = create_phone_photo()
+    image_service = ImageService()
+
+    start = time.perf_counter()
+    raw_payload = base64.b64encode(photo)
+    raw_duration = time.perf_counter() - start
+    print_benchmark("Raw upload (base64 only)", raw_duration, f"Payload: {len(raw_payload) / 1024:,.0f} KB")
+
+    durations = []
+    for _ in range(5):
+        start = time.perf_counter()
+        image_bytes, media_type = image_service.preprocess(photo)
+        payload = base64.b64encode(image_bytes)
+        durations.append(time.perf_counter() - start)
+
+    processed = Image.open(BytesIO(image_bytes))
+    avg = sum(durations) / len(durations)
+    print_benchmark(
+        "Preprocessed (orient, resize, re-encode, base64)", avg,
+        f"Payload: {len(payload) / 1024:,.0f} KB | {media_type} {processed.size[0]}x{processed.size[1]} | "
+        f"{len(raw_payload) / len(payload):.1f}x smaller"
+    )
+    return len(payload) < len(raw_payload)
+
+def run_export_throughput_benchmark(concurrency: int = 32):
+    """Concurrent PDF exports: inline on the event loop vs the renderer pool"""
+    print("\n" + "="*60)
+    print(f"EXPORT THROUGHPUT - {concurrency} concurrent PDF exports")
+    print("="*60)
+
+    export_service = ExportService()
+    export_service.warm_up()
+
+    async def inline():
+        async def render():
+            return export_service.generate_export(SAMPLE_INVOICE, 'invoice', 'pdf').getvalue()
+        return await asyncio.gather(*(render() for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(inline())
+    inline_duration = time.perf_counter() - start
+    print_benchmark("Inline (blocks event loop)", inline_duration, f"{concurrency / inline_duration:.1f} docs/s")
+
+    results = {}
+    for kind in ('thread', 'process'):
+        render_pool = RenderPool(export_service, kind=kind)
+        start = time.perf_counter()
+        render_pool.start()
+        warm_duration = time.perf_counter() - start
+
+        async def pooled():
+            return await asyncio.gather(*(render_pool.render(SAMPLE_INVOICE, 'invoice', 'pdf') for _ in range(concurrency)))
+
+        start = time.perf_counter()
+        asyncio.run(pooled())
+        duration = time.perf_counter() - start
+        render_pool.shutdown()
+        results[kind] = duration
+        print_benchmark(
+            f"{kind.title()} pool ({render_pool.workers} workers)", duration,
+            f"{concurrency / duration:.1f} docs/s | warm-up {warm_duration * 1000:.0f}ms"
+        )
+
+    return min(results.values()) < inline_duration * 1.5
+
+def run_template_cache_benchmark(renders: int = 50):
+    """Per-render cost with styles and fonts rebuilt every time vs cached on the template"""
+    print("\n" + "="*60)
+    print(f"EXPORT TEMPLATE CACHE - {renders} renders per format")
+    print("="*60)
+
+    export_service = ExportService()
+    export_service.warm_up()
+    timings = {}
+    for format in ('pdf', 'png'):
+        start = time.perf_counter()
+        for _ in range(renders):
+            # A fresh template has nothing cached, like the old per-call style/font setup
+            _find_font_path.cache_clear()
+            export_service.register_template(ExportTemplate('uncached'))
+            export_service.generate_export(SAMPLE_INVOICE, 'invoice', format, 'uncached')
+        uncached = (time.perf_counter() - start) / renders
+
+        start = time.perf_counter()
+        for _ in range(renders):
+            export_service.generate_export(SAMPLE_INVOICE, 'invoice', format, 'default')
+        cached = (time.perf_counter() - start) / renders
+
+        timings[format] = (uncached, cached)
+        print_benchmark(
+            f"{format.upper()} per render", cached,
+            f"uncached {uncached * 1000:.2f}ms -> cached {cached * 1000:.2f}ms | saved {(uncached - cached) * 1000:.2f}ms per render"
+        )
+    return all(cached <= uncached * 1.15 for uncached, cached in timings.values())
+
+def run_large_document_benchmark(sizes=(10, 1_000, 10_000)):
+    """Render time and output size as invoices grow to thousands of line items"""
+    print("\n" + "="*60)
+    print(f"LARGE DOCUMENTS - {', '.join(f'{size:,}' for size in sizes)} items")
+    print("="*60)
+
+    export_service = ExportService()
+    export_service.warm_up()
+    timings = {}
+    for size in sizes:
+        document = dict(SAMPLE_INVOICE, items=[
+            {'description': f'Product {i}', 'quantity': 1, 'unit_price': 5000, 'amount': 5000}
+            for i in range(size)
+        ])
+        for format in ('pdf', 'docx', 'png'):
+            start = time.perf_counter()
+            content = export_service.generate_export(document, 'invoice', format).getvalue()
+            duration = time.perf_counter() - start
+            timings[(format, size)] = duration
+
+            details = f"{len(content) / 1024:,.0f} KB | {duration / size * 1000:.3f}ms per item"
+            if format == 'pdf':
+                pages = content.count(b'/Type /Page\n')
+                details += f" | {pages:,} pages"
+            elif format == 'png' and content[:4] == b'PK\x03\x04':
+                details += f" | {len(zipfile.ZipFile(BytesIO(content)).namelist()):,} page images"
+            print_benchmark(f"{format.upper()} {size:,} items", duration, details)
+
+    # Rendering should scale roughly linearly, not quadratically, with item count
+    smallest, largest = sizes[1], sizes[-1]
+    scale = largest / smallest
+    return all(timings[(format, largest)] < timings[(format, smallest)] * scale * 2 for format in ('pdf', 'docx', 'png'))
+
+def run_preview_benchmark(renders: int = 50):
+    """Preview thumbnails vs full PNG renders, and PNG encoder settings"""
+    print("\n" + "="*60)
+    print(f"PREVIEW AND PNG ENCODING - {renders} renders each")
+    print("="*60)
+
+    export_service = ExportService()
+    export_service.warm_up()
+    variants = [
+        ('PNG (default)', 'png', None),
+        ('PNG compress_level=1', 'png', {'compress_level': 1}),
+        ('PNG compress_level=9 + optimize', 'png', {'compress_level': 9, 'optimize': True}),
+        ('Preview WEBP 400px', 'preview', {'image_format': 'webp'}),
+        ('Preview JPEG 400px', 'preview', {'image_format': 'jpeg'}),
+    ]
+    timings = {}
+    for name, format, options in variants:
+        start = time.perf_counter()
+        for _ in range(renders):
+            content = export_service.generate_export(SAMPLE_INVOICE, 'invoice', format, options=options).getvalue()
+        duration = (time.perf_counter() - start) / renders
+        timings[name] = duration
+        print_benchmark(name, duration, f"{len(content) / 1024:,.1f} KB")
+
+    return max(timings['Preview WEBP 400px'], timings['Preview JPEG 400px']) < timings['PNG (default)']
+
+def run_html_export_benchmark(renders: int = 50):
+    """Browser display path: compiled Jinja HTML vs rendering a PDF or PNG"""
+    print("\n" + "="*60)
+    print(f"HTML EXPORT - {renders} renders per format")
+    print("="*60)
+
+    export_service = ExportService()
+    export_service.warm_up()
+    timings = {}
+    for format in ('html', 'pdf', 'png'):
+        start = time.perf_counter()
+        for _ in range(renders):
+            content = export_service.generate_export(SAMPLE_INVOICE, 'invoice', format).getvalue()
+        timings[format] = (time.perf_counter() - start) / renders
+        print_benchmark(f"{format.upper()} per render", timings[format], f"{len(content) / 1024:,.1f} KB")
+    return timings['html'] < min(timings['pdf'], timings['png'])
+
+def run_pdf_size_benchmark():
+    """PDF bytes per document for compression, font embedding and logo settings"""
+    print("\n" + "="*60)
+    print("PDF OUTPUT SIZE - bytes per document")
+    print("="*60)
+
+    export_service = ExportService()
+    export_service.warm_up()
+    non_latin = dict(SAMPLE_INVOICE, customer_name='Иван Петров', address='ул. Тверская, 7', city='Москва')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A 12 MP photo-like logo, as customers tend to upload
+        logo_path = str(Path(tmp_dir) / 'logo.jpg')
+        Image.open(BytesIO(create_phone_photo())).save(logo_path, quality=90)
+        export_service.register_template(ExportTemplate('logo-original', logo_path=logo_path, logo_dpi=0))
+        export_service.register_template(ExportTemplate('logo-downsampled', logo_path=logo_path))
+
+        variants = [
+            ('Default (compressed, built-in font)', SAMPLE_INVOICE, None, None),
+            ('Uncompressed page streams', SAMPLE_INVOICE, None, {'compress': False}),
+            ('Embedded subset font', SAMPLE_INVOICE, None, {'font': 'embedded'}),
+            ('Non-Latin customer (auto embeds)', non_latin, None, None),
+            ('Logo as uploaded', SAMPLE_INVOICE, 'logo-original', None),
+            ('Logo downsampled', SAMPLE_INVOICE, 'logo-downsampled', None),
+        ]
+        sizes = {}
+        for name, document, template, options in variants:
+            start = time.perf_counter()
+            content = export_service.generate_export(document, 'invoice', 'pdf', template, options).getvalue()
+            duration = time.perf_counter() - start
+            sizes[name] = len(content)
+            print_benchmark(name, duration, f"{len(content) / 1024:,.1f} KB per document")
+
+    return (sizes['Default (compressed, built-in font)'] < sizes['Uncompressed page streams']
+            and sizes['Logo downsampled'] < sizes['Logo as uploaded'])
+
+def run_spreadsheet_export_benchmark(documents: int = 10, items_per_document: int = 1_000):
+    """Bulk CSV/XLSX rows: peak memory of a regular openpyxl workbook vs write-only streaming"""
+    total_items = documents * items_per_document
+    print("\n" + "="*60)
+    print(f"SPREADSHEET EXPORT - {documents} documents, {total_items:,} line items")
+    print("="*60)
+
+    export_service = ExportService()
+    batch = [
+        dict(SAMPLE_INVOICE, invoice_number=f'INV{index:05d}', items=[
+            {'description': f'Product {i}', 'quantity': 1, 'unit_price': 5000, 'amount': 5000}
+            for i in range(items_per_document)
+        ])
+        for index in range(documents)
+    ]
+
+    def regular_xlsx():
+        # Every cell is kept as an object until the workbook is saved
+        workbook = Workbook()
+        documents_sheet = workbook.active
+        documents_sheet.append(DOCUMENT_COLUMNS)
+        items_sheet = workbook.create_sheet('Line Items')
+        items_sheet.append(ITEM_COLUMNS)
+        for document in batch:
+            document_row, item_rows = export_service.spreadsheet_rows(document, 'invoice')
+            documents_sheet.append(document_row)
+            for row in item_rows:
+                items_sheet.append(row)
+        buffer = BytesIO()
+        workbook.save(buffer)
+        return len(buffer.getvalue())
+
+    def streamed_xlsx():
+        workbook = XlsxRows(export_service)
+        for document in batch:
+            workbook.add(document, 'invoice')
+        buffer = BytesIO()
+        workbook.save(buffer)
+        return len(buffer.getvalue())
+
+    def streamed_csv():
+        rows = CsvRows(export_service)
+        size = len(rows.header())
+        for document in batch:
+            size += len(rows.add(document, 'invoice'))  # Each chunk would be sent to the client, not kept
+        return size
+
+    peaks = {}
+    for name, export in (('XLSX regular workbook', regular_xlsx), ('XLSX write-only', streamed_xlsx), ('CSV streamed', streamed_csv)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = export()
+        duration = time.perf_counter() - start
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print_benchmark(
+            name, duration,
+            f"{size / 1024:,.0f} KB output | peak {peaks[name] / 1024 / 1024:,.1f} MB (timed with tracemalloc on)"
+        )
+
+    return peaks['XLSX write-only'] < peaks['XLSX regular workbook'] / 2
+
+def run_batch_enrichment_benchmark(sizes=(1_000, 100_000, 1_000_000), items_per_document: int = 10):
+    """Document totals one dict at a time vs one columnar pass, with identical results"""
+    print("\n" + "="*60)
+    print(f"BATCH ENRICHMENT - {', '.join(f'{size:,}' for size in sizes)} line items")
+    print("="*60)
+
+    engine = EnrichmentEngine(7.5, 3.0)
+    matches = True
+    speedups = []
+    for size in sizes:
+        documents = [
+            {
+                'invoice_number': f'INV{index:07d}', 'currency': 'NGN', 'tax_rate': 7.5, 'delivery_rate': 3,
+                'items': [
+                    {'description': f'Product {i}', 'quantity': i % 7 + 1, 'unit_price': 1999.99 + i}
+                    for i in range(items_per_document)
+                ]
+            }
+            for index in range(size // items_per_document)
+        ]
+
+        start = time.perf_counter()
+        scalar = [engine.enrich(document, 'invoice') for document in documents]
+        scalar_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = engine.enrich_batch(documents, 'invoice')
+        batch_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        totals = engine.batch_totals(documents, 'invoice')
+        columns_duration = time.perf_counter() - start
+
+        matches = matches and scalar == batch
+        speedups.append(scalar_duration / batch_duration)
+        print_benchmark(f"{size:,} items one at a time", scalar_duration, f"{size / scalar_duration:,.0f} items/s")
+        print_benchmark(
+            f"{size:,} items batch (documents)", batch_duration,
+            f"{size / batch_duration:,.0f} items/s | {scalar_duration / batch_duration:.1f}x | identical: {scalar == batch}"
+        )
+        print_benchmark(
+            f"{size:,} items batch (totals only)", columns_duration,
+            f"{size / columns_duration:,.0f} items/s | grand total {int(totals.totals.sum()) / 100:,.2f}"
+        )
+        del documents, scalar, batch, totals
+
+    return matches and speedups[-1] > 1
+
+def run_response_serialization_benchmark(sizes=(10, 100, 1_000), responses: int = 500):
+    """Cost per /api/generate response: building it, then encoding it the default way, via a response model, or with orjson"""
+    from app.main import _build_document_response  # Imported here: app.main sets up the AI service and render pool
+
+    print("\n" + "="*60)
+    print(f"RESPONSE SERIALIZATION - times for {responses} responses")
+    print("="*60)
+
+    adapter = TypeAdapter(GenerateResponse)
+    encoders = {
+        'default encoder': lambda result: JSONResponse(jsonable_encoder(result)).body,  # Plain dict return
+        'response model': lambda result: adapter.dump_json(adapter.validate_python(result)),  # response_model=
+        'orjson': lambda result: OrjsonResponse(result).body,
+    }
+
+    def per_response(function) -> float:
+        start = time.perf_counter()
+        for _ in range(responses):
+            function()
+        return (time.perf_counter() - start) / responses
+
+    faster = True
+    for size in sizes:
+        data = dict(SAMPLE_INVOICE, items=[
+            {'description': f'Product {i}', 'quantity': i % 7 + 1, 'unit_price': 1999.99}
+            for i in range(size)
+        ])
+        full = _build_document_response(data, 'invoice')
+        trimmed = _build_document_response(data, 'invoice', fields=frozenset({'invoice_number', 'total'}), include_text=False)
+        build_full = per_response(lambda: _build_document_response(data, 'invoice'))
+        build_data = per_response(lambda: _build_document_response(data, 'invoice', include_text=False))
+
+        print(f"\n  {size:,} line items")
+        print_benchmark("build (enrich + text_output)", build_full * responses, f"{build_full * 1e6:,.0f}µs per response")
+        print_benchmark("build, include_text=false", build_data * responses, f"{build_data * 1e6:,.0f}µs per response")
+        timings = {}
+        for name, encode in encoders.items():
+            timings[name] = per_response(lambda: encode(full))
+            print_benchmark(
+                f"encode with {name}", timings[name] * responses,
+                f"{timings[name] * 1e6:,.1f}µs per response | {len(encode(full)) / 1024:,.1f} KB"
+            )
+        projected = per_response(lambda: encoders['orjson'](trimmed))
+        print_benchmark(
+            "encode with orjson, fields + include_text=false", projected * responses,
+            f"{projected * 1e6:,.1f}µs per response | {len(encoders['orjson'](trimmed))} bytes"
+        )
+        faster = faster and timings['orjson'] < min(timings['default encoder'], timings['response model'])
+
+    return faster
+
+def run_inventory_store_benchmark(size: int = 1_000_000, chunk: int = 100_000):
+    """Inventory store at scale: bulk upsert throughput, then lookups, catalog resolution and analytics over every item"""
+    print("\n" + "="*60)
+    print(f"INVENTORY STORE - {size:,} items")
+    print("="*60)
+
+    names = ['Laptop', 'Office Chair', 'HDMI Cable', 'Standing Desk', 'Printer Toner']
+
+    def items(start: int, stop: int):
+        for index in range(start, stop):
+            cost_price = 1000 + index % 5000
+            yield {
+                'inventory_id': f'ITEM{index:08d}', 'sku': f'SKU-{index:08d}', 'name': f'{names[index % 5]} Model {index}',
+                'category': f'Category {index % 40}', 'currency': 'NGN', 'unit_price': cost_price * 1.3,
+                'cost_price': cost_price, 'tax_rate_percentage': 7.5, 'quantity_on_hand': index % 100,
+                'low_stock_threshold': 5, 'profit_margin': float(index % 91 - 10), 'track_inventory': True
+            }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = InventoryStore(str(Path(tmp_dir) / 'inventory.db'))
+        start = time.perf_counter()
+        for offset in range(0, size, chunk):
+            store.upsert(items(offset, min(offset + chunk, size)))
+        load_duration = time.perf_counter() - start
+        print_benchmark(f"bulk upsert ({chunk:,} per transaction)", load_duration, f"{size / load_duration:,.0f} items/s")
+
+        def timed(name: str, function, details=lambda result: ""):
+            start = time.perf_counter()
+            result = function()
+            duration = time.perf_counter() - start
+            print_benchmark(name, duration, details(result))
+            return duration
+
+        timed("get by SKU", lambda: store.find(sku=f'SKU-{size // 2:08d}'), lambda result: f"{len(result)} item")
+        timed("name search 'model 4242'", lambda: store.find('model 4242', limit=20), lambda result: f"{len(result)} items")
+        timed("name search 'toner' (common)", lambda: store.find('toner', limit=20), lambda result: f"{len(result)} items")
+        timed("low stock (first 100)", lambda: store.low_stock(limit=100), lambda result: f"{len(result)} items")
+        totals = timed(
+            "stock value by category", store.stock_value_by_category,
+            lambda result: f"{len(result)} categories | {sum(row['stock_value'] for row in result):,.2f} NGN"
+        )
+        connection = store._connect()
+        scan = timed(
+            "same, scanning the items", lambda: connection.execute(
+                "SELECT category, currency, count(*), sum(quantity_on_hand), sum(stock_value_minor) FROM items "
+                "WHERE tenant_id = '' GROUP BY category, currency"
+            ).fetchall(),
+            lambda result: f"{len(result)} categories"
+        )
+        connection.close()
+        timed(
+            "margin distribution", store.margin_distribution,
+            lambda result: f"median {result['percentiles']['p50']}% | average {result['average']}%"
+        )
+
+        # Catalog rows for a request, instead of the whole catalog, and items filled after extraction
+        resolver = CatalogResolver(store)
+        desk = size // 7 // 5 * 5 + 3
+        request = f"Invoice Ada for 4 x SKU-{size // 3:08d} and 2 of the standing desk model {desk}"
+        reference = resolver.prompt_reference(request)
+        whole_catalog = sum(len(f"- SKU-{index:08d} | {names[index % 5]} Model {index} | NGN 0,000.00\n") for index in range(size))
+        timed(
+            "catalog rows for a request", lambda: resolver.prompt_reference(request),
+            lambda result: f"{len(result.splitlines()) - 1} rows | ~{len(result) // 4} tokens (whole catalog: ~{whole_catalog // 4:,})"
+        )
+        document = {'currency': None, 'items': [
+            {'description': f'{names[index % 5]} model {index * 997}', 'quantity': 1, 'unit_price': 0} for index in range(10)
+        ]}
+        timed(
+            "resolve 10 extracted items", lambda: resolver.resolve(document),
+            lambda result: f"{sum('sku' in item for item in result['items'])}/10 matched | currency {result['currency']}"
+        )
+
+    return totals < scan / 10
+
+def run_inventory_import_benchmark(csv_rows: int = 100_000, xlsx_rows: int = 10_000):
+    """Spreadsheet import: rows streamed, enriched and upserted a chunk per transaction, with flat memory"""
+    print("\n" + "="*60)
+    print(f"INVENTORY IMPORT - {csv_rows:,} CSV rows, {xlsx_rows:,} XLSX rows")
+    print("="*60)
+
+    header = ['Product', 'SKU', 'Category', 'Selling Price', 'Cost', 'Qty', 'Reorder Level', 'Currency']
+
+    def row(index: int) -> list:
+        return [f'Product {index}', f'SKU-{index:07d}', f'Category {index % 40}', f'{1300 + index % 5000:,}.50',
+                1000 + index % 5000, index % 100, 5, 'NGN']
+
+    engine = EnrichmentEngine(7.5, 3.0)
+    success = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / 'items.csv'
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(row(index) for index in range(csv_rows))
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for index in range(csv_rows, csv_rows + xlsx_rows):
+            sheet.append(row(index))
+        xlsx_path = Path(tmp_dir) / 'items.xlsx'
+        workbook.save(xlsx_path)
+
+        importer = InventoryImporter(
+            InventoryStore(str(Path(tmp_dir) / 'inventory.db')), engine, NumberAllocator(str(Path(tmp_dir) / 'numbers.db'))
+        )
+        def import_file(path: Path):
+            with open(path, 'rb') as f:
+                rows = read_rows(f, path.name)
+                mapping, issues = detect_columns(next(rows)[1], [])
+                return importer.import_rows(rows, mapping), issues
+
+        for path, count in ((csv_path, csv_rows), (xlsx_path, xlsx_rows)):
+            start = time.perf_counter()
+            report, issues = import_file(path)
+            duration = time.perf_counter() - start
+            print_benchmark(
+                f"import {count:,} {path.suffix[1:].upper()} rows", duration,
+                f"{count / duration:,.0f} rows/s | {report['imported']:,} imported | "
+                f"model calls: {1 if issues else 0} (one per item through prompts: {count:,})"
+            )
+            success = success and report['imported'] == count and not issues
+
+        # Memory stays flat however long the file: rows are streamed and written a chunk at a time
+        tracemalloc.start()
+        start = time.perf_counter()
+        report, _ = import_file(csv_path)
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print_benchmark("import the CSV again, traced", duration, f"peak memory {peak / 2**20:.1f} MB for {report['rows']:,} rows")
+        success = success and peak < 64 * 2**20
+
+    return success
+
+def run_customer_directory_benchmark(size: int = 100_000, chunk: int = 10_000):
+    """Customer directory at scale: recording extracted customers, then completion and prompt references"""
+    print("\n" + "="*60)
+    print(f"CUSTOMER DIRECTORY - {size:,} customers")
+    print("="*60)
+
+    cities = ['Lagos', 'Abuja', 'Accra', 'Nairobi', 'Kano']
+    surnames = ['Adeyemi', 'Okafor', 'Balogun', 'Nwosu', 'Mensah', 'Kamau', 'Otieno', 'Bello', 'Eze', 'Afolabi']
+    words = ['Golden', 'Prime', 'Royal', 'Summit', 'Apex', 'Unity', 'Pioneer', 'Heritage', 'Diamond', 'Zenith']
+    trades = ['Logistics', 'Foods', 'Pharmacy', 'Motors', 'Builders', 'Textiles', 'Farms', 'Energy', 'Printing', 'Hotels']
+
+    def name(index: int) -> str:
+        branch = f" {index // 1000 + 1}" if index >= 1000 else ""
+        return f"{surnames[index % 10]} {words[index // 10 % 10]} {trades[index // 100 % 10]}{branch} Ltd"
+
+    def customers(start: int, stop: int):
+        for index in range(start, stop):
+            yield {'customer_name': name(index), 'address': f'{index % 200} Marina Road',
+                   'city': cities[index % 5], 'country': 'Nigeria'}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = CustomerDirectory(str(Path(tmp_dir) / 'customers.db'))
+        start = time.perf_counter()
+        for offset in range(0, size, chunk):
+            directory.record(customers(offset, min(offset + chunk, size)))
+        load_duration = time.perf_counter() - start
+        print_benchmark(f"record ({chunk:,} per transaction)", load_duration, f"{size / load_duration:,.0f} customers/s")
+
+        def timed(name: str, function, details=lambda result: ""):
+            start = time.perf_counter()
+            result = function()
+            print_benchmark(name, time.perf_counter() - start, details(result))
+            return result
+
+        expected = name(size // 3)
+        words_of_name = expected.split()[:-1]
+        exact = timed(
+            "complete, same name", lambda: directory.complete({'customer_name': ' '.join(words_of_name).upper()}),
+            lambda result: f"{result['customer_name']} | {result.get('city')} | {result.get('address')}"
+        )
+        misspelt = ' '.join([words_of_name[0], words_of_name[1][:-2] + words_of_name[1][-1], *words_of_name[2:], 'Limited'])
+        fuzzy = timed(
+            f"complete, misspelt name '{misspelt}'", lambda: directory.complete({'customer_name': misspelt}),
+            lambda result: f"{result['customer_name']}"
+        )
+        request = f"Invoice {' '.join(words_of_name)} for 4 laptops at 450,000 NGN each, delivered to their warehouse"
+        reference = timed(
+            "customer reference for a request", lambda: directory.prompt_reference(request),
+            lambda result: f"{result.splitlines()[1:]} | ~{len(result) // 4} tokens"
+        )
+
+    return exact['customer_name'] == expected and fuzzy['customer_name'] == expected and expected in reference
+
+def main():
+    print("\n" + "="*60)
+    print("QUOTLA AI DOCUMENT GENERATOR - OFFLINE BENCHMARKS")
+    print("="*60)
+
+    benchmarks = [
+        run_image_preprocessing_benchmark,
+        run_export_throughput_benchmark,
+        run_template_cache_benchmark,
+        run_large_document_benchmark,
+        run_preview_benchmark,
+        run_html_export_benchmark,
+        run_pdf_size_benchmark,
+        run_spreadsheet_export_benchmark,
+        run_batch_enrichment_benchmark,
+        run_response_serialization_benchmark,
+        run_inventory_store_benchmark,
+        run_inventory_import_benchmark,
+        run_customer_directory_benchmark,
+    ]
+
+    results = [benchmark() for benchmark in benchmarks]
+    print("\n" + "="*60)
+    print(f"Completed: {sum(results)}/{len(results)} benchmarks met expectations")
+    print("="*60 + "\n")
+    return all(results)
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
@@ -0,0 +1,67 @@
+"""
+Catalog Resolution Tests for Quotla AI Document Generator
+
+Exercises catalog lookups against a temporary inventory store (no server or API keys needed).
+
+Run with: python -m pytest tests/test_catalog.py
+"""
+
+import copy
+
+import pytest
+
+from app.catalog import CatalogResolver
+
+def catalog_item(index: int, name: str, sku, unit_price: float, currency: str = 'NGN') -> dict:
+    return {
+        'inventory_id': f'ITEM{index:06d}', 'name': name, 'sku': sku, 'unit_price': unit_price,
+        'cost_price': unit_price * 0.8, 'currency': currency, 'profit_margin': 25.0
+    }
+
+@pytest.fixture
+def resolver(inventory_store) -> CatalogResolver:
+    """Five named items among 2,000 filler widgets"""
+    inventory_store.upsert([
+        catalog_item(1, 'Standard Laptop', 'LAP-001', 450000),
+        catalog_item(2, 'Dell Latitude Laptop', 'LAP-002', 650000),
+        catalog_item(3, 'Laptop Bag', 'BAG-001', 20000),
+        catalog_item(4, 'Office Chair', 'CHR-009', 85000),
+        catalog_item(5, 'Consulting Hour', None, 150, 'USD'),
+    ] + [catalog_item(100 + index, f'Widget Model {index}', f'W-{index}', 1000 + index) for index in range(2000)])
+    return CatalogResolver(inventory_store, prompt_rows=8, threshold=0.6)
+
+def test_prompt_reference_only_relevant_rows(resolver):
+    """Only catalog rows a request refers to are added to the prompt, never the whole catalog"""
+    by_name = resolver.prompt_reference("Invoice John Doe in Lagos for 10 of our standard laptops and 2 office chairs")
+    by_sku = resolver.prompt_reference("Quote for 3 units of chr-009 please")
+    unrelated = resolver.prompt_reference("Invoice Jane for 3 hours of gardening at 5000 NGN")
+
+    rows = [line for line in by_name.splitlines() if line.startswith('- ')]
+    assert '- LAP-001 | Standard Laptop | NGN 450,000.00' in rows
+    assert '- CHR-009 | Office Chair | NGN 85,000.00' in rows
+    assert not any('Widget' in row for row in rows) and len(rows) <= 8
+    assert by_sku.splitlines()[1:] == ['- CHR-009 | Office Chair | NGN 85,000.00']
+    assert unrelated == ''
+
+def test_resolve_fills_items(resolver):
+    """Items are filled by exact SKU or name similarity, keeping prices the user gave"""
+    document = {
+        'customer_name': 'John Doe', 'currency': None,
+        'items': [
+            {'description': 'standard laptops', 'quantity': 10, 'unit_price': 0, 'amount': 0},
+            {'description': 'Chairs', 'sku': 'chr-009', 'quantity': 2, 'unit_price': 90000},
+            {'description': 'Gardening', 'quantity': 1, 'unit_price': 100},
+        ]
+    }
+    original = copy.deepcopy(document)
+    resolved = resolver.resolve(document)
+    # A document in another currency keeps its own (missing) price rather than a catalog price
+    dollars = resolver.resolve({**original, 'currency': 'USD'})
+
+    laptop, chair, gardening = resolved['items']
+    assert laptop == {'description': 'Standard Laptop', 'quantity': 10, 'unit_price': 450000, 'sku': 'LAP-001', 'inventory_id': 'ITEM000001'}
+    assert chair['description'] == 'Office Chair' and chair['unit_price'] == 90000 and chair['sku'] == 'CHR-009'
+    assert gardening == original['items'][2]
+    assert resolved['currency'] == 'NGN' and document == original
+    assert dollars['items'][0]['unit_price'] == 0 and dollars['items'][0]['sku'] == 'LAP-001'
+    assert dollars['currency'] == 'USD'
@@ -0,0 +1,67 @@
+"""
+Customer Directory Tests for Quotla AI Document Generator
+
+Exercises customer lookups and completion against a temporary customer directory (no server or API keys needed).
+
+Run with: python -m pytest tests/test_customer_directory.py
+"""
+
+import pytest
+
+from app.customer_directory import CustomerDirectory, normalize_name
+
+@pytest.fixture
+def directory(customer_directory) -> CustomerDirectory:
+    """Three known customers among 2,000 filler traders"""
+    customer_directory.record([
+        {'customer_name': 'Tech Corp Ltd', 'address': 'Plot 45, Victoria Island', 'city': 'Lagos', 'country': 'Nigeria'},
+        {'customer_name': 'Adebayo Holdings', 'city': 'Abuja', 'country': 'Nigeria'},
+        {'customer_name': 'John Doe', 'address': None, 'city': 'Accra', 'country': 'Ghana'},
+    ] + [{'customer_name': f'Filler Trading {index}', 'city': 'Kano'} for index in range(2000)])
+    return customer_directory
+
+def test_normalize_name():
+    assert normalize_name('Mr. John Doe') == 'john doe'
+    assert normalize_name('Tech Corp Ltd.') == 'tech corp'
+
+def test_record_and_complete(directory):
+    """Spelling variants are one customer; only missing details are filled and new details update the directory"""
+    # Same customer again: keeps the stored name, adds the address, counts the document
+    directory.record([{'customer_name': 'the adebayo holdings LTD.', 'address': '12 Aminu Kano Crescent', 'city': None}])
+    adebayo = directory.find('Adebayo Holdings')
+    exact = directory.complete({'customer_name': 'TECH CORP', 'city': None, 'country': '', 'total': 10})
+    fuzzy = directory.complete({'customer_name': 'Tech Corp. Limited Nig', 'city': 'Ikeja'})
+    plural = directory.complete({'customer_name': 'Adebayo Holding'})
+    unknown = {'customer_name': 'Jane Smith', 'city': None}
+
+    assert adebayo['customer_name'] == 'Adebayo Holdings' and adebayo['documents'] == 2
+    assert adebayo['address'] == '12 Aminu Kano Crescent' and adebayo['city'] == 'Abuja'
+    assert exact == {'customer_name': 'Tech Corp Ltd', 'address': 'Plot 45, Victoria Island', 'city': 'Lagos', 'country': 'Nigeria', 'total': 10}
+    assert fuzzy['customer_name'] == 'Tech Corp Ltd' and fuzzy['city'] == 'Ikeja' and fuzzy['country'] == 'Nigeria'
+    assert plural['customer_name'] == 'Adebayo Holdings' and plural['city'] == 'Abuja'
+    assert directory.complete(unknown) is unknown
+    assert len(directory.search(limit=5000)) == 2003
+
+def test_weak_match_is_only_suggested(directory):
+    """A misspelling below the confident threshold keeps the extracted name and details"""
+    typo = directory.complete({'customer_name': 'Adebayo Holdngs'})
+
+    assert typo == {'customer_name': 'Adebayo Holdngs', 'customer_suggestion': 'Adebayo Holdings'}
+
+def test_placeholder_names_are_not_customers(directory):
+    """Names a model writes for a missing customer are neither recorded nor completed"""
+    written = directory.record([
+        {'customer_name': name, 'city': 'Lagos'} for name in ('N/A', 'Unknown', '-', 'Customer', 'Jo', 'None')
+    ])
+
+    assert written == 0
+    assert len(directory.search(limit=5000)) == 2003
+    assert directory.complete({'customer_name': 'Unknown', 'city': None}) == {'customer_name': 'Unknown', 'city': None}
+
+def test_prompt_reference_only_named_customers(directory):
+    """A request carries one line per known customer it names, and nothing for unknown or partly named ones"""
+    named = directory.prompt_reference("Invoice Tech Corp for 10 laptops at 450000 NGN each")
+
+    assert named.splitlines()[1:] == ['- Tech Corp Ltd | Plot 45, Victoria Island | Lagos | Nigeria']
+    assert directory.prompt_reference("Invoice John for 3 hours of consulting") == ''
+    assert directory.prompt_reference("Quote Jane Smith in Kaduna for 2 office chairs") == ''
@@ -0,0 +1,147 @@
+"""
+Enrichment Engine Tests for Quotla AI Document Generator
+
+Checks the fixed-point money math of EnrichmentEngine directly (no server needed).
+
+Run with: python -m pytest tests/test_enrichment.py
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.enrichment import MONEY_SCALE, round_div, to_fixed
+
+@pytest.mark.parametrize('value, expected', [
+    (1.005, 101),  # Read by its decimal repr, not the binary 1.00499999...
+    (-1.005, -101),  # Half-up rounds away from zero
+    (2.675, 268),
+    (0.1, 10),
+    (1.004, 100),
+    (7, 700),
+    (3.0, 300),
+    (None, 0),
+])
+def test_to_fixed_rounds_half_up(value, expected):
+    assert to_fixed(value, MONEY_SCALE) == expected
+
+def test_to_fixed_rejects_non_numbers():
+    with pytest.raises(ValueError):
+        to_fixed('12.50', MONEY_SCALE)
+
+@pytest.mark.parametrize('numerator, expected', [(5, 1), (-5, -1), (4, 0), (-4, 0), (15, 2), (-15, -2)])
+def test_round_div_rounds_half_away_from_zero(numerator, expected):
+    assert round_div(numerator, 10) == expected
+
+def test_line_amounts_round_half_up_to_the_cent(engine):
+    enriched = engine.enrich({'items': [{'quantity': 0.5, 'unit_price': 2.01}, {'quantity': 3, 'unit_price': 0.1}]}, 'quote')
+
+    assert [item['amount'] for item in enriched['items']] == [1.01, 0.3]
+    assert enriched['subtotal'] == 1.31
+
+def test_negative_discount_lines_round_away_from_zero(engine):
+    data = {'items': [{'quantity': 1, 'unit_price': 100}, {'description': 'Discount', 'amount': -10.005}]}
+    enriched = engine.enrich(data, 'quote')
+
+    assert enriched['items'][1]['amount'] == -10.01
+    assert enriched['subtotal'] == 89.99
+    assert enriched['tax_amount'] == 6.75  # 7.5% of 89.99 is 6.74925
+    assert enriched['total'] == 96.74
+
+def test_invoice_totals_include_delivery(engine):
+    enriched = engine.enrich({'items': [{'quantity': 2, 'unit_price': 50000}]}, 'invoice')
+
+    assert enriched['subtotal'] == 100000
+    assert enriched['tax_rate'] == 0.075 and enriched['tax_rate_percentage'] == 7.5
+    assert enriched['tax_amount'] == 7500
+    assert enriched['delivery_rate'] == 0.03 and enriched['delivery_amount'] == 3000
+    assert enriched['total'] == 110500
+
+def test_quotes_have_no_delivery(engine):
+    enriched = engine.enrich({'items': [{'quantity': 1, 'unit_price': 100}]}, 'quote')
+
+    assert 'delivery_amount' not in enriched
+    assert enriched['total'] == 107.5
+
+def test_given_rate_replaces_the_default(engine):
+    enriched = engine.enrich({'items': [{'quantity': 1, 'unit_price': 100}], 'tax_rate': 10}, 'quote')
+
+    assert enriched['tax_rate_percentage'] == 10
+    assert enriched['tax_amount'] == 10
+
+def test_zero_rate_is_kept_once_a_document_was_enriched(engine):
+    """A *_percentage field marks a rate set before, so an explicit 0 is not replaced by the default"""
+    items = [{'quantity': 1, 'unit_price': 100}]
+
+    defaulted = engine.enrich({'items': items, 'tax_rate': 0}, 'invoice')
+    kept = engine.enrich({'items': items, 'tax_rate': 0, 'tax_rate_percentage': 0,
+                          'delivery_rate': 0, 'delivery_rate_percentage': 0}, 'invoice')
+
+    assert defaulted['tax_rate_percentage'] == 7.5
+    assert kept['tax_rate_percentage'] == 0 and kept['tax_amount'] == 0
+    assert kept['delivery_rate_percentage'] == 0 and kept['delivery_amount'] == 0
+    assert kept['total'] == 100
+
+def test_empty_document_gets_no_default_rates(engine):
+    enriched = engine.enrich({'items': []}, 'invoice')
+
+    assert enriched['tax_rate_percentage'] == 0
+    assert enriched['total'] == 0
+
+def test_enrich_does_not_mutate_its_input(engine):
+    data = {'items': [{'quantity': 2, 'unit_price': 5}]}
+    engine.enrich(data, 'invoice')
+
+    assert data == {'items': [{'quantity': 2, 'unit_price': 5}]}
+
+def _random_documents(count: int, seed: int = 7):
+    generator = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        items = []
+        for _ in range(generator.randint(0, 6)):
+            item = {'quantity': generator.choice([1, 2, 0.5, 1.25, 3.333, 10]),
+                    'unit_price': generator.choice([0.01, 0.335, 19.99, 1.005, 2500, 123456.789])}
+            if generator.random() < 0.3:
+                item['amount'] = generator.choice([-10.005, 0.5, 99.995, 1e6])
+            items.append(item)
+        data = {'items': items}
+        if generator.random() < 0.3:
+            data['tax_rate'] = generator.choice([0, 5, 12.5])
+            if generator.random() < 0.5:
+                data['tax_rate_percentage'] = data['tax_rate']
+        documents.append(data)
+    return documents
+
+def test_batch_matches_scalar_enrichment(engine):
+    documents = _random_documents(500)
+    doc_types = ['invoice' if index % 2 else 'quote' for index in range(len(documents))]
+
+    assert engine.enrich_batch(documents, doc_types) == [
+        engine.enrich(data, doc_type) for data, doc_type in zip(documents, doc_types)
+    ]
+
+def test_batch_matches_scalar_beyond_int64(engine):
+    """Amounts too large for int64 minor units fall back to Python ints in both paths"""
+    documents = [{'items': [{'quantity': 3, 'unit_price': 4e16}, {'amount': 1.5}]}, {'items': [{'quantity': 1, 'unit_price': 1}]}]
+
+    assert engine.enrich_batch(documents, 'invoice') == [engine.enrich(data, 'invoice') for data in documents]
+
+def test_batch_totals_are_columns_in_minor_units(engine):
+    documents = [
+        {'items': [{'quantity': 2, 'unit_price': 10}, {'amount': -5}]},
+        {'items': []},
+        {'items': [{'quantity': 1, 'unit_price': 0.335}], 'tax_rate': 10},
+    ]
+    totals = engine.batch_totals(documents, ['invoice', 'invoice', 'quote'])
+
+    assert totals.offsets.tolist() == [0, 2, 2, 3]
+    assert totals.item_amounts.tolist() == [2000, -500, 34]
+    assert totals.subtotals.tolist() == [1500, 0, 34]
+    assert totals.tax_rates.tolist() == [7.5, 0, 10]
+    assert totals.tax_amounts.tolist() == [113, 0, 3]  # 112.5 and 3.4 rounded half-up
+    assert totals.delivery_rates.tolist() == [3.0, 0, 0]
+    assert totals.delivery_amounts.tolist() == [45, 0, 0]
+    assert totals.totals.tolist() == [1658, 0, 37]
+    assert totals.totals.dtype == np.int64
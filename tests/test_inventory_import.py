@@ -0,0 +1,102 @@
+"""
+Inventory Import Tests for Quotla AI Document Generator
+
+Exercises column mapping and spreadsheet imports against a temporary inventory store (no server or API keys needed).
+
+Run with: python -m pytest tests/test_inventory_import.py
+"""
+
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook
+
+from app.inventory_import import InventoryImporter, detect_columns, mapping_from_model, parse_number, read_rows
+
+def test_clear_headers_map_without_the_model():
+    mapping, issues = detect_columns(
+        ['Product', 'Item Code', 'Selling Price (₦)', 'Unit Cost', 'Qty on hand', 'Stock Value', 'Notes'],
+        [['Laptop', 'LAP-1', '450,000', '400000', '3', '1200000', 'x']]
+    )
+
+    assert mapping.columns == {0: 'name', 1: 'sku', 2: 'unit_price', 3: 'cost_price', 4: 'quantity_on_hand'}
+    assert mapping.currency == 'NGN' and issues == []
+
+def test_ambiguous_headers_are_flagged():
+    """Duplicated, unlabelled or absent headers are reported instead of guessed"""
+    two_prices, two_prices_issues = detect_columns(['Name', 'Price', 'Retail Price'], [['Laptop', '1', '2']])
+    unlabelled, unlabelled_issues = detect_columns(['Name', 'Amt'], [['Laptop', '1,200'], ['Bag', '300']])
+    no_header, no_header_issues = detect_columns(['Laptop', 'LAP-1', 450000], [['Bag', 'BAG-1', 20000]])
+
+    assert two_prices.columns == {0: 'name', 1: 'unit_price'} and len(two_prices_issues) == 1
+    assert unlabelled.columns == {0: 'name'} and 'holds numbers' in unlabelled_issues[0]
+    assert not no_header.has_header and no_header_issues
+
+def test_model_mapping_drops_unknown_fields_and_columns():
+    mapping = mapping_from_model({'has_header': False, 'columns': {'0': 'name', '2': 'unit_price', '9': 'sku', '1': 'bogus'}}, 3)
+
+    assert mapping.columns == {0: 'name', 2: 'unit_price'}
+    assert not mapping.has_header and mapping.mapped_by == 'model'
+
+@pytest.mark.parametrize('value, expected', [
+    ('₦450,000.00', (450000.0, 'NGN')),
+    ('USD 1200', (1200, 'USD')),
+    ('7.5%', (7.5, None)),
+    ('(300)', (-300, None)),
+    ('1.234,56 €', (1234.56, 'EUR')),
+    ('12,5', (12.5, None)),
+    (42, (42, None)),
+    (' 1 000 ', (1000, None)),
+])
+def test_cell_parsing(value, expected):
+    """Prices with symbols, codes, separators and percentages"""
+    parsed = parse_number(value)
+
+    assert parsed == expected
+    assert type(parsed[0]) is type(expected[0])
+
+def test_unreadable_number_is_rejected():
+    with pytest.raises(ValueError):
+        parse_number('abc')
+
+@pytest.fixture
+def importer(inventory_store, engine, number_allocator) -> InventoryImporter:
+    return InventoryImporter(inventory_store, engine, number_allocator, chunk_rows=2)
+
+def test_import_reports_row_errors(importer, inventory_store):
+    """CSV and XLSX rows are imported in chunks; bad rows are reported and skipped"""
+    csv_file = BytesIO(
+        "Product;SKU;Price;Cost;Qty;Currency\n"
+        "Laptop;LAP-1;450000;400000;3;NGN\n"
+        "\n"
+        ";NONAME;1;1;1;NGN\n"
+        "Chair;CHR-1;abc;1;1;NGN\n"
+        "Desk;DSK-1;120000;90000;2;NGN\n"
+        "Lamp;LMP-1;5000;3000;1;\n".encode('utf-8')
+    )
+    rows = read_rows(csv_file, 'items.csv')
+    mapping, issues = detect_columns(next(rows)[1], [])
+    csv_report = importer.import_rows(rows, mapping, currency=None)
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Item ID', 'Name', 'SKU', 'Unit Price', 'Qty'])
+    sheet.append([inventory_store.find(sku='DSK-1')[0]['inventory_id'], 'Desk', 'LAP-1', 130000, 1])  # SKU of another item
+    sheet.append([None, 'Pen', 'PEN-1', 100, 500])
+    xlsx_file = BytesIO()
+    workbook.save(xlsx_file)
+    xlsx_file.seek(0)
+
+    rows = read_rows(xlsx_file, 'items.xlsx')
+    mapping, _ = detect_columns(next(rows)[1], [])
+    xlsx_report = importer.import_rows(rows, mapping, currency='NGN')
+    laptop = inventory_store.find(sku='LAP-1')[0]
+    pen = inventory_store.find(sku='PEN-1')[0]
+
+    assert issues == [] and csv_report['rows'] == 5 and csv_report['imported'] == 2
+    assert [(error['row'], error['error'].split(':')[0]) for error in csv_report['errors']] == [
+        (4, 'No item name'), (5, 'unit_price'), (7, 'No currency (add a currency column or pass a default currency)')
+    ]
+    assert xlsx_report['imported'] == 1 and [error['row'] for error in xlsx_report['errors']] == [2]
+    assert laptop['profit_margin'] == 12.5 and laptop['total_stock_value'] == 1200000
+    assert pen['currency'] == 'NGN' and pen['inventory_id'].startswith('ITEM')
@@ -0,0 +1,115 @@
+"""
+Inventory Store Tests for Quotla AI Document Generator
+
+Exercises the inventory store directly against a temporary SQLite file (no server needed).
+
+Run with: python -m pytest tests/test_inventory_store.py
+"""
+
+import random
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+def make_item(index: int, **fields) -> dict:
+    item = {
+        'inventory_id': f'ITEM{index:06d}', 'name': f'Product {index}', 'sku': f'SKU-{index}',
+        'category': 'Electronics', 'currency': 'NGN', 'unit_price': 1500, 'cost_price': 1000,
+        'tax_rate_percentage': 7.5, 'quantity_on_hand': 10, 'low_stock_threshold': 5,
+        'profit_margin': 50.0, 'track_inventory': True, 'created_at': '2024-12-01 09:00:00'
+    }
+    item.update(fields)
+    return item
+
+def test_upsert_by_id_and_sku(inventory_store):
+    """Items update by inventory_id or SKU, keeping the stored ID and creation time"""
+    store = inventory_store
+    store.upsert([make_item(1), make_item(2)])
+    # Same SKU under a new ID (e.g. extracted again) updates the existing item
+    store.upsert([make_item(99, sku='SKU-1', quantity_on_hand=3, created_at='2025-01-01 00:00:00')])
+    # Same ID with a new SKU updates the SKU
+    store.upsert([make_item(2, sku='SKU-2B')])
+    first, second = store.get('ITEM000001'), store.get('ITEM000002')
+
+    assert first['inventory_id'] == 'ITEM000001' and first['quantity_on_hand'] == 3
+    assert first['created_at'] == '2024-12-01 09:00:00'
+    assert second['sku'] == 'SKU-2B'
+
+    # An ID and a SKU of two different items is rejected, and nothing is written
+    with pytest.raises(ValueError):
+        store.upsert([make_item(3), make_item(1, sku='SKU-2B')])
+    assert store.get('ITEM000003') is None
+    assert store.stock_value_by_category()[0]['items'] == 2
+
+def test_search_and_low_stock(inventory_store):
+    """Name search (substring and prefix), SKU/category filters, tenants and low-stock ordering"""
+    store = inventory_store
+    store.upsert([
+        make_item(1, name='Dell Latitude Laptop', quantity_on_hand=1),
+        make_item(2, name='Laptop Bag', category='Accessories', quantity_on_hand=5),
+        make_item(3, name='Office Chair', category='Furniture', quantity_on_hand=40),
+        make_item(4, name='Consulting', sku=None, quantity_on_hand=None, low_stock_threshold=None),
+    ])
+    store.upsert([make_item(1, name='Tenant Laptop')], tenant_id='acme')
+
+    def names(items):
+        return [item['name'] for item in items]
+
+    assert sorted(names(store.find('aptop'))) == ['Dell Latitude Laptop', 'Laptop Bag']
+    assert names(store.find('Of')) == ['Office Chair']
+    assert names(store.find(category='furniture')) == ['Office Chair']
+    assert names(store.find(sku='SKU-2')) == ['Laptop Bag']
+    assert names(store.find('laptop', tenant_id='acme')) == ['Tenant Laptop']
+    assert [(item['name'], item['shortfall']) for item in store.low_stock()] == [('Dell Latitude Laptop', 4), ('Laptop Bag', 0)]
+
+def test_aggregates_match_items(inventory_store):
+    """Trigger-maintained totals and the margin distribution match a pass over the items"""
+    count = 3000
+    rng = random.Random(7)
+
+    def random_item(index: int) -> dict:
+        return make_item(
+            index, sku=None, category=rng.choice(['Electronics', 'Furniture', None]), currency=rng.choice(['NGN', 'USD']),
+            cost_price=round(rng.uniform(1, 5000), 2), quantity_on_hand=rng.choice([None, rng.randint(0, 500), 2.5]),
+            profit_margin=round(rng.uniform(-30, 150), 2)
+        )
+
+    items = {index: random_item(index) for index in range(count)}
+    inventory_store.upsert(items.values())
+    # Updates that move items between categories and currencies
+    for index in rng.sample(range(count), count // 3):
+        items[index] = random_item(index)
+    inventory_store.upsert(items[index] for index in range(count))
+
+    by_category = {(row['category'], row['currency']): row for row in inventory_store.stock_value_by_category()}
+    margins = inventory_store.margin_distribution(edges=[0, 50, 100])
+
+    expected = defaultdict(lambda: [0, 0])
+    for item in items.values():
+        key = (item['category'], item['currency'])
+        expected[key][0] += 1
+        if item['quantity_on_hand']:
+            value = Decimal(str(item['quantity_on_hand'])) * Decimal(str(item['cost_price']))
+            expected[key][1] += int(value.quantize(Decimal('0.01'), ROUND_HALF_UP) * 100)
+    assert by_category.keys() == expected.keys()
+    for key, (items_count, stock_value) in expected.items():
+        assert by_category[key]['items'] == items_count
+        assert round(by_category[key]['stock_value'] * 100) == stock_value
+
+    sorted_margins = sorted(item['profit_margin'] for item in items.values())
+    assert margins['items'] == count
+    assert margins['min'] == sorted_margins[0] and margins['max'] == sorted_margins[-1]
+    assert margins['percentiles']['p50'] == sorted_margins[round(0.5 * (count - 1))]
+    assert margins['average'] == pytest.approx(sum(sorted_margins) / count, abs=0.01)
+    assert [bucket['items'] for bucket in margins['buckets']] == [
+        sum(margin < 0 for margin in sorted_margins),
+        sum(0 <= margin < 50 for margin in sorted_margins),
+        sum(50 <= margin < 100 for margin in sorted_margins),
+        sum(margin >= 100 for margin in sorted_margins),
+    ]
+
+def test_empty_margin_distribution(inventory_store):
+    assert inventory_store.margin_distribution() == {
+        'items': 0, 'average': None, 'min': None, 'max': None, 'percentiles': {}, 'buckets': []
+    }
@@ -0,0 +1,213 @@
+"""
+Background Job Tests for Quotla AI Document Generator
+
+Exercises the job queue, its worker pool and the durable SQLite queue with stand-in handlers (no server or API keys needed).
+
+Run with: python -m pytest tests/test_jobs.py
+"""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.jobs import JobQueue, check_callback_url
+
+async def wait_finished(queue: JobQueue, job_ids, timeout: float = 10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        statuses = [queue.status(job_id) for job_id in job_ids]
+        if all(status['status'] in ('completed', 'failed') for status in statuses):
+            return statuses
+        await asyncio.sleep(0.02)
+    raise TimeoutError("Jobs did not finish")
+
+async def write(params, job_dir, progress):
+    (job_dir / 'out.txt').write_text(params.get('text', 'done'))
+    return 'out.txt', 'text/plain'
+
+def test_worker_pool_limits_concurrency(tmp_path):
+    """Jobs run on a fixed number of workers; results become artifacts and errors fail only their job"""
+    running = {'now': 0, 'most': 0}
+    lock = threading.Lock()
+
+    async def echo(params, job_dir, progress):
+        with lock:
+            running['now'] += 1
+            running['most'] = max(running['most'], running['now'])
+        await asyncio.sleep(0.05)
+        with lock:
+            running['now'] -= 1
+        if params['text'] == 'bad':
+            raise ValueError("Bad input")
+        progress['characters'] = len(params['text'])
+        (job_dir / 'out.txt').write_text(params['text'].upper())
+        return 'out.txt', 'text/plain'
+
+    async def run():
+        queue = JobQueue('', str(tmp_path / 'jobs'), workers=2)
+        queue.register('echo', echo)
+        await queue.start()
+        try:
+            job_ids = []
+            for text in ['one', 'two', 'bad', 'four', 'five']:
+                job_id, _ = queue.allocate()
+                queue.submit(job_id, 'echo', {'text': text})
+                job_ids.append(job_id)
+            statuses = await wait_finished(queue, job_ids)
+            return statuses, queue.artifact(job_ids[0]), queue.artifact(job_ids[2])
+        finally:
+            await queue.stop()
+
+    statuses, (artifact, media_type), failed_artifact = asyncio.run(run())
+
+    assert [status['status'] for status in statuses] == ['completed', 'completed', 'failed', 'completed', 'completed']
+    assert running['most'] == 2
+    assert artifact.read_text() == 'ONE' and media_type == 'text/plain'
+    assert statuses[0]['progress'] == {'characters': 3} and statuses[0]['expires_at']
+    assert statuses[2]['error'] == 'Bad input' and failed_artifact is None
+
+def test_durable_queue_survives_restart(tmp_path):
+    """Queued jobs, and running jobs whose process stopped sending heartbeats, run after a restart"""
+    async def slow(params, job_dir, progress):
+        await asyncio.sleep(60)
+
+    async def run():
+        path = str(tmp_path / 'jobs.db')
+        first = JobQueue(path, str(tmp_path / 'jobs'), workers=1)
+        first.register('write', write)
+        interrupted, _ = first.allocate()
+        first.submit(interrupted, 'write', {'text': 'interrupted'})
+        queued, _ = first.allocate()
+        first.submit(queued, 'write', {'text': 'queued'})
+        claimed = first._claim()['job_id']
+        # The process running it died a while ago
+        first._connection.execute("UPDATE jobs SET heartbeat = heartbeat - 3600")
+        first._connection.close()
+
+        second = JobQueue(path, str(tmp_path / 'jobs'), workers=1)
+        second.register('write', write)
+        second.register('slow', slow)
+        await second.start()
+        try:
+            statuses = await wait_finished(second, [interrupted, queued])
+            # A graceful shutdown queues a running job again without counting an attempt
+            stopped, _ = second.allocate()
+            second.submit(stopped, 'slow', {})
+            while second.status(stopped)['status'] != 'running':
+                await asyncio.sleep(0.01)
+        finally:
+            await second.stop()
+        return claimed == interrupted, statuses, second.status(stopped)
+
+    claimed_oldest, statuses, stopped = asyncio.run(run())
+
+    assert claimed_oldest
+    assert [status['status'] for status in statuses] == ['completed', 'completed']
+    assert [status['attempts'] for status in statuses] == [2, 1]
+    assert stopped['status'] == 'queued' and stopped['attempts'] == 0
+
+def test_blocking_handler_keeps_its_lease(tmp_path):
+    """A handler blocking longer than the lease neither stalls the server's loop nor gets claimed by another process"""
+    runs = []
+
+    async def blocking(params, job_dir, progress):
+        runs.append(job_dir.name)
+        time.sleep(2.5)  # A synchronous provider SDK call
+        return 'out.txt', 'text/plain'
+
+    async def other_process(queue: JobQueue, done: threading.Event):
+        await queue.start()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    async def run():
+        path, artifact_dir = str(tmp_path / 'jobs.db'), str(tmp_path / 'jobs')
+        # This server and another process sharing the durable queue, with a 1 second lease
+        first, second = (JobQueue(path, artifact_dir, workers=1, lease=1) for _ in range(2))
+        for queue in (first, second):
+            queue.register('block', blocking)
+        await first.start()
+        job_id, _ = first.allocate()
+        first.submit(job_id, 'block', {})
+        done = threading.Event()
+        other = threading.Thread(target=asyncio.run, args=(other_process(second, done),))
+        other.start()
+
+        # The loop keeps serving while the handler blocks
+        largest_gap, last = 0.0, time.perf_counter()
+        try:
+            while not runs or first.status(job_id)['status'] not in ('completed', 'failed'):
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                largest_gap, last = max(largest_gap, now - last), now
+            await asyncio.sleep(0.2)
+            return first.status(job_id), largest_gap
+        finally:
+            done.set()
+            await asyncio.to_thread(other.join)
+            await first.stop()
+
+    status, largest_gap = asyncio.run(run())
+
+    assert status['status'] == 'completed' and status['attempts'] == 1
+    assert len(runs) == 1
+    assert largest_gap < 0.5
+
+def test_finished_jobs_expire_after_the_ttl(tmp_path):
+    """Finished jobs and their files are removed after the TTL; queued jobs are kept"""
+    async def run():
+        queue = JobQueue('', str(tmp_path / 'jobs'), workers=1, ttl=60)
+        queue.register('write', write)
+        await queue.start()
+        try:
+            finished, finished_dir = queue.allocate()
+            queue.submit(finished, 'write', {})
+            await wait_finished(queue, [finished])
+        finally:
+            await queue.stop()
+        pending, pending_dir = queue.allocate()
+        queue.submit(pending, 'write', {})
+        kept = queue.expire()
+        removed = queue.expire(time.time() + 120)
+        return kept, removed, queue.status(finished), finished_dir.exists(), queue.status(pending)['status'], pending_dir.exists()
+
+    kept, removed, finished, finished_exists, pending, pending_exists = asyncio.run(run())
+
+    assert kept == 0 and removed == 1
+    assert finished is None and not finished_exists
+    assert pending == 'queued' and pending_exists
+
+@pytest.mark.parametrize('url', ['http://example.com/hook', 'file:///etc/passwd', 'http://10.0.0.5/hook'])
+def test_callbacks_to_other_hosts_are_rejected(url):
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+def test_callbacks_to_local_hosts_are_allowed():
+    assert check_callback_url('http://localhost:9000/jobs/done')
+
+def test_expiry_loop_survives_a_failed_pass(tmp_path, monkeypatch):
+    """An error in one expiry pass is reported and the next pass still runs"""
+    queue = JobQueue('', str(tmp_path / 'jobs'), workers=1, cleanup_interval=0)
+    passes = []
+
+    def expire():
+        passes.append(len(passes))
+        if len(passes) == 1:
+            raise OSError("database is locked")
+        return 0
+
+    monkeypatch.setattr(queue, 'expire', expire)
+
+    async def run():
+        await queue.start()
+        try:
+            while len(passes) < 3:
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert len(passes) >= 3
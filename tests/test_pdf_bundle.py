@@ -0,0 +1,71 @@
+"""
+Merged PDF Bundle Tests for Quotla AI Document Generator
+
+Merges rendered invoices with PdfBundle directly (no server needed).
+
+Run with: python -m pytest tests/test_pdf_bundle.py
+"""
+
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from PyPDF2 import PdfReader
+
+from app.export_service import ExportService, PdfBundle
+
+@pytest.fixture(scope='module')
+def invoice_pdf() -> bytes:
+    """A three-page invoice"""
+    document = {
+        'invoice_number': 'INV20260101000001',
+        'date': '2026-01-01',
+        'customer_name': 'Tech Corp',
+        'currency': 'NGN',
+        'items': [{'description': f'Item {i}', 'quantity': 1, 'unit_price': 100, 'amount': 100} for i in range(80)],
+        'subtotal': 8000,
+        'total': 8000,
+    }
+    return ExportService().generate_export(document, 'invoice', 'pdf').getvalue()
+
+def merge(invoice_pdf: bytes, count: int) -> tuple[int, int, bytes]:
+    """Merge count copies, returning (peak traced bytes, merged size, merged PDF); the PDF is only kept for small merges"""
+    bundle = PdfBundle()
+    kept = BytesIO()
+    size = 0
+    tracemalloc.start()
+    try:
+        for index in range(count):
+            chunk = bundle.add(f'INV{index:06d}', invoice_pdf)
+            size += len(chunk)
+            if count <= 10:
+                kept.write(chunk)
+        for chunk in bundle.close():
+            size += len(chunk)
+            if count <= 10:
+                kept.write(chunk)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak, size, kept.getvalue()
+
+def test_merged_pdf_has_every_page_and_an_outline_entry_per_document(invoice_pdf):
+    pages_per_document = len(PdfReader(BytesIO(invoice_pdf)).pages)
+    _, size, merged = merge(invoice_pdf, 4)
+
+    reader = PdfReader(BytesIO(merged))
+    assert size == len(merged)
+    assert len(reader.pages) == 4 * pages_per_document
+    assert [item.title for item in reader.outline] == ['INV000000', 'INV000001', 'INV000002', 'INV000003']
+    assert [reader.get_destination_page_number(item) for item in reader.outline] == [
+        index * pages_per_document for index in range(4)
+    ]
+    assert 'Item 0' in reader.pages[pages_per_document].extract_text()
+
+def test_memory_stays_flat_as_documents_are_added(invoice_pdf):
+    small_peak, small_size, _ = merge(invoice_pdf, 50)
+    large_peak, large_size, _ = merge(invoice_pdf, 200)
+
+    # Only offsets, page numbers and titles are kept per document (a few hundred bytes), not its pages
+    assert (large_peak - small_peak) / 150 < 2048
+    assert large_peak - small_peak < (large_size - small_size) / 4
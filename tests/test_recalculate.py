@@ -0,0 +1,107 @@
+"""
+Recalculate Endpoint Tests for Quotla AI Document Generator
+
+Posts edited documents to /api/recalculate through FastAPI's TestClient
+(no running server or API keys needed; the AI model is never called).
+
+Run with: python -m pytest tests/test_recalculate.py
+"""
+
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+@pytest.fixture(scope='module')
+def client() -> TestClient:
+    return TestClient(app)
+
+@pytest.fixture
+def edited_invoice() -> dict:
+    """An enriched invoice whose quantity the user changed from 100 to 120, leaving the old amount behind"""
+    return {
+        "invoice_number": "INV20241201000001",
+        "date": "2024-12-01",
+        "currency": "NGN",
+        "tax_rate": 0.1,
+        "tax_rate_percentage": 10,
+        "delivery_rate": 0.05,
+        "delivery_rate_percentage": 0,
+        "items": [
+            {"description": "Chairs", "quantity": 120, "unit_price": 1000, "amount": 100000},
+            {"description": "Tables", "quantity": 2, "unit_price": 12500.5, "amount": 25001},
+        ],
+        "subtotal": 125001,
+        "total": 137501.1,
+    }
+
+def test_totals_are_recomputed(client, edited_invoice):
+    response = client.post("/api/recalculate", json=edited_invoice)
+
+    assert response.status_code == 200
+    result = response.json()
+    data = result["data"]
+    assert result["success"] and result["document_type"] == "invoice"
+    assert data["subtotal"] == 145001
+    assert data["tax_amount"] == 14500.1
+    assert data["total"] == 159501.1
+    assert "TOTAL: NGN 159,501.10" in result["text_output"]
+
+def test_stale_item_amounts_are_dropped(client, edited_invoice):
+    data = client.post("/api/recalculate", json=edited_invoice).json()["data"]
+
+    assert [item["amount"] for item in data["items"]] == [120000, 25001]
+
+def test_percentages_replace_decimal_rates(client, edited_invoice):
+    """tax_rate 0.1 is the decimal of tax_rate_percentage 10, not 0.1%; a delivery percentage of 0 stays 0"""
+    edited_invoice["tax_rate_percentage"] = 8
+    data = client.post("/api/recalculate", json=edited_invoice).json()["data"]
+
+    assert data["tax_rate_percentage"] == 8 and data["tax_rate"] == 0.08
+    assert data["tax_amount"] == 11600.08
+    assert data["delivery_rate_percentage"] == 0 and data["delivery_amount"] == 0
+
+def test_model_style_rates_are_read_as_percentages(client):
+    document = {"quote_number": "QT20241201000001", "currency": "USD", "tax_rate": 5,
+                "items": [{"description": "Desk", "quantity": 2, "unit_price": 150}]}
+    data = client.post("/api/recalculate", json=document).json()["data"]
+
+    assert data["tax_rate"] == 0.05 and data["tax_amount"] == 15
+    assert "delivery_amount" not in data
+    assert data["total"] == 315
+
+def test_document_number_is_kept(client, edited_invoice):
+    data = client.post("/api/recalculate", json=edited_invoice).json()["data"]
+
+    assert data["invoice_number"] == "INV20241201000001"
+    assert data["date"] == "2024-12-01"
+
+def test_array_matches_single_documents(client, edited_invoice):
+    single = client.post("/api/recalculate", json=edited_invoice).json()
+    response = client.post("/api/recalculate", json=[edited_invoice, edited_invoice])
+
+    assert response.status_code == 200
+    documents = response.json()["documents"]
+    assert len(documents) == 2
+    assert all(document == single for document in documents)
+
+def test_projection_trims_the_response(client, edited_invoice):
+    response = client.post("/api/recalculate", params={"fields": "invoice_number,total", "include_text": "false"},
+                           json=edited_invoice)
+
+    result = response.json()
+    assert result["data"] == {"invoice_number": "INV20241201000001", "total": 159501.1}
+    assert "text_output" not in result
+
+def test_invalid_document_is_reported_by_index(client, edited_invoice):
+    broken = {**edited_invoice, "items": [{"description": "Chairs", "quantity": "many", "unit_price": 1000}]}
+    response = client.post("/api/recalculate", json=[edited_invoice, broken])
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Document 1 could not be recalculated")
+
+def test_untyped_document_is_rejected(client):
+    response = client.post("/api/recalculate", json={"items": []})
+
+    assert response.status_code == 400
@@ -0,0 +1,98 @@
+"""
+Render Cache Tests for Quotla AI Document Generator
+
+Exercises RenderCache directly, and ETag / If-None-Match on /api/export
+through FastAPI's TestClient (no running server or API keys needed).
+
+Run with: python -m pytest tests/test_render_cache.py
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.render_cache import RenderCache
+
+def test_key_ignores_dict_order_but_not_content():
+    key = RenderCache.make_key({'a': 1, 'b': 2}, 'invoice', 'pdf', 'default', 1)
+
+    assert key == RenderCache.make_key({'b': 2, 'a': 1}, 'invoice', 'pdf', 'default', 1)
+    assert key != RenderCache.make_key({'a': 1, 'b': 3}, 'invoice', 'pdf', 'default', 1)
+    assert key != RenderCache.make_key({'a': 1, 'b': 2}, 'invoice', 'pdf', 'default', 2)
+    assert key != RenderCache.make_key({'a': 1, 'b': 2}, 'invoice', 'pdf', 'default', 1, {'compress': True})
+
+def test_memory_tier_evicts_least_recently_used_bytes():
+    cache = RenderCache(max_bytes=30, disk_dir=None)
+    cache.put('a', b'x' * 10)
+    cache.put('b', b'x' * 10)
+    cache.put('c', b'x' * 10)
+    assert cache.get('a') is not None  # 'a' is now the most recently used
+
+    cache.put('d', b'x' * 10)
+
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+    assert cache.stats['evictions'] == 1
+
+def test_memory_tier_skips_entries_larger_than_the_cache():
+    cache = RenderCache(max_bytes=10, disk_dir=None)
+    cache.put('small', b'x' * 5)
+    cache.put('large', b'x' * 11)
+
+    assert 'small' in cache and 'large' not in cache
+    assert cache.stats['evictions'] == 0
+
+def test_hits_and_misses_are_counted():
+    cache = RenderCache(max_bytes=100, disk_dir=None)
+    cache.put('a', b'pdf')
+
+    assert cache.get('a') == b'pdf'
+    assert cache.get('b') is None
+    assert (cache.stats['hits'], cache.stats['misses']) == (1, 1)
+
+def test_disk_tier_survives_restart_and_evicts_oldest(tmp_path):
+    cache = RenderCache(max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=25)
+    for key in ('aa1', 'bb2', 'cc3'):
+        cache.put(key, key.encode() * 4)  # 12 bytes each
+
+    assert 'aa1' not in cache
+    restarted = RenderCache(max_bytes=100, disk_dir=str(tmp_path), disk_max_bytes=25)
+    assert restarted.get('bb2') == b'bb2' * 4
+    assert restarted.get('cc3') == b'cc3' * 4
+    assert restarted.stats['disk_hits'] == 2
+    assert sorted(path.name for path in tmp_path.glob('*/*')) == ['bb2', 'cc3']
+
+def test_concurrent_disk_writes_of_one_key_leave_a_whole_file(tmp_path):
+    cache = RenderCache(max_bytes=0, disk_dir=str(tmp_path))
+    contents = [bytes([index]) * 200_000 for index in range(16)]
+
+    with ThreadPoolExecutor(16) as executor:
+        list(executor.map(lambda content: cache.put('ab12', content), contents))
+
+    assert (tmp_path / 'ab' / 'ab12').read_bytes() in contents
+    assert list(tmp_path.glob('*/*.tmp')) == []
+    assert cache._disk_size == 200_000
+
+@pytest.fixture(scope='module')
+def client():
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
+
+def test_reexport_is_etagged_and_answers_304(client):
+    document = {'invoice_number': 'INV20260101000001', 'date': '2026-01-01', 'customer_name': 'Tech Corp',
+                'currency': 'NGN', 'items': [{'description': 'Chairs', 'quantity': 2, 'unit_price': 100, 'amount': 200}],
+                'subtotal': 200, 'total': 200}
+    form = {'format': 'pdf', 'document_type': 'invoice', 'data': json.dumps(document)}
+
+    first = client.post('/api/export', data=form)
+    etag = first.headers['etag']
+    repeated = client.post('/api/export', data=form, headers={'If-None-Match': f'W/{etag}, "other"'})
+    changed = client.post('/api/export', data={**form, 'data': json.dumps({**document, 'customer_name': 'Other'})},
+                          headers={'If-None-Match': etag})
+
+    assert first.status_code == 200 and first.content.startswith(b'%PDF')
+    assert repeated.status_code == 304 and repeated.headers['etag'] == etag and repeated.content == b''
+    assert changed.status_code == 200 and changed.headers['etag'] != etag